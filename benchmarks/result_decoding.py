@@ -0,0 +1,100 @@
+"""
+Benchmark decoding raw OntoGPT results against the original read and key check.
+
+Writes a directory of synthetic raw disease results and reports the best time of several runs
+for reading and validating every file, then also extracting PhEval disease results, the
+original way (json.load and a key check per entry) and with decode_ontogpt_result, along with
+the memory held per validated entry:
+
+    python benchmarks/result_decoding.py --files 5000 --entries 10
+"""
+
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+from pheval_ontogpt.post_process.ontogpt_result_decoder import decode_ontogpt_result
+from pheval_ontogpt.post_process.post_process_results_format import (
+    PhEvalDiseaseResultFromOntoGPT,
+)
+
+DISEASE_KEYS = ["disease_name", "omim_disease_id", "score"]
+
+
+def original_read(ontogpt_result_path: Path) -> List[dict]:
+    """Read a result and keep the entries holding the disease keys, as before decoding."""
+    with open(ontogpt_result_path, "r") as result:
+        parsed_result = json.load(result)
+    filtered_results = []
+    for entry in parsed_result:
+        if all(key in entry for key in DISEASE_KEYS):
+            filtered_results.append(entry)
+    return filtered_results
+
+
+def decoded_read(ontogpt_result_path: Path) -> List:
+    return decode_ontogpt_result(ontogpt_result_path, disease_analysis=True).disease_results
+
+
+def extracted(read: Callable[[Path], List]) -> Callable[[Path], List]:
+    return lambda path: PhEvalDiseaseResultFromOntoGPT(read(path)).extract_pheval_requirements()
+
+
+def memory_per_entry(read: Callable[[Path], List], paths: List[Path]) -> float:
+    tracemalloc.start()
+    entries = [entry for path in paths for entry in read(path)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(entries)
+
+
+def write_results(directory: Path, files: int, entries: int) -> List[Path]:
+    paths = []
+    for case in range(files):
+        result = [
+            {
+                "rank": rank + 1,
+                "disease_name": f"Disease {case} {rank}",
+                "omim_disease_id": f"OMIM:{100000 + rank}",
+                "score": round(1 - rank / entries, 3),
+            }
+            for rank in range(entries)
+        ]
+        path = directory.joinpath(f"patient_{case}-ontogpt_result.json")
+        path.write_text(json.dumps(result, indent=4))
+        paths.append(path)
+    return paths
+
+
+def best_time(read: Callable[[Path], List], paths: List[Path], repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for path in paths:
+            read(path)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--entries", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_results(Path(directory), args.files, args.entries)
+        for name, read in [("original", original_read), ("decoded", decoded_read)]:
+            print(
+                f"{name}: {best_time(read, paths, args.repeats):.3f}s to read, "
+                f"{best_time(extracted(read), paths, args.repeats):.3f}s to read and extract "
+                f"{len(paths)} files, {memory_per_entry(read, paths):.0f} bytes per entry"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,44 @@
+from importlib import import_module
+from typing import Dict, List, Optional
+
 import click
 
-from pheval_ontogpt.post_process.post_process_results_format import (
-    create_standardised_results_command,
-)
+# commands are imported when invoked, so a command only pays for the dependencies it uses
+LAZY_COMMANDS = {
+    "standardise": "pheval_ontogpt.post_process.post_process_results_format:"
+    "create_standardised_results_command",
+    "build-disease-name-index": "pheval_ontogpt.post_process.post_process_results_format:"
+    "build_disease_name_index_command",
+    "export-raw-results": "pheval_ontogpt.post_process.post_process_results_format:"
+    "export_raw_results_command",
+    "evaluate": "pheval_ontogpt.run.bulk_evaluation:evaluate_raw_results_command",
+    "serve": "pheval_ontogpt.serve:serve_command",
+    "client": "pheval_ontogpt.client:client_command",
+    "watch": "pheval_ontogpt.watch:watch_command",
+}
+
+
+class LazyGroup(click.Group):
+    """Click group importing the module of a subcommand only when the subcommand is used."""
+
+    def __init__(self, *args, lazy_commands: Dict[str, str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
 
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
 
-@click.group()
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_commands:
+            module_name, command_name = self.lazy_commands[cmd_name].split(":")
+            return getattr(import_module(module_name), command_name)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
 def main():
     pass
 
 
-main.add_command(create_standardised_results_command)
-
 if __name__ == "__main__":
     main()
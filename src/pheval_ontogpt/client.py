@@ -0,0 +1,129 @@
+"""Thin client for the pheval-ontogpt job server, importing only the standard library and click."""
+
+import json
+import socket
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+import click
+
+DEFAULT_SOCKET_PATH = Path(tempfile.gettempdir()).joinpath("pheval-ontogpt.sock")
+
+
+def send_job(socket_path: Path, request: Dict) -> Dict:
+    """Send a job request to the server and wait for its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+socket_option = click.option(
+    "--socket",
+    "-s",
+    "socket_path",
+    default=DEFAULT_SOCKET_PATH,
+    metavar="PATH",
+    help="Path to the Unix socket of the server.",
+    type=Path,
+    show_default=True,
+)
+
+
+@click.group("client")
+@socket_option
+@click.pass_context
+def client_command(ctx: click.Context, socket_path: Path):
+    """Submit jobs to a running `pheval-ontogpt serve` server."""
+    ctx.obj = socket_path
+
+
+def _submit(socket_path: Path, request: Dict) -> None:
+    response = send_job(socket_path, request)
+    if response["status"] != "ok":
+        raise click.ClickException(response["error"])
+    if "elapsed_seconds" in response:
+        print(f"done in {response['elapsed_seconds']:.3f}s")
+
+
+@client_command.command("run")
+@click.option("--input-dir", "-i", required=True, metavar="DIRECTORY", type=Path)
+@click.option("--testdata-dir", "-t", required=True, metavar="DIRECTORY", type=Path)
+@click.option("--output-dir", "-o", required=True, metavar="DIRECTORY", type=Path)
+@click.option("--tmp-dir", "-m", required=False, metavar="DIRECTORY", type=Path)
+@click.option("--version", "-v", required=False, type=str)
+@click.pass_obj
+def client_run_command(
+    socket_path: Path,
+    input_dir: Path,
+    testdata_dir: Path,
+    output_dir: Path,
+    tmp_dir: Path = None,
+    version: str = None,
+):
+    """Run OntoGPT as `pheval run` would."""
+    _submit(
+        socket_path,
+        {
+            "job": "run",
+            "input_dir": str(input_dir.resolve()),
+            "testdata_dir": str(testdata_dir.resolve()),
+            "output_dir": str(output_dir.resolve()),
+            "tmp_dir": str(tmp_dir.resolve()) if tmp_dir else None,
+            "version": version,
+        },
+    )
+
+
+@client_command.command("standardise")
+@click.option("--raw-results-dir", "-R", required=True, metavar="DIRECTORY", type=Path)
+@click.option("--output-dir", "-o", required=True, metavar="PATH", type=Path)
+@click.option("--gene-analysis/--no-gene-analysis", default=False, type=bool)
+@click.option("--disease-analysis/--no-disease-analysis", default=False, type=bool)
+@click.option("--disease-name-index", "-d", required=False, metavar="FILE", type=Path)
+@click.option("--incremental/--no-incremental", default=False, type=bool)
+@click.pass_obj
+def client_standardise_command(
+    socket_path: Path,
+    raw_results_dir: Path,
+    output_dir: Path,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    incremental: bool,
+    disease_name_index: Path = None,
+):
+    """Standardise raw results as `pheval-ontogpt standardise` would."""
+    _submit(
+        socket_path,
+        {
+            "job": "standardise",
+            "raw_results_dir": str(raw_results_dir.resolve()),
+            "output_dir": str(output_dir.resolve()),
+            "gene_analysis": gene_analysis,
+            "disease_analysis": disease_analysis,
+            "disease_name_index": str(disease_name_index.resolve()) if disease_name_index else None,
+            "incremental": incremental,
+        },
+    )
+
+
+@client_command.command("ping")
+@click.pass_obj
+def client_ping_command(socket_path: Path):
+    """Check that the server is running."""
+    _submit(socket_path, {"job": "ping"})
+
+
+@client_command.command("shutdown")
+@click.pass_obj
+def client_shutdown_command(socket_path: Path):
+    """Stop the server."""
+    _submit(socket_path, {"job": "shutdown"})
+
+
+main = client_command
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,28 @@ from datetime import datetime
 from pheval.run_metadata import BasicOutputRunMetaData
 
 from pheval_ontogpt.construct_run_metadata.ontogpt_metadata import OntoGPTMetaData
+from pheval_ontogpt.run.run_statistics import RunStatistics
 
 
-def construct_run_metadata(metadata: BasicOutputRunMetaData, model: str) -> BasicOutputRunMetaData:
+def construct_run_metadata(
+    metadata: BasicOutputRunMetaData, model: str, run_statistics: RunStatistics = None
+) -> BasicOutputRunMetaData:
     """Add tool specific metadata to basic run metadata,"""
     metadata.tool_specific_configuration_options = OntoGPTMetaData(
-        api_call_date=datetime.now(), gpt_model=model
+        api_call_date=datetime.now(),
+        gpt_model=model,
+        cases_run=run_statistics.cases_run if run_statistics else None,
+        average_prompt_tokens_saved=(
+            run_statistics.average_prompt_tokens_saved if run_statistics else None
+        ),
+        cost_usd=run_statistics.cost if run_statistics else None,
+        stop_reason=run_statistics.stop_reason if run_statistics else None,
+        skipped_case_ids=run_statistics.skipped_case_ids if run_statistics else [],
+        truncated_completions=run_statistics.truncated_completions if run_statistics else None,
+        salvaged_cases=run_statistics.salvaged_cases if run_statistics else None,
+        continuation_requests=run_statistics.continuation_requests if run_statistics else None,
+        escalation_rate=run_statistics.escalation_rate if run_statistics else None,
+        escalation_reasons=run_statistics.escalation_reasons if run_statistics else {},
+        cascade_tiers=run_statistics.cascade_tiers if run_statistics else [],
     )
     return metadata
@@ -1,5 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Dict, List, Optional
+
+from pheval_ontogpt.run.run_statistics import CascadeTierStatistics
 
 
 @dataclass
@@ -8,3 +11,14 @@ class OntoGPTMetaData:
 
     api_call_date: datetime
     gpt_model: str
+    cases_run: Optional[int] = None
+    average_prompt_tokens_saved: Optional[float] = None
+    cost_usd: Optional[float] = None
+    stop_reason: Optional[str] = None
+    skipped_case_ids: List[str] = field(default_factory=list)
+    truncated_completions: Optional[int] = None
+    salvaged_cases: Optional[int] = None
+    continuation_requests: Optional[int] = None
+    escalation_rate: Optional[float] = None
+    escalation_reasons: Dict[str, int] = field(default_factory=dict)
+    cascade_tiers: List[CascadeTierStatistics] = field(default_factory=list)
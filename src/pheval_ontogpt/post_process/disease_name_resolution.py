@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import re
+from collections import Counter, defaultdict
+from dataclasses import replace
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from pheval.post_processing.post_processing import PhEvalDiseaseResult
+
+logger = logging.getLogger(__name__)
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalise_disease_name(disease_name: str) -> str:
+    """Lowercase a disease name and collapse punctuation and whitespace."""
+    return _NON_ALPHANUMERIC.sub(" ", disease_name.lower()).strip()
+
+
+def normalise_disease_identifier(disease_identifier: str) -> str:
+    """Normalise a disease identifier, prefixing bare numeric IDs with OMIM."""
+    disease_identifier = disease_identifier.strip()
+    if disease_identifier.isdigit():
+        return f"OMIM:{disease_identifier}"
+    prefix, sep, local_id = disease_identifier.partition(":")
+    return f"{prefix.upper()}:{local_id.strip()}" if sep else disease_identifier
+
+
+def _trigrams(normalised_name: str) -> FrozenSet[str]:
+    """Return the character trigrams of a normalised disease name."""
+    padded = f" {normalised_name} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def name_similarity(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Dice coefficient between two trigram sets."""
+    if not first or not second:
+        return 0.0
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+class DiseaseNameIndex:
+    """
+    In-memory token and trigram index of OMIM and MONDO disease names.
+
+    Attributes:
+        disease_names (List[Tuple[str, str]]): (disease identifier, disease name) pairs.
+        max_candidates (int): Number of token-matched candidates scored per query.
+        max_posting_length (int): Tokens shared by more names than this are skipped when
+            gathering candidates, unless the query has no rarer tokens.
+    """
+
+    def __init__(
+        self,
+        disease_names: Iterable[Tuple[str, str]],
+        max_candidates: int = 25,
+        max_posting_length: int = 1000,
+    ):
+        """
+        Initialise the DiseaseNameIndex and build the token postings.
+        """
+        self.disease_names = []
+        self.max_candidates = max_candidates
+        self.max_posting_length = max_posting_length
+        self._trigram_sets: List[Optional[FrozenSet[str]]] = []
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        self._names_by_identifier: Dict[str, List[int]] = defaultdict(list)
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for disease_identifier, disease_name in disease_names:
+            self.add(disease_identifier, disease_name)
+        self.best_match = lru_cache(maxsize=65536)(self._best_match)
+
+    def add(self, disease_identifier: str, disease_name: str) -> None:
+        """Add a disease name to the index."""
+        normalised_name = normalise_disease_name(disease_name)
+        if not normalised_name:
+            return
+        position = len(self.disease_names)
+        self.disease_names.append((normalise_disease_identifier(disease_identifier), disease_name))
+        self._trigram_sets.append(None)
+        self._exact[normalised_name].append(position)
+        self._names_by_identifier[self.disease_names[position][0]].append(position)
+        for token in set(normalised_name.split()):
+            self._postings[token].append(position)
+
+    def _trigram_set(self, position: int) -> FrozenSet[str]:
+        """Trigrams of an indexed name, computed the first time the name is scored."""
+        trigram_set = self._trigram_sets[position]
+        if trigram_set is None:
+            trigram_set = _trigrams(normalise_disease_name(self.disease_names[position][1]))
+            self._trigram_sets[position] = trigram_set
+        return trigram_set
+
+    def __len__(self) -> int:
+        return len(self.disease_names)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """SHA-256 digest of the indexed disease names."""
+        return hashlib.sha256(json.dumps(self.disease_names).encode()).hexdigest()
+
+    def identifier_agreement(self, disease_name: str, disease_identifier: str) -> float:
+        """
+        Similarity between a disease name and the best indexed name for an identifier.
+
+        Returns:
+            float: The similarity, or 0.0 if the identifier is not indexed.
+        """
+        positions = self._names_by_identifier.get(normalise_disease_identifier(disease_identifier))
+        if not positions:
+            return 0.0
+        query = _trigrams(normalise_disease_name(disease_name))
+        return max(name_similarity(query, self._trigram_set(position)) for position in positions)
+
+    def _best_match(self, disease_name: str, prefix: Optional[str] = None) -> Tuple[str, float]:
+        """
+        Find the indexed disease identifier whose name best matches a disease name.
+
+        Args:
+            disease_name (str): The disease name to look up.
+            prefix (Optional[str]): Restrict matches to identifiers with this prefix.
+
+        Returns:
+            Tuple[str, float]: The best matching identifier and its similarity, ("", 0.0) if none.
+        """
+        normalised_name = normalise_disease_name(disease_name)
+        for position in self._exact.get(normalised_name, []):
+            if prefix is None or self.disease_names[position][0].startswith(f"{prefix}:"):
+                return self.disease_names[position][0], 1.0
+        postings = sorted(
+            (
+                self._postings[token]
+                for token in set(normalised_name.split())
+                if token in self._postings
+            ),
+            key=len,
+        )
+        shared_tokens = Counter()
+        for posting in [p for p in postings if len(p) <= self.max_posting_length] or postings[:1]:
+            shared_tokens.update(posting)
+        query = _trigrams(normalised_name)
+        best_identifier, best_similarity = "", 0.0
+        scored = 0
+        for position, _count in shared_tokens.most_common():
+            disease_identifier = self.disease_names[position][0]
+            if prefix is not None and not disease_identifier.startswith(f"{prefix}:"):
+                continue
+            if scored == self.max_candidates:
+                break
+            scored += 1
+            similarity = name_similarity(query, self._trigram_set(position))
+            if similarity > best_similarity:
+                best_identifier, best_similarity = disease_identifier, similarity
+        return best_identifier, best_similarity
+
+    def write(self, index_path: Path) -> None:
+        """Write the indexed disease names, exact name lookup and token postings to a JSON file."""
+        with open(index_path, "w") as index_file:
+            json.dump(
+                {
+                    "disease_names": self.disease_names,
+                    "exact": self._exact,
+                    "postings": self._postings,
+                },
+                index_file,
+            )
+
+    @classmethod
+    def read(cls, index_path: Path) -> "DiseaseNameIndex":
+        """
+        Load a disease name index written by DiseaseNameIndex.write.
+
+        The exact name lookup and token postings are loaded as written rather than rebuilt from
+        the names. Index files holding only a list of disease names are still read, rebuilding
+        the index.
+        """
+        with open(index_path, "r") as index_file:
+            index_data = json.load(index_file)
+        if isinstance(index_data, list):
+            return cls(index_data)
+        disease_name_index = cls(())
+        disease_name_index.disease_names = [tuple(pair) for pair in index_data["disease_names"]]
+        disease_name_index._trigram_sets = [None] * len(disease_name_index.disease_names)
+        disease_name_index._exact.update(index_data["exact"])
+        disease_name_index._postings.update(index_data["postings"])
+        for position, (disease_identifier, _disease_name) in enumerate(
+            disease_name_index.disease_names
+        ):
+            disease_name_index._names_by_identifier[disease_identifier].append(position)
+        return disease_name_index
+
+    @classmethod
+    def from_mondo(cls, mondo_adapter=None) -> "DiseaseNameIndex":
+        """
+        Build the index from MONDO labels and synonyms, including their OMIM cross-references.
+
+        Args:
+            mondo_adapter: An oaklib adapter for MONDO, defaults to sqlite:obo:mondo.
+        """
+        if mondo_adapter is None:
+            from oaklib import get_adapter
+
+            mondo_adapter = get_adapter("sqlite:obo:mondo")
+        mondo_ids = [curie for curie in mondo_adapter.entities() if curie.startswith("MONDO:")]
+        omim_ids = defaultdict(list)
+        for subject, _predicate, mapped_id in mondo_adapter.simple_mappings(mondo_ids):
+            if mapped_id.startswith("OMIM:"):
+                omim_ids[subject].append(mapped_id)
+        disease_names = []
+        for mondo_id in mondo_ids:
+            for disease_name in set(mondo_adapter.entity_aliases(mondo_id) or []):
+                disease_names.append((mondo_id, disease_name))
+                disease_names.extend((omim_id, disease_name) for omim_id in omim_ids[mondo_id])
+        return cls(disease_names)
+
+
+def resolve_disease_identifiers(
+    pheval_disease_results: List[PhEvalDiseaseResult],
+    disease_name_index: DiseaseNameIndex,
+    agreement_threshold: float = 0.5,
+    match_threshold: float = 0.85,
+) -> List[PhEvalDiseaseResult]:
+    """
+    Replace predicted disease identifiers that disagree with their predicted disease names.
+
+    Args:
+        pheval_disease_results (List[PhEvalDiseaseResult]): The extracted disease results.
+        disease_name_index (DiseaseNameIndex): Index of known disease names.
+        agreement_threshold (float): Minimum name similarity for a predicted ID to be kept.
+        match_threshold (float): Minimum name similarity for a replacement ID to be used.
+
+    Returns:
+        List[PhEvalDiseaseResult]: The disease results with corrected identifiers.
+    """
+    resolved_results = []
+    for result in pheval_disease_results:
+        predicted_identifier = normalise_disease_identifier(str(result.disease_identifier))
+        agreement = disease_name_index.identifier_agreement(
+            result.disease_name, predicted_identifier
+        )
+        if agreement < agreement_threshold:
+            prefix = predicted_identifier.partition(":")[0] if ":" in predicted_identifier else None
+            resolved_identifier, similarity = disease_name_index.best_match(
+                result.disease_name, prefix
+            )
+            if similarity >= match_threshold and similarity > agreement:
+                logger.info(
+                    f"Resolved {result.disease_name}: {result.disease_identifier} "
+                    f"-> {resolved_identifier}"
+                )
+                result = replace(result, disease_identifier=resolved_identifier)
+        resolved_results.append(result)
+    return resolved_results
@@ -0,0 +1,287 @@
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:  # orjson parses several times faster, installed with the orjson extra
+    from orjson import JSONDecodeError
+    from orjson import loads as json_loads
+except ImportError:
+    from json import JSONDecodeError
+    from json import loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+GENE_RESULT_KEYS = ("gene_symbol", "score")
+DISEASE_RESULT_KEYS = ("disease_name", "omim_disease_id", "score")
+GENE_RANKINGS_KEY = "gene_rankings"
+DISEASE_RANKINGS_KEY = "disease_rankings"
+
+
+@dataclass(slots=True)
+class OntoGPTResultEntry:
+    """
+    Compact record for a single entry of a raw OntoGPT result.
+
+    Gene and disease fields are optional so that entries from joint prompts
+    can be decoded once and consumed by both analyses.
+
+    Attributes:
+        score (float): The score given to the prediction.
+        gene_symbol (Optional[str]): The predicted gene symbol.
+        disease_name (Optional[str]): The predicted disease name.
+        omim_disease_id (Optional[str]): The predicted OMIM disease identifier.
+        disease_ids (Tuple[str, ...]): Grounded disease identifiers, if present.
+    """
+
+    score: float
+    gene_symbol: Optional[str] = None
+    disease_name: Optional[str] = None
+    omim_disease_id: Optional[str] = None
+    disease_ids: Tuple[str, ...] = ()
+
+    # dictionary-style access so existing extractors consume records unchanged, bound to the
+    # built-in attribute lookup to avoid a Python call per field
+    __getitem__ = object.__getattribute__
+
+    @property
+    def is_gene_result(self) -> bool:
+        """Whether the entry holds the keys required for gene analysis."""
+        return self.gene_symbol is not None
+
+    @property
+    def is_disease_result(self) -> bool:
+        """Whether the entry holds the keys required for disease analysis."""
+        return self.disease_name is not None and self.omim_disease_id is not None
+
+
+@dataclass(frozen=True, slots=True)
+class MalformedEntry:
+    """
+    Report for an entry of a raw OntoGPT result that could not be decoded.
+
+    Attributes:
+        ontogpt_result_path (Path): The raw result file containing the entry.
+        index (Optional[int]): Position of the entry in the result list, None for the whole file.
+        reason (str): Why the entry was rejected.
+    """
+
+    ontogpt_result_path: Path
+    index: Optional[int]
+    reason: str
+
+
+@dataclass(slots=True)
+class DecodedOntoGPTResult:
+    """
+    Decoded and validated raw OntoGPT result.
+
+    Attributes:
+        ontogpt_result_path (Path): The raw result file.
+        gene_results (List[OntoGPTResultEntry]): Entries valid for gene analysis.
+        disease_results (List[OntoGPTResultEntry]): Entries valid for disease analysis.
+        malformed (List[MalformedEntry]): Entries rejected during decoding.
+    """
+
+    ontogpt_result_path: Path
+    gene_results: List[OntoGPTResultEntry] = field(default_factory=list)
+    disease_results: List[OntoGPTResultEntry] = field(default_factory=list)
+    malformed: List[MalformedEntry] = field(default_factory=list)
+
+
+def _score(value: Any) -> Optional[float]:
+    """Return the score of an entry as a float, None if it is missing or not numeric."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _disease_ids(value: Any) -> Tuple[str, ...]:
+    """Return the grounded disease identifiers of an entry, dropping any that are not strings."""
+    if type(value) is not list:
+        return ()
+    return tuple(disease_id for disease_id in value if type(disease_id) is str)
+
+
+def _invalid_entry_reason(
+    entry: Any,
+    score: Optional[float],
+    gene_analysis: bool,
+    disease_analysis: bool,
+    section: Optional[str],
+) -> str:
+    """Return why an entry is not valid for any of the requested analyses."""
+    if not isinstance(entry, dict):
+        reason = f"unexpected {type(entry).__name__} entry"
+    else:
+        required_keys = (GENE_RESULT_KEYS if gene_analysis else ()) + (
+            DISEASE_RESULT_KEYS if disease_analysis else ()
+        )
+        invalid = dict.fromkeys(
+            key
+            for key in required_keys
+            if (score is None if key == "score" else type(entry.get(key)) is not str)
+        )
+        reason = f"missing or invalid keys: {', '.join(invalid)}"
+    return reason if section is None else f"{section}: {reason}"
+
+
+def _collect_entries(
+    decoded: DecodedOntoGPTResult,
+    entries: List,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    section: Optional[str] = None,
+) -> None:
+    """
+    Validate the entries of a result list, collecting records for the requested analyses.
+
+    Gene symbols, disease names and identifiers that are not strings are treated as missing,
+    and disease identifiers that are not strings are dropped.
+    """
+    ontogpt_result_path = decoded.ontogpt_result_path
+    if not entries:
+        decoded.malformed.append(
+            MalformedEntry(ontogpt_result_path, None, f"no {section or 'result'} entries")
+        )
+    gene_results, disease_results = decoded.gene_results, decoded.disease_results
+    for index, entry in enumerate(entries):
+        score = None
+        if type(entry) is dict:
+            get = entry.get
+            score = get("score")
+            if type(score) is not float:
+                score = _score(score)
+        if score is not None:
+            gene_symbol = get("gene_symbol")
+            if type(gene_symbol) is not str:
+                gene_symbol = None
+            disease_name = get("disease_name")
+            if type(disease_name) is not str:
+                disease_name = None
+            omim_disease_id = get("omim_disease_id")
+            if type(omim_disease_id) is not str:
+                omim_disease_id = None
+            gene_result = gene_analysis and gene_symbol is not None
+            disease_result = (
+                disease_analysis and disease_name is not None and omim_disease_id is not None
+            )
+            if gene_result or disease_result:
+                record = OntoGPTResultEntry(
+                    score,
+                    gene_symbol,
+                    disease_name,
+                    omim_disease_id,
+                    _disease_ids(get("disease_ids")),
+                )
+                if gene_result:
+                    gene_results.append(record)
+                if disease_result:
+                    disease_results.append(record)
+                continue
+        if gene_analysis or disease_analysis:
+            decoded.malformed.append(
+                MalformedEntry(
+                    ontogpt_result_path,
+                    index,
+                    _invalid_entry_reason(entry, score, gene_analysis, disease_analysis, section),
+                )
+            )
+
+
+def _section_entries(joint_result: Dict, section: str) -> List:
+    """Return the entries of a section of a joint result as a list."""
+    entries = joint_result.get(section)
+    if entries is None:
+        return []
+    return entries if isinstance(entries, list) else [entries]
+
+
+def is_joint_result(parsed_result: Any) -> bool:
+    """Whether a parsed result is a joint object holding separate gene and disease rankings."""
+    return isinstance(parsed_result, dict) and (
+        GENE_RANKINGS_KEY in parsed_result or DISEASE_RANKINGS_KEY in parsed_result
+    )
+
+
+def decode_ontogpt_json(
+    payload: Union[str, bytes],
+    ontogpt_result_path: Path,
+    gene_analysis: bool = False,
+    disease_analysis: bool = False,
+) -> DecodedOntoGPTResult:
+    """
+    Decode a raw OntoGPT JSON payload and validate its entries in a single pass.
+
+    Joint results, objects with separate gene_rankings and disease_rankings lists, are split so
+    that gene entries are only validated for gene analysis and disease entries for disease analysis.
+
+    Args:
+        payload (Union[str, bytes]): The raw JSON payload.
+        ontogpt_result_path (Path): The raw result file the payload was read from.
+        gene_analysis (bool): Collect entries valid for gene analysis.
+        disease_analysis (bool): Collect entries valid for disease analysis.
+
+    Returns:
+        DecodedOntoGPTResult: The decoded entries along with any malformed entries.
+    """
+    decoded = DecodedOntoGPTResult(ontogpt_result_path=ontogpt_result_path)
+    try:
+        parsed_result = json_loads(payload)
+    except JSONDecodeError as e:
+        decoded.malformed.append(MalformedEntry(ontogpt_result_path, None, f"invalid JSON: {e}"))
+        return decoded
+    if is_joint_result(parsed_result):
+        if gene_analysis:
+            _collect_entries(
+                decoded,
+                _section_entries(parsed_result, GENE_RANKINGS_KEY),
+                True,
+                False,
+                GENE_RANKINGS_KEY,
+            )
+        if disease_analysis:
+            _collect_entries(
+                decoded,
+                _section_entries(parsed_result, DISEASE_RANKINGS_KEY),
+                False,
+                True,
+                DISEASE_RANKINGS_KEY,
+            )
+        return decoded
+    entries = [parsed_result] if not isinstance(parsed_result, list) else parsed_result
+    _collect_entries(decoded, entries, gene_analysis, disease_analysis)
+    return decoded
+
+
+def decode_ontogpt_result(
+    ontogpt_result_path: Path, gene_analysis: bool = False, disease_analysis: bool = False
+) -> DecodedOntoGPTResult:
+    """
+    Read and decode a raw OntoGPT .json result.
+
+    Args:
+        ontogpt_result_path (Path): Path to the raw OntoGPT result.
+        gene_analysis (bool): Collect entries valid for gene analysis.
+        disease_analysis (bool): Collect entries valid for disease analysis.
+
+    Returns:
+        DecodedOntoGPTResult: The decoded entries along with any malformed entries.
+    """
+    return decode_ontogpt_json(
+        ontogpt_result_path.read_bytes(), ontogpt_result_path, gene_analysis, disease_analysis
+    )
+
+
+def log_malformed_entries(decoded_result: DecodedOntoGPTResult) -> None:
+    """Log a structured warning for each malformed entry of a decoded result."""
+    for malformed in decoded_result.malformed:
+        logger.warning(
+            "Malformed OntoGPT result entry: file=%s index=%s reason=%s",
+            malformed.ontogpt_result_path.name,
+            malformed.index,
+            malformed.reason,
+        )
@@ -1,10 +1,19 @@
 from pathlib import Path
 
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater
+
+from pheval_ontogpt.post_process.disease_name_resolution import DiseaseNameIndex
 from pheval_ontogpt.post_process.post_process_results_format import create_standardised_results
 
 
 def post_process_results_format(
-    raw_results_dir: Path, output_dir: Path, gene_analysis: bool, disease_analysis: bool
+    raw_results_dir: Path,
+    output_dir: Path,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    disease_name_index_path: Path = None,
+    disease_name_index: DiseaseNameIndex = None,
+    gene_identifier_updator: GeneIdentifierUpdater = None,
 ):
     """Create pheval disease result from OntoGPT json output."""
     print("...creating pheval results format...")
@@ -13,5 +22,11 @@ def post_process_results_format(
         output_dir=output_dir,
         gene_analysis=gene_analysis,
         disease_analysis=disease_analysis,
+        disease_name_index=(
+            DiseaseNameIndex.read(disease_name_index_path)
+            if disease_name_index is None and disease_name_index_path is not None
+            else disease_name_index
+        ),
+        gene_identifier_updator=gene_identifier_updator,
     )
     print("done")
@@ -1,6 +1,5 @@
-import json
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import List
 
 import click
 from pheval.post_processing.post_processing import (
@@ -11,83 +10,24 @@ from pheval.post_processing.post_processing import (
 from pheval.utils.file_utils import files_with_suffix
 from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_hgnc_dict
 
-
-class CheckResultFormat:
-    """
-    Class to check the format of a parsed JSON result for required keys
-    based on the type of analysis.
-
-    Attributes:
-        parsed_result (Union[str, List[str]]): The parsed JSON result.
-        gene_analysis (bool): Flag to indicate if gene analysis keys are required.
-        disease_analysis (bool): Flag to indicate if disease analysis keys are required.
-    """
-
-    def __init__(
-        self, parsed_result: Union[Dict, List[str]], gene_analysis: bool, disease_analysis: bool
-    ):
-        """
-        Initialise the CheckResultFormat class with parsed JSON result and analysis flags.
-        """
-        self.parsed_result = parsed_result
-        self.gene_analysis = gene_analysis
-        self.disease_analysis = disease_analysis
-
-    def check_keys_in_dict_format_json(self) -> Union[Dict, None]:
-        """
-        Check for required keys in a dictionary format JSON result.
-
-        Returns:
-            Union[Dict, None]: The parsed result if required keys are present, otherwise None.
-        """
-        if self.gene_analysis and all(
-            key in self.parsed_result for key in ["score", "gene_symbol"]
-        ):
-            return self.parsed_result
-        elif self.disease_analysis and all(
-            key in self.parsed_result for key in ["disease_name", "omim_disease_id", "score"]
-        ):
-            return self.parsed_result
-
-    def check_keys_in_list_format_json(self) -> Union[List[Dict], None]:
-        """
-        Check for required keys in a list of dictionaries format JSON result.
-
-        Returns:
-            Union[List[Dict], None]: A list of dictionaries with required keys if any, otherwise None.
-        """
-        filtered_results = []
-        for entry in self.parsed_result:
-            if self.gene_analysis and all(key in entry for key in ["score", "gene_symbol"]):
-                filtered_results.append(entry)
-            elif self.disease_analysis and all(
-                key in entry for key in ["disease_name", "omim_disease_id", "score"]
-            ):
-                filtered_results.append(entry)
-        return filtered_results if filtered_results else None
-
-    def check_result_format(self) -> Union[Dict, List[Dict], None]:
-        """
-        Determine the format of the parsed JSON result and check for required keys.
-
-        Returns:
-            Union[Dict, List[Dict], None]: The parsed result if required keys are present, otherwise None.
-        """
-        if isinstance(self.parsed_result, list):
-            return self.check_keys_in_list_format_json()
-        if isinstance(self.parsed_result, dict):
-            return self.check_keys_in_dict_format_json()
-        return None
-
-
-def read_ontogpt_result(
-    ontogpt_result_path: Path, gene_analysis: bool = False, disease_analysis: bool = False
-) -> [dict]:
-    """Read .json OntoGPT result."""
-    with open(ontogpt_result_path, "r") as result:
-        parsed_result = json.load(result)
-    result.close()
-    return CheckResultFormat(parsed_result, gene_analysis, disease_analysis).check_result_format()
+from pheval_ontogpt.post_process.disease_name_resolution import (
+    DiseaseNameIndex,
+    resolve_disease_identifiers,
+)
+from pheval_ontogpt.post_process.ontogpt_result_decoder import (
+    DecodedOntoGPTResult,
+    decode_ontogpt_json,
+    log_malformed_entries,
+)
+from pheval_ontogpt.post_process.standardisation_manifest import (
+    StandardisationManifest,
+    content_digest,
+)
+from pheval_ontogpt.run.raw_results_store import (
+    RAW_RESULTS_STORE_FILE_NAME,
+    RawResultsStore,
+    ontogpt_result_file_name,
+)
 
 
 def trim_ontogpt_result(ontogpt_result_path: Path) -> Path:
@@ -210,44 +150,142 @@ class PhEvalGeneResultFromOntoGPT:
         return pheval_gene_results
 
 
+def standardise_ontogpt_result(
+    decoded_result: DecodedOntoGPTResult,
+    output_dir: Path,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    sort_order: str,
+    gene_identifier_updator: GeneIdentifierUpdater,
+    disease_name_index: DiseaseNameIndex = None,
+) -> List[Path]:
+    """
+    Write standardised PhEval results for a single decoded OntoGPT result.
+
+    Returns:
+        List[Path]: The standardised result files written.
+    """
+    log_malformed_entries(decoded_result)
+    tool_result_path = trim_ontogpt_result(decoded_result.ontogpt_result_path)
+    outputs = []
+    if disease_analysis and decoded_result.disease_results:
+        pheval_disease_result = PhEvalDiseaseResultFromOntoGPT(
+            decoded_result.disease_results
+        ).extract_pheval_requirements()
+        if disease_name_index is not None:
+            pheval_disease_result = resolve_disease_identifiers(
+                pheval_disease_result, disease_name_index
+            )
+        generate_pheval_result(pheval_disease_result, sort_order, output_dir, tool_result_path)
+        outputs.append(
+            output_dir.joinpath(
+                "pheval_disease_results", f"{tool_result_path.stem}-pheval_disease_result.tsv"
+            )
+        )
+
+    if gene_analysis and decoded_result.gene_results:
+        pheval_gene_result = PhEvalGeneResultFromOntoGPT(
+            decoded_result.gene_results, gene_identifier_updator
+        ).extract_pheval_requirements()
+        generate_pheval_result(pheval_gene_result, sort_order, output_dir, tool_result_path)
+        outputs.append(
+            output_dir.joinpath(
+                "pheval_gene_results", f"{tool_result_path.stem}-pheval_gene_result.tsv"
+            )
+        )
+    return outputs
+
+
 def create_standardised_results(
     raw_results_dir: Path,
     output_dir: Path,
     gene_analysis: bool,
     disease_analysis: bool,
     sort_order: str = "descending",
+    disease_name_index: DiseaseNameIndex = None,
+    incremental: bool = False,
+    gene_identifier_updator: GeneIdentifierUpdater = None,
 ) -> None:
-    """Write standardised PhEval results from OntoGPT json output."""
+    """
+    Write standardised PhEval results from OntoGPT json output.
+
+    Raw results are read from the per-phenopacket JSON files in the raw results directory
+    and streamed from the raw results store, if one exists there.
 
-    gene_identifier_updator = GeneIdentifierUpdater(
-        hgnc_data=create_hgnc_dict(), gene_identifier="ensembl_id"
+    If a disease name index is provided, predicted disease identifiers that strongly disagree
+    with their predicted disease names are replaced with the best matching indexed identifier.
+
+    If incremental, a manifest of raw result content hashes and settings is kept in the output
+    directory; only raw results whose content or settings changed are standardised again, and
+    outputs of raw results that no longer exist are removed.
+    """
+    if gene_identifier_updator is None:
+        gene_identifier_updator = GeneIdentifierUpdater(
+            hgnc_data=create_hgnc_dict(), gene_identifier="ensembl_id"
+        )
+    manifest = (
+        StandardisationManifest.load(
+            output_dir,
+            {
+                "gene_analysis": gene_analysis,
+                "disease_analysis": disease_analysis,
+                "sort_order": sort_order,
+                "disease_name_index": (
+                    disease_name_index.fingerprint if disease_name_index is not None else None
+                ),
+            },
+        )
+        if incremental
+        else None
     )
-    for ontogpt_result_file in files_with_suffix(raw_results_dir, ".json"):
-        ontogpt_result = read_ontogpt_result(ontogpt_result_file, gene_analysis, disease_analysis)
-        if not ontogpt_result:
-            print(ontogpt_result_file)
-            continue
-        if disease_analysis:
-            pheval_disease_result = PhEvalDiseaseResultFromOntoGPT(
-                ontogpt_result
-            ).extract_pheval_requirements()
-            generate_pheval_result(
-                pheval_disease_result,
-                sort_order,
+    raw_result_names = []
+
+    def standardise_payload(
+        payload: bytes, ontogpt_result_path: Path, raw_result_file: Path = None
+    ) -> None:
+        raw_result_names.append(ontogpt_result_path.name)
+        if manifest is None:
+            standardise_ontogpt_result(
+                decode_ontogpt_json(payload, ontogpt_result_path, gene_analysis, disease_analysis),
                 output_dir,
-                trim_ontogpt_result(ontogpt_result_file),
-            )
-
-        if gene_analysis:
-            pheval_gene_result = PhEvalGeneResultFromOntoGPT(
-                ontogpt_result, gene_identifier_updator
-            ).extract_pheval_requirements()
-            generate_pheval_result(
-                pheval_gene_result,
+                gene_analysis,
+                disease_analysis,
                 sort_order,
+                gene_identifier_updator,
+                disease_name_index,
+            )
+            return
+        digest = content_digest(payload)
+        outputs = None
+        if not manifest.is_unchanged_content(ontogpt_result_path.name, digest):
+            outputs = standardise_ontogpt_result(
+                decode_ontogpt_json(payload, ontogpt_result_path, gene_analysis, disease_analysis),
                 output_dir,
-                trim_ontogpt_result(ontogpt_result_file),
+                gene_analysis,
+                disease_analysis,
+                sort_order,
+                gene_identifier_updator,
+                disease_name_index,
             )
+        manifest.record(ontogpt_result_path.name, digest, outputs, raw_result_file)
+
+    for ontogpt_result_file in files_with_suffix(raw_results_dir, ".json"):
+        if manifest is not None and manifest.is_unchanged_file(ontogpt_result_file):
+            raw_result_names.append(ontogpt_result_file.name)
+            continue
+        standardise_payload(
+            ontogpt_result_file.read_bytes(), ontogpt_result_file, ontogpt_result_file
+        )
+    raw_results_store_path = raw_results_dir.joinpath(RAW_RESULTS_STORE_FILE_NAME)
+    if raw_results_store_path.exists():
+        with RawResultsStore(raw_results_store_path, read_only=True) as raw_results_store:
+            for case_id, payload in raw_results_store.iter_latest():
+                standardise_payload(
+                    payload, raw_results_dir.joinpath(ontogpt_result_file_name(case_id))
+                )
+    if manifest is not None:
+        manifest.remove_stale(raw_result_names)
+        manifest.write()
 
 
 @click.command("standardise")
@@ -283,11 +321,82 @@ def create_standardised_results(
     show_default=True,
     help="Specify analysis for disease prioritisation",
 )
+@click.option(
+    "--disease-name-index",
+    "-d",
+    required=False,
+    metavar="FILE",
+    help="Disease name index used to correct predicted disease identifiers.",
+    type=Path,
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    required=False,
+    type=bool,
+    show_default=True,
+    help="Only standardise raw results that changed since the previous standardisation.",
+)
 def create_standardised_results_command(
-    raw_results_dir: Path, output_dir: Path, gene_analysis: bool, disease_analysis: bool
+    raw_results_dir: Path,
+    output_dir: Path,
+    gene_analysis: bool,
+    disease_analysis: bool,
+    disease_name_index: Path = None,
+    incremental: bool = False,
 ):
     if disease_analysis:
         output_dir.joinpath("pheval_disease_results").mkdir(exist_ok=True)
     if gene_analysis:
         output_dir.joinpath("pheval_gene_results").mkdir(exist_ok=True)
-    create_standardised_results(raw_results_dir, output_dir, gene_analysis, disease_analysis)
+    create_standardised_results(
+        raw_results_dir,
+        output_dir,
+        gene_analysis,
+        disease_analysis,
+        disease_name_index=(
+            DiseaseNameIndex.read(disease_name_index) if disease_name_index is not None else None
+        ),
+        incremental=incremental,
+    )
+
+
+@click.command("build-disease-name-index")
+@click.option(
+    "--output",
+    "-o",
+    required=True,
+    metavar="FILE",
+    help="Output path for the disease name index.",
+    type=Path,
+)
+def build_disease_name_index_command(output: Path):
+    """Build a disease name index from MONDO and its OMIM cross-references."""
+    DiseaseNameIndex.from_mondo().write(output)
+
+
+@click.command("export-raw-results")
+@click.option(
+    "--raw-results-dir",
+    "-R",
+    required=True,
+    metavar="DIRECTORY",
+    help="Full path to Ontogpt results directory containing the raw results store.",
+    type=Path,
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    required=True,
+    metavar="PATH",
+    help="Output directory for the per-phenopacket raw results.",
+    type=Path,
+)
+def export_raw_results_command(raw_results_dir: Path, output_dir: Path):
+    """Export the raw results store to one JSON file per phenopacket."""
+    store_path = raw_results_dir.joinpath(RAW_RESULTS_STORE_FILE_NAME)
+    if not store_path.is_file():
+        raise click.ClickException(f"No raw results store found at {store_path}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with RawResultsStore(store_path, read_only=True) as store:
+        print(f"exported {store.export_json(output_dir)} raw results")
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_FILE_NAME = ".ontogpt_standardisation_manifest.json"
+
+
+def content_digest(content: bytes) -> str:
+    """Return the SHA-256 digest of raw result content."""
+    return hashlib.sha256(content).hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """
+    Record of a raw OntoGPT result as it was last standardised.
+
+    Attributes:
+        digest (str): SHA-256 digest of the raw result content.
+        size (int): Size of the raw result file in bytes.
+        mtime_ns (int): Modification time of the raw result file in nanoseconds.
+        outputs (List[str]): Standardised result paths written, relative to the output directory.
+    """
+
+    digest: str
+    size: int = 0
+    mtime_ns: int = 0
+    outputs: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StandardisationManifest:
+    """
+    Manifest of raw result content hashes and settings used by a previous standardisation.
+
+    Attributes:
+        output_dir (Path): The directory containing the standardised results.
+        settings (Dict): The analysis flags and options the outputs were created with.
+        entries (Dict[str, ManifestEntry]): Manifest entries keyed by raw result name.
+    """
+
+    output_dir: Path
+    settings: Dict
+    entries: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.output_dir.joinpath(MANIFEST_FILE_NAME)
+
+    @classmethod
+    def load(cls, output_dir: Path, settings: Dict) -> "StandardisationManifest":
+        """
+        Load the manifest for an output directory.
+
+        If the manifest was written with different settings, only the outputs of its entries
+        are kept, so that every output is rebuilt and outdated outputs are cleaned up.
+        """
+        manifest = cls(output_dir=output_dir, settings=settings)
+        try:
+            with open(manifest.manifest_path, "r") as manifest_file:
+                stored = json.load(manifest_file)
+        except (OSError, json.JSONDecodeError):
+            return manifest
+        manifest.entries = {
+            name: ManifestEntry(**entry) for name, entry in stored.get("entries", {}).items()
+        }
+        if stored.get("settings") != settings:
+            manifest.entries = {
+                name: ManifestEntry(digest="", outputs=entry.outputs)
+                for name, entry in manifest.entries.items()
+            }
+        return manifest
+
+    def _outputs_exist(self, entry: ManifestEntry) -> bool:
+        return all(self.output_dir.joinpath(output).exists() for output in entry.outputs)
+
+    def is_unchanged_file(self, ontogpt_result_path: Path) -> bool:
+        """Check whether a raw result file is unchanged by its size and modification time."""
+        entry = self.entries.get(ontogpt_result_path.name)
+        if entry is None:
+            return False
+        stat = ontogpt_result_path.stat()
+        return (
+            entry.size == stat.st_size
+            and entry.mtime_ns == stat.st_mtime_ns
+            and self._outputs_exist(entry)
+        )
+
+    def is_unchanged_content(self, name: str, digest: str) -> bool:
+        """Check whether raw result content is unchanged by its digest."""
+        entry = self.entries.get(name)
+        return entry is not None and entry.digest == digest and self._outputs_exist(entry)
+
+    def record(
+        self,
+        name: str,
+        digest: str,
+        outputs: Optional[List[Path]] = None,
+        ontogpt_result_path: Optional[Path] = None,
+    ) -> None:
+        """
+        Record the content digest and outputs of a standardised raw result.
+
+        Outputs of a previous standardisation that were not written again are deleted.
+        If outputs is None the outputs of the existing entry are kept.
+        """
+        existing = self.entries.get(name)
+        entry = ManifestEntry(
+            digest=digest,
+            outputs=(
+                [str(output.relative_to(self.output_dir)) for output in outputs]
+                if outputs is not None
+                else (existing.outputs if existing else [])
+            ),
+        )
+        if existing is not None:
+            for output in set(existing.outputs) - set(entry.outputs):
+                self.output_dir.joinpath(output).unlink(missing_ok=True)
+        if ontogpt_result_path is not None:
+            stat = ontogpt_result_path.stat()
+            entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+        self.entries[name] = entry
+
+    def remove_stale(self, current_names: List[str]) -> List[str]:
+        """
+        Delete the outputs of raw results that no longer exist and drop their entries.
+
+        Returns:
+            List[str]: The names of the removed raw results.
+        """
+        stale_names = set(self.entries) - set(current_names)
+        for name in stale_names:
+            for output in self.entries.pop(name).outputs:
+                self.output_dir.joinpath(output).unlink(missing_ok=True)
+        return sorted(stale_names)
+
+    def write(self) -> None:
+        """Atomically write the manifest to the output directory."""
+        temporary_path = self.manifest_path.with_suffix(".tmp")
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(
+                {
+                    "settings": self.settings,
+                    "entries": {name: entry.__dict__ for name, entry in self.entries.items()},
+                },
+                manifest_file,
+            )
+        os.replace(temporary_path, self.manifest_path)
@@ -0,0 +1,146 @@
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, List
+
+from phenopackets import PhenotypicFeature
+
+from pheval_ontogpt.run.token_count import count_tokens
+
+
+@dataclass
+class CompressionStatistics:
+    """
+    Running totals of the prompt tokens removed by HPO term compression.
+
+    Attributes:
+        prompts (int): Number of compressed prompts sent to the model.
+        tokens_saved (int): Total number of tokens removed.
+    """
+
+    prompts: int = 0
+    tokens_saved: int = 0
+
+    @property
+    def average_tokens_saved(self) -> float:
+        """Average number of tokens removed per prompt."""
+        return self.tokens_saved / self.prompts if self.prompts else 0.0
+
+
+class PhenotypicFeatureCompressor:
+    """
+    Class for compressing the phenotypic features of a phenopacket before they are added to a prompt,
+    removing excluded features, features that are ancestors of another observed feature and
+    duplicate labels.
+
+    Attributes:
+        ancestor_closure (Dict[str, FrozenSet[str]]): Precomputed is_a ancestors of each HPO term,
+            excluding the term itself.
+        model (str): Model used to count the tokens saved.
+    """
+
+    def __init__(self, ancestor_closure: Dict[str, FrozenSet[str]], model: str = None):
+        self.ancestor_closure = ancestor_closure
+        self.model = model
+        self.statistics = CompressionStatistics()
+        self._statistics_lock = threading.Lock()
+
+    @staticmethod
+    def build_ancestor_closure(hpo_adapter=None) -> Dict[str, FrozenSet[str]]:
+        """
+        Precompute the is_a ancestors of every HPO term.
+
+        Args:
+            hpo_adapter: An oaklib adapter for HPO, defaults to sqlite:obo:hp.
+        """
+        from oaklib.datamodels.vocabulary import IS_A
+
+        if hpo_adapter is None:
+            from oaklib import get_adapter
+
+            hpo_adapter = get_adapter("sqlite:obo:hp")
+        parents = {}
+        for subject, _predicate, parent in hpo_adapter.relationships(predicates=[IS_A]):
+            if subject.startswith("HP:") and parent.startswith("HP:"):
+                parents.setdefault(subject, set()).add(parent)
+        closure = {}
+
+        def ancestors(term_id: str) -> FrozenSet[str]:
+            stack = [term_id]
+            while stack:
+                current = stack[-1]
+                pending = [p for p in parents.get(current, ()) if p not in closure]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                closure[current] = frozenset().union(
+                    *({p} | closure[p] for p in parents.get(current, ()))
+                )
+            return closure[term_id]
+
+        for term_id in parents:
+            if term_id not in closure:
+                ancestors(term_id)
+        return closure
+
+    @classmethod
+    def from_closure_file(
+        cls, closure_path: Path, model: str = None
+    ) -> "PhenotypicFeatureCompressor":
+        """
+        Load a precomputed ancestor closure, building and writing it first if it does not exist.
+        """
+        if not closure_path.exists():
+            closure = cls.build_ancestor_closure()
+            with open(closure_path, "w") as closure_file:
+                json.dump(
+                    {term: sorted(ancestors) for term, ancestors in closure.items()}, closure_file
+                )
+            return cls(closure, model)
+        with open(closure_path, "r") as closure_file:
+            closure = {
+                term: frozenset(ancestors) for term, ancestors in json.load(closure_file).items()
+            }
+        return cls(closure, model)
+
+    def compress(self, phenotypic_features: List[PhenotypicFeature]) -> List[str]:
+        """
+        Return the labels of the observed phenotypic features that are not redundant.
+
+        Args:
+            phenotypic_features (List[PhenotypicFeature]): The phenotypic features of a phenopacket.
+
+        Returns:
+            List[str]: Deduplicated labels of the most specific observed features.
+        """
+        observed = [feature for feature in phenotypic_features if not feature.excluded]
+        redundant = frozenset().union(
+            *(self.ancestor_closure.get(feature.type.id, ()) for feature in observed)
+        )
+        labels, seen = [], set()
+        for feature in observed:
+            if feature.type.id in redundant or feature.type.label.lower() in seen:
+                continue
+            seen.add(feature.type.label.lower())
+            labels.append(feature.type.label)
+        return labels
+
+    def record(self, phenotypic_features: List[PhenotypicFeature], prompts: int = 1) -> None:
+        """
+        Add the tokens removed from prompts sent to the model to the statistics.
+
+        Prompts are also rendered to plan requests and estimate their cost, so savings are
+        recorded by the caller sending them rather than on every compression.
+
+        Args:
+            phenotypic_features (List[PhenotypicFeature]): The phenotypic features of a phenopacket.
+            prompts (int): Number of prompts sent with the compressed features.
+        """
+        tokens_saved = count_tokens(
+            str([feature.type.label for feature in phenotypic_features]), self.model
+        ) - count_tokens(str(self.compress(phenotypic_features)), self.model)
+        with self._statistics_lock:
+            self.statistics.prompts += prompts
+            self.statistics.tokens_saved += prompts * tokens_saved
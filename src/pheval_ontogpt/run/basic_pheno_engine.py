@@ -2,8 +2,10 @@
 
 import json
 import logging
+import os
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Union
 
@@ -15,6 +17,15 @@ from ontogpt.engines.knowledge_engine import KnowledgeEngine
 from phenopackets import Diagnosis, Phenopacket
 from pydantic import BaseModel
 
+from pheval_ontogpt.prepare.compress_phenotypic_features import PhenotypicFeatureCompressor
+from pheval_ontogpt.run.continuation import (
+    ContinuationStatistics,
+    continuation_prompt,
+    is_truncated,
+    stitch,
+)
+from pheval_ontogpt.run.local_client import LocalCompletionClient
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,11 +43,30 @@ class DiagnosisPrediction(BaseModel):
     prompt: Optional[str] = None
 
 
+@lru_cache(maxsize=64)
+def load_template(template_path: str, mtime_ns: int) -> Template:
+    """Create a Jinja2 template object, cached until the template file is modified."""
+    with open(template_path) as file:
+        return Template(file.read())
+
+
 @dataclass
 class PhenoEngine(KnowledgeEngine):
     model = None
     completion_length = 700
     _mondo: TextAnnotatorInterface = None
+    phenotypic_feature_compressor: PhenotypicFeatureCompressor = None
+    batch_size: int = 1
+    max_continuations: int = 2
+    repair_fallback: bool = True
+    continuation_statistics: ContinuationStatistics = field(default_factory=ContinuationStatistics)
+
+    def set_up_client(self, model_source: str):
+        """Set up a local CPU client for the local model source, otherwise defer to OntoGPT."""
+        if model_source == "local":
+            self.client = LocalCompletionClient(model=self.model, batch_size=self.batch_size)
+        else:
+            super().set_up_client(model_source)
 
     @property
     def mondo(self):
@@ -44,32 +74,44 @@ class PhenoEngine(KnowledgeEngine):
             self._mondo = get_adapter("sqlite:obo:mondo")
         return self._mondo
 
-    def predict(
+    def hpo_terms(self, phenopacket: Phenopacket) -> List[str]:
+        """Return the phenotypic feature labels to add to the prompt, compressed if configured."""
+        if self.phenotypic_feature_compressor is not None:
+            return self.phenotypic_feature_compressor.compress(phenopacket.phenotypic_features)
+        return [hpo_term.type.label for hpo_term in phenopacket.phenotypic_features]
+
+    def record_sent_prompts(self, phenopacket: Phenopacket, prompts: int = 1) -> None:
+        """Record the tokens saved by HPO term compression in prompts sent for a phenopacket."""
+        if self.phenotypic_feature_compressor is not None:
+            self.phenotypic_feature_compressor.record(phenopacket.phenotypic_features, prompts)
+
+    def render_prompt(
         self,
         phenopacket: Phenopacket,
         template_path: Union[str, Path] = None,
         constrained_list: [str] = None,
-    ) -> List[Diagnosis]:
+    ) -> str:
+        """Render the prompt for a phenopacket."""
         # if template_path is None:
         #     template_path = DEFAULT_PHENOPACKET_PROMPT
         if isinstance(template_path, Path):
             template_path = str(template_path)
         if isinstance(template_path, str):
-            # create a Jinja2 template object
-            with open(template_path) as file:
-                template_txt = file.read()
-                template = Template(template_txt)
-        hpo_terms = [hpo_term.type.label for hpo_term in phenopacket.phenotypic_features]
+            template = load_template(template_path, os.stat(template_path).st_mtime_ns)
+        hpo_terms = self.hpo_terms(phenopacket)
         if constrained_list is None:
-            prompt = template.render(
+            return template.render(
                 hpo_terms=hpo_terms,
             )
-        else:
-            prompt = template.render(hpo_terms=hpo_terms, constrained_list=constrained_list)
-        payload = self.client.complete(prompt, max_tokens=self.completion_length)
+        return template.render(hpo_terms=hpo_terms, constrained_list=constrained_list)
+
+    def parse_payload(self, payload: str) -> List[Diagnosis]:
+        """Repair common formatting errors in a completion and parse it as JSON."""
         payload = payload.replace(",\n  }", "\n  }")
         payload = payload.replace('"}', "}")
         payload = payload.replace("},\n ]", "}\n ]")
+        # trailing commas at any indentation, as in the nested lists of joint results
+        payload = re.sub(r",(\s*[\]}])", r"\1", payload)
         last_brace_index = payload.rfind("}")
         payload = payload[: last_brace_index + 1] + payload[last_brace_index + 1 :].lstrip(",")
         try:  # try load as JSON
@@ -77,8 +119,13 @@ class PhenoEngine(KnowledgeEngine):
             # self.enhance_payload(obj)
             return obj
         except json.JSONDecodeError as e:
+            if not self.repair_fallback:
+                logger.warning(f"Error decoding, not extracting a result: {e}")
+                return []
             logger.error(f"Error decoding - trying again: {payload}")
-            match = re.search(r"\[.*?\]", payload, re.DOTALL)
+            match = re.search(r"\{\s*\"(gene|disease)_rankings\".*\}", payload, re.DOTALL)
+            if match is None:
+                match = re.search(r"\[.*?\]", payload, re.DOTALL)
             if match:
                 if match.group() != payload:
                     try:
@@ -93,7 +140,83 @@ class PhenoEngine(KnowledgeEngine):
             logger.error(f"Payload: {payload}")
         return []
 
+    def continue_payload(self, prompt: str, payload: str) -> List[Diagnosis]:
+        """
+        Parse a completion, first continuing it if it was cut off at the completion length.
+
+        Up to max_continuations continuation requests are made, each stitched onto the output
+        so far, until the JSON value is complete. Clients that can resume generation from the
+        partial output do so, otherwise the model is prompted with the partial output.
+        """
+        if self.max_continuations <= 0 or not is_truncated(payload):
+            return self.parse_payload(payload)
+        requests = 0
+        while requests < self.max_continuations and is_truncated(payload):
+            requests += 1
+            if hasattr(self.client, "continue_completion"):
+                continuation = self.client.continue_completion(
+                    prompt, payload, max_tokens=self.completion_length
+                )
+            else:
+                continuation = self.client.complete(
+                    continuation_prompt(prompt, payload), max_tokens=self.completion_length
+                )
+            payload = stitch(payload, continuation)
+        result = self.parse_payload(payload)
+        self.continuation_statistics.record(requests, salvaged=bool(result))
+        logger.info(
+            f"Continued a truncated completion with {requests} requests, "
+            f"{'salvaged' if result else 'could not be parsed'}"
+        )
+        return result
+
+    def predict(
+        self,
+        phenopacket: Phenopacket,
+        template_path: Union[str, Path] = None,
+        constrained_list: [str] = None,
+    ) -> List[Diagnosis]:
+        prompt = self.render_prompt(phenopacket, template_path, constrained_list)
+        payload = self.client.complete(prompt, max_tokens=self.completion_length)
+        self.record_sent_prompts(phenopacket)
+        return self.continue_payload(prompt, payload)
+
+    def predict_batch(
+        self,
+        phenopackets: List[Phenopacket],
+        template_path: Union[str, Path] = None,
+        constrained_list: [str] = None,
+    ) -> List[List[Diagnosis]]:
+        """
+        Predict diagnoses for several phenopackets.
+
+        Prompts are completed in a single batch if the client supports it,
+        otherwise one at a time.
+        """
+        prompts = [
+            self.render_prompt(phenopacket, template_path, constrained_list)
+            for phenopacket in phenopackets
+        ]
+        if hasattr(self.client, "complete_batch"):
+            payloads = self.client.complete_batch(prompts, max_tokens=self.completion_length)
+        else:
+            payloads = [
+                self.client.complete(prompt, max_tokens=self.completion_length)
+                for prompt in prompts
+            ]
+        for phenopacket in phenopackets:
+            self.record_sent_prompts(phenopacket)
+        return [
+            self.continue_payload(prompt, payload) for prompt, payload in zip(prompts, payloads)
+        ]
+
     def evaluate(self, phenopackets: List[Phenopacket]) -> List[DiagnosisPrediction]:
+        """
+        Predict and evaluate diagnoses for phenopackets, calling the model for each case.
+
+        The rank is left as None if no prediction matches. To score existing raw results
+        without calling the model, use pheval_ontogpt.run.bulk_evaluation.evaluate_raw_results.
+        """
         mondo = self.mondo
         if not isinstance(mondo, MappingProviderInterface):
             raise TypeError("Mondo adapter must implement MappingProviderInterface")
@@ -118,14 +241,13 @@ class PhenoEngine(KnowledgeEngine):
             diagnoses = self.predict(phenopacket)
             dp.predicted_disease_ids = []
             dp.predicted_disease_labels = []
-            dp.rank = 999
             for i, diagnosis in enumerate(diagnoses):
                 predicted_disease_ids = diagnosis["disease_ids"]
                 dp.predicted_disease_ids.append(";".join(predicted_disease_ids))
                 dp.predicted_disease_labels.append(diagnosis["disease"])
                 matches = set(dp.validated_mondo_disease_ids).intersection(predicted_disease_ids)
                 if matches:
-                    print("Found match at index", i)
+                    logger.debug(f"Found match for {dp.case_id} at index {i}")
                     dp.rank = i
                     dp.matching_disease_ids = list(matches)
                     break
@@ -0,0 +1,264 @@
+"""Bulk evaluation of raw OntoGPT results without calling the model."""
+
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
+from pathlib import Path
+from typing import Callable, List, Sequence, Tuple
+
+import click
+import pandas as pd
+from pheval.post_processing.post_processing import ScoreRanker, SortOrder
+from pheval.utils.file_utils import all_files, files_with_suffix
+from pheval.utils.phenopacket_utils import PhenopacketUtil, phenopacket_reader
+
+from pheval_ontogpt.post_process.disease_name_resolution import normalise_disease_identifier
+from pheval_ontogpt.post_process.ontogpt_result_decoder import (
+    DecodedOntoGPTResult,
+    decode_ontogpt_json,
+    decode_ontogpt_result,
+)
+from pheval_ontogpt.run.raw_results_store import (
+    RAW_RESULTS_STORE_FILE_NAME,
+    RawResultsStore,
+    ontogpt_result_file_name,
+)
+
+DEFAULT_TOP_K = (1, 3, 5, 10)
+
+
+def _case_id(ontogpt_result_path: Path) -> str:
+    """Return the phenopacket stem a raw result was written for."""
+    return ontogpt_result_path.name.replace("-ontogpt_result.json", "")
+
+
+def _truth_records(phenopacket_paths: List[Path], gene_analysis: bool) -> List[Tuple[str, str]]:
+    """Return (case id, identifier) pairs for the diagnosed genes or diseases of phenopackets."""
+    records = []
+    for phenopacket_path in phenopacket_paths:
+        phenopacket_util = PhenopacketUtil(phenopacket_reader(phenopacket_path))
+        if gene_analysis:
+            identifiers = {gene.gene_symbol.upper() for gene in phenopacket_util.diagnosed_genes()}
+        else:
+            identifiers = {
+                normalise_disease_identifier(disease.disease_identifier)
+                for disease in phenopacket_util.diagnoses()
+            }
+        records.extend((phenopacket_path.stem, identifier) for identifier in identifiers)
+    return records
+
+
+def _ranked(entries: list) -> List[Tuple[int, object]]:
+    """
+    Rank entries as pheval ranks standardised results.
+
+    Entries are sorted by descending score, and tied scores share the best rank, e.g. 1, 1, 3.
+    """
+    score_ranker = ScoreRanker(SortOrder.DESCENDING)
+    return [
+        (score_ranker.rank_scores(entry.score), entry)
+        for entry in sorted(entries, key=attrgetter("score"), reverse=True)
+    ]
+
+
+def _decoded_prediction_records(
+    decoded_result: DecodedOntoGPTResult, gene_analysis: bool
+) -> List[Tuple[str, int, str]]:
+    """Return (case id, rank, identifier) triples for the predictions of a decoded result."""
+    case_id = _case_id(decoded_result.ontogpt_result_path)
+    records = []
+    if gene_analysis:
+        for rank, entry in _ranked(decoded_result.gene_results):
+            records.append((case_id, rank, entry.gene_symbol.upper()))
+    else:
+        for rank, entry in _ranked(decoded_result.disease_results):
+            records.append((case_id, rank, normalise_disease_identifier(entry.omim_disease_id)))
+            records.extend((case_id, rank, disease_id) for disease_id in entry.disease_ids)
+    return records
+
+
+def _prediction_records(
+    ontogpt_result_paths: List[Path], gene_analysis: bool
+) -> List[Tuple[str, int, str]]:
+    """Return (case id, rank, identifier) triples for the predictions of raw result files."""
+    records = []
+    for ontogpt_result_path in ontogpt_result_paths:
+        decoded_result = decode_ontogpt_result(
+            ontogpt_result_path, gene_analysis, not gene_analysis
+        )
+        records.extend(_decoded_prediction_records(decoded_result, gene_analysis))
+    return records
+
+
+def _map_chunks(
+    function: Callable, paths: Sequence[Path], gene_analysis: bool, processes: int
+) -> list:
+    """Apply a record-extracting function to paths, split into chunks across processes."""
+    if processes <= 1 or len(paths) < 2:
+        return function(list(paths), gene_analysis)
+    chunk_size = max(1, -(-len(paths) // (processes * 4)))
+    chunks = [list(paths[i : i + chunk_size]) for i in range(0, len(paths), chunk_size)]
+    records = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for chunk_records in executor.map(function, chunks, [gene_analysis] * len(chunks)):
+            records.extend(chunk_records)
+    return records
+
+
+def compute_ranks(truth: pd.DataFrame, predictions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the rank of the first correct prediction for every case at once.
+
+    Args:
+        truth (pd.DataFrame): Known identifiers with columns case_id and identifier.
+        predictions (pd.DataFrame): Predictions with columns case_id, rank and identifier.
+
+    Returns:
+        pd.DataFrame: One row per case with columns case_id and rank, rank is NaN if not found.
+    """
+    first_match = (
+        predictions.merge(truth, on=["case_id", "identifier"]).groupby("case_id")["rank"].min()
+    )
+    case_ids = pd.Series(truth["case_id"].unique(), name="case_id")
+    return pd.DataFrame({"case_id": case_ids, "rank": case_ids.map(first_match)})
+
+
+def summarise_ranks(ranks: pd.DataFrame, top_k: Sequence[int] = DEFAULT_TOP_K) -> pd.DataFrame:
+    """
+    Summarise ranks as top-k accuracy and mean reciprocal rank.
+
+    Returns:
+        pd.DataFrame: Rows of metric and value.
+    """
+    total_cases = len(ranks)
+    metrics = [("cases", total_cases)]
+    for k in top_k:
+        metrics.append((f"top_{k}", (ranks["rank"] <= k).sum() / total_cases if total_cases else 0))
+    metrics.append(("mrr", (1 / ranks["rank"]).fillna(0).mean() if total_cases else 0))
+    return pd.DataFrame(metrics, columns=["metric", "value"])
+
+
+def evaluate_raw_results(
+    phenopacket_dir: Path,
+    raw_results_dir: Path,
+    gene_analysis: bool = False,
+    processes: int = 1,
+    top_k: Sequence[int] = DEFAULT_TOP_K,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Score existing raw OntoGPT results against the diagnoses in their phenopackets.
+
+    Raw results are read from the per-phenopacket JSON files and the raw results store in the
+    raw results directory, so no model calls are made.
+
+    Args:
+        phenopacket_dir (Path): Directory of the phenopackets the results were created from.
+        raw_results_dir (Path): Directory of the raw OntoGPT results.
+        gene_analysis (bool): Score gene predictions, otherwise disease predictions.
+        processes (int): Number of processes used to read phenopackets and raw results.
+        top_k (Sequence[int]): Cut-offs for top-k accuracy.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The rank of every case and the summary metrics.
+    """
+    truth = pd.DataFrame(
+        _map_chunks(_truth_records, all_files(phenopacket_dir), gene_analysis, processes),
+        columns=["case_id", "identifier"],
+    )
+    prediction_records = _map_chunks(
+        _prediction_records,
+        files_with_suffix(raw_results_dir, ".json"),
+        gene_analysis,
+        processes,
+    )
+    raw_results_store_path = raw_results_dir.joinpath(RAW_RESULTS_STORE_FILE_NAME)
+    if raw_results_store_path.exists():
+        with RawResultsStore(raw_results_store_path, read_only=True) as raw_results_store:
+            for case_id, payload in raw_results_store.iter_latest():
+                decoded_result = decode_ontogpt_json(
+                    payload,
+                    Path(ontogpt_result_file_name(case_id)),
+                    gene_analysis,
+                    not gene_analysis,
+                )
+                prediction_records.extend(
+                    _decoded_prediction_records(decoded_result, gene_analysis)
+                )
+    predictions = pd.DataFrame(prediction_records, columns=["case_id", "rank", "identifier"])
+    ranks = compute_ranks(truth, predictions)
+    return ranks, summarise_ranks(ranks, top_k)
+
+
+@click.command("evaluate")
+@click.option(
+    "--phenopacket-dir",
+    "-p",
+    required=True,
+    metavar="DIRECTORY",
+    help="Full path to the directory of phenopackets the results were created from.",
+    type=Path,
+)
+@click.option(
+    "--raw-results-dir",
+    "-R",
+    required=True,
+    metavar="DIRECTORY",
+    help="Full path to Ontogpt results directory to be evaluated.",
+    type=Path,
+)
+@click.option(
+    "--output",
+    "-o",
+    required=True,
+    metavar="FILE",
+    help="Output path for the summary metrics TSV.",
+    type=Path,
+)
+@click.option(
+    "--ranks-output",
+    required=False,
+    metavar="FILE",
+    help="Output path for the rank of every case TSV.",
+    type=Path,
+)
+@click.option(
+    "--gene-analysis/--disease-analysis",
+    default=False,
+    required=False,
+    type=bool,
+    show_default=True,
+    help="Evaluate gene or disease prioritisation.",
+)
+@click.option(
+    "--processes",
+    "-n",
+    default=1,
+    required=False,
+    type=int,
+    show_default=True,
+    help="Number of processes used to read phenopackets and raw results.",
+)
+@click.option(
+    "--top-k",
+    "-k",
+    default=DEFAULT_TOP_K,
+    multiple=True,
+    type=int,
+    show_default=True,
+    help="Cut-offs for top-k accuracy.",
+)
+def evaluate_raw_results_command(
+    phenopacket_dir: Path,
+    raw_results_dir: Path,
+    output: Path,
+    gene_analysis: bool,
+    processes: int,
+    top_k: Sequence[int],
+    ranks_output: Path = None,
+):
+    """Compute top-k accuracy and MRR for existing raw results."""
+    ranks, summary = evaluate_raw_results(
+        phenopacket_dir, raw_results_dir, gene_analysis, processes, top_k
+    )
+    summary.to_csv(output, sep="\t", index=False)
+    if ranks_output is not None:
+        ranks.to_csv(ranks_output, sep="\t", index=False)
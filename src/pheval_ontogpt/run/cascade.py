@@ -0,0 +1,252 @@
+"""Cascade of a fast model escalating hard cases to the configured model."""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from statistics import mean, median
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from phenopackets import Phenopacket
+
+from pheval_ontogpt.post_process.ontogpt_result_decoder import decode_ontogpt_json
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.map_reduce import MapReduceQuery
+from pheval_ontogpt.run.run_statistics import CascadeTierStatistics, RunStatistics
+from pheval_ontogpt.run.scheduler import MeteredClient, TokenPrices, token_prices
+
+logger = logging.getLogger(__name__)
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+
+@dataclass
+class _Tier:
+    model: str
+    metered_client: Optional[MeteredClient] = None
+    latencies: List[float] = field(default_factory=list)
+
+    def statistics(self) -> CascadeTierStatistics:
+        return CascadeTierStatistics(
+            model=self.model,
+            cases=len(self.latencies),
+            median_latency=median(self.latencies) if self.latencies else None,
+            mean_latency=mean(self.latencies) if self.latencies else None,
+            cost=self.metered_client.cost if self.metered_client is not None else None,
+        )
+
+
+@dataclass
+class ModelCascade:
+    """
+    Run every case on a fast model first, escalating it to the configured model when needed.
+
+    A case is escalated if the fast model's result has no entries valid for the analyses
+    (validated as in post-processing), if its completion could only be parsed by falling back
+    to extracting JSON from the surrounding text, or if its top score is below the escalation
+    score threshold. The result of the configured model is then used, whatever its quality.
+    The threshold applies to model scores, so map-reduce queries must merge chunk rankings by
+    their maximum score or rank the merged candidates again.
+
+    Attributes:
+        fast_model (str): Model tried first for every case.
+        escalation_score_threshold (float): Top scores below this escalate a case.
+        gene_analysis (bool): Results must hold valid gene entries.
+        disease_analysis (bool): Results must hold valid disease entries.
+        model_source (str): Source of both models, used to set up the fast model and look up
+            token prices.
+        prompt_token_price (Optional[float]): Price in USD per 1K prompt tokens of the
+            configured model, overriding its known price.
+        completion_token_price (Optional[float]): Price in USD per 1K completion tokens of the
+            configured model, overriding its known price.
+    """
+
+    fast_model: str
+    escalation_score_threshold: float = 0.5
+    gene_analysis: bool = False
+    disease_analysis: bool = True
+    model_source: str = "openai"
+    prompt_token_price: Optional[float] = None
+    completion_token_price: Optional[float] = None
+    _fast_engine: Optional[PhenoEngine] = field(default=None, repr=False)
+    _tiers: Dict[str, _Tier] = field(default_factory=dict, repr=False)
+    _escalation_reasons: Dict[str, int] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @contextmanager
+    def attached(self, pheno_engine: PhenoEngine) -> Iterator["ModelCascade"]:
+        """
+        Set up the fast model alongside an engine for a run, metering the requests of both tiers.
+
+        The fast model shares the engine's settings. Statistics are reset on entry.
+        """
+        if self._fast_engine is None or self._fast_engine.model != self.fast_model:
+            self._fast_engine = PhenoEngine(
+                model=self.fast_model,
+                model_source=self.model_source,
+                batch_size=pheno_engine.batch_size,
+            )
+        fast_engine = self._fast_engine
+        fast_engine.completion_length = pheno_engine.completion_length
+        fast_engine.phenotypic_feature_compressor = pheno_engine.phenotypic_feature_compressor
+        fast_engine.max_continuations = pheno_engine.max_continuations
+        fast_engine.continuation_statistics = pheno_engine.continuation_statistics
+        fast_engine.repair_fallback = False
+        self._tiers = {
+            FAST_TIER: _Tier(
+                self.fast_model,
+                MeteredClient(
+                    fast_engine.client,
+                    self.fast_model,
+                    token_prices(self.fast_model, self.model_source),
+                ),
+            ),
+            STRONG_TIER: _Tier(
+                pheno_engine.model,
+                MeteredClient(
+                    pheno_engine.client,
+                    pheno_engine.model,
+                    token_prices(
+                        pheno_engine.model,
+                        self.model_source,
+                        self.prompt_token_price,
+                        self.completion_token_price,
+                    ),
+                ),
+            ),
+        }
+        self._escalation_reasons = {}
+        fast_engine.client = self._tiers[FAST_TIER].metered_client
+        pheno_engine.client = self._tiers[STRONG_TIER].metered_client
+        try:
+            yield self
+        finally:
+            fast_engine.client = self._tiers[FAST_TIER].metered_client.client
+            pheno_engine.client = self._tiers[STRONG_TIER].metered_client.client
+
+    def fast_tier_cost(self) -> Optional[float]:
+        """Cost in USD of the fast model's requests, None if its token prices are not known."""
+        return self._tiers[FAST_TIER].metered_client.cost
+
+    def fast_tier_engines(self) -> List[Tuple[PhenoEngine, Optional[TokenPrices]]]:
+        """The fast model's engine and token prices, for estimating the cost of cases."""
+        return [(self._fast_engine, token_prices(self.fast_model, self.model_source))]
+
+    def check_map_reduce_query(self, map_reduce_query: Optional[MapReduceQuery]) -> None:
+        """
+        Check that a map-reduce query returns model scores to compare with the threshold.
+
+        Raises:
+            ValueError: If chunk rankings are merged into scores other than model scores, such
+                as reciprocal rank scores, and the merged candidates are not ranked again.
+        """
+        if (
+            map_reduce_query is not None
+            and map_reduce_query.score_fusion != "max"
+            and map_reduce_query.rerank_top_n <= 0
+        ):
+            raise ValueError(
+                f"A model cascade cannot escalate on {map_reduce_query.score_fusion} fused "
+                f"scores: use max score fusion or set rerank_top_n."
+            )
+
+    def escalation_reason(self, phenopacket: Phenopacket, result: Any) -> Optional[str]:
+        """Return why a result of the fast model should be escalated, None if it is kept."""
+        decoded = decode_ontogpt_json(
+            json.dumps(result), Path(phenopacket.id), self.gene_analysis, self.disease_analysis
+        )
+        entries = decoded.gene_results + decoded.disease_results
+        if (
+            not entries
+            or (self.gene_analysis and not decoded.gene_results)
+            or (self.disease_analysis and not decoded.disease_results)
+        ):
+            return "invalid_result"
+        top_score = max(entry.score for entry in entries)
+        if top_score < self.escalation_score_threshold:
+            return "low_score"
+        return None
+
+    def _timed(
+        self,
+        tier: str,
+        pheno_engine: PhenoEngine,
+        phenopackets: List[Phenopacket],
+        predict_batch: Callable[[PhenoEngine, List[Phenopacket]], List],
+    ) -> List:
+        start = time.monotonic()
+        results = predict_batch(pheno_engine, phenopackets)
+        latency = (time.monotonic() - start) / len(phenopackets)
+        with self._lock:
+            self._tiers[tier].latencies.extend([latency] * len(phenopackets))
+        return results
+
+    def predict_batch(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopackets: List[Phenopacket],
+        predict_batch: Callable[[PhenoEngine, List[Phenopacket]], List],
+    ) -> List:
+        """
+        Predict a batch of phenopackets on the fast model, escalating cases to the engine's model.
+
+        Args:
+            pheno_engine (PhenoEngine): Engine of the configured model, used for escalated cases.
+            phenopackets (List[Phenopacket]): The cleaned phenopackets.
+            predict_batch (Callable[[PhenoEngine, List[Phenopacket]], List]): Predicts the results
+                of phenopackets with an engine.
+
+        Returns:
+            List: The result of each phenopacket.
+        """
+        if not phenopackets:
+            return []
+        results = self._timed(FAST_TIER, self._fast_engine, phenopackets, predict_batch)
+        escalated = []
+        for index, (phenopacket, result) in enumerate(zip(phenopackets, results)):
+            reason = self.escalation_reason(phenopacket, result)
+            if reason is not None:
+                logger.info(f"Escalating {phenopacket.id} to {pheno_engine.model}: {reason}")
+                escalated.append(index)
+                with self._lock:
+                    self._escalation_reasons[reason] = self._escalation_reasons.get(reason, 0) + 1
+        if escalated:
+            escalated_results = self._timed(
+                STRONG_TIER,
+                pheno_engine,
+                [phenopackets[index] for index in escalated],
+                predict_batch,
+            )
+            for index, result in zip(escalated, escalated_results):
+                results[index] = result
+        return results
+
+    def predict(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopacket: Phenopacket,
+        predict: Callable[[PhenoEngine, Phenopacket], Any],
+    ) -> Any:
+        """Predict a phenopacket on the fast model, escalating it to the engine's model if needed."""
+        return self.predict_batch(
+            pheno_engine,
+            [phenopacket],
+            lambda engine, phenopackets: [predict(engine, case) for case in phenopackets],
+        )[0]
+
+    def add_statistics(self, run_statistics: RunStatistics) -> None:
+        """Record the escalation rate and the latency and cost of each tier in run statistics."""
+        cases = len(self._tiers[FAST_TIER].latencies)
+        escalations = len(self._tiers[STRONG_TIER].latencies)
+        run_statistics.escalation_rate = escalations / cases if cases else None
+        run_statistics.escalation_reasons = dict(self._escalation_reasons)
+        run_statistics.cascade_tiers = [tier.statistics() for tier in self._tiers.values()]
+        if cases:
+            logger.info(
+                f"Escalated {escalations} of {cases} cases from {self.fast_model} "
+                f"to {self._tiers[STRONG_TIER].model}"
+            )
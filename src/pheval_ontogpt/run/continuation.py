@@ -0,0 +1,101 @@
+"""Continuation of completions cut off at the maximum completion length."""
+
+import threading
+from dataclasses import dataclass, field
+
+# completions repeating less than this much of the partial output are not treated as overlapping
+MIN_OVERLAP = 8
+MAX_OVERLAP = 500
+# continuations starting with this much of the partial output restart the response
+RESTART_PREFIX_LENGTH = 40
+
+
+@dataclass
+class ContinuationStatistics:
+    """
+    Counts of truncated completions and the continuation requests made for them.
+
+    Attributes:
+        truncated (int): Number of cases whose completion was cut off.
+        salvaged (int): Number of truncated cases parsed into a result after continuation.
+        requests (int): Number of continuation requests made.
+    """
+
+    truncated: int = 0
+    salvaged: int = 0
+    requests: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, requests: int, salvaged: bool) -> None:
+        """Record a truncated case, the continuation requests made and whether it was salvaged."""
+        with self._lock:
+            self.truncated += 1
+            self.requests += requests
+            self.salvaged += int(salvaged)
+
+
+def is_truncated(payload: str) -> bool:
+    """
+    Whether a completion stops inside its JSON value, as when cut off at the maximum length.
+
+    The payload is scanned from its first bracket, tracking strings and nesting; it is truncated
+    if the end is reached before the outermost list or object is closed.
+    """
+    starts = [index for index in (payload.find("["), payload.find("{")) if index >= 0]
+    if not starts:
+        return False
+    depth = 0
+    in_string = False
+    escaped = False
+    for char in payload[min(starts) :]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 0:
+                return False
+    return True
+
+
+def continuation_prompt(prompt: str, partial: str) -> str:
+    """Return a prompt asking the model to resume a cut off response."""
+    return (
+        f"{prompt}\n\n"
+        f"Your previous response was cut off at the maximum length. It ended with:\n"
+        f"{partial}\n"
+        f"Continue the response exactly from where it stopped. Do not repeat any of it "
+        f"and do not add any other text."
+    )
+
+
+def _strip_code_fence(continuation: str) -> str:
+    stripped = continuation.lstrip()
+    if not stripped.startswith("```"):
+        return continuation.replace("```", "")
+    return stripped.split("\n", 1)[1].replace("```", "") if "\n" in stripped else ""
+
+
+def stitch(partial: str, continuation: str) -> str:
+    """
+    Join a cut off completion and its continuation.
+
+    Text the continuation repeats from the end of the partial output is dropped, and a
+    continuation that restarts the response from the beginning replaces the partial output.
+    """
+    continuation = _strip_code_fence(continuation)
+    partial_start = partial.lstrip()[:RESTART_PREFIX_LENGTH]
+    if partial_start and continuation.lstrip().startswith(partial_start):
+        return continuation
+    for size in range(min(len(partial), len(continuation), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if partial.endswith(continuation[:size]):
+            return partial + continuation[size:]
+    return partial + continuation
@@ -0,0 +1,140 @@
+"""Local CPU completion client."""
+
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def split_revision(model: str) -> Tuple[str, str]:
+    """Split a model into its name and the revision following @, main if none is given."""
+    name, _, revision = model.partition("@")
+    return name, revision or "main"
+
+
+@dataclass
+class LocalCompletionClient:
+    """
+    Completion client running an open-weights causal language model on CPU with transformers.
+
+    Prompts are generated in batches of up to batch_size. The prefix shared by the prompts in a
+    batch and the previous prompt, such as the opening of the template, is encoded once and its
+    key/value cache is reused for every prompt; each row is laid out as the prefix, padding masked
+    out of attention, then the prompt-specific suffix, so the prefix occupies the same positions
+    in every row. Only the max_prefix_caches most recently used prefixes are kept.
+
+    Attributes:
+        model (str): Hugging Face model id or local path of the model, optionally followed by
+            @ and the revision to download, such as a commit hash.
+        batch_size (int): Maximum number of prompts generated in a single forward pass.
+        device (str): Torch device to run the model on.
+        max_prefix_caches (int): Maximum number of prefix key/value caches kept.
+    """
+
+    model: str
+    batch_size: int = 4
+    device: str = "cpu"
+    max_prefix_caches: int = 4
+    _prefix_caches: "OrderedDict[str, object]" = field(default_factory=OrderedDict)
+    _previous_prompt: Optional[str] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __post_init__(self):
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "torch and transformers are required for the local model source, install them "
+                "with `pip install torch transformers`."
+            ) from e
+        self._torch = torch
+        logger.info(f"Loading local model {self.model} on {self.device}")
+        name, revision = split_revision(self.model)
+        self.tokenizer = AutoTokenizer.from_pretrained(name, revision=revision)
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.language_model = AutoModelForCausalLM.from_pretrained(name, revision=revision).to(
+            self.device
+        )
+        self.language_model.eval()
+
+    def complete(self, prompt: str, max_tokens: int = 500, **kwargs) -> str:
+        return self.complete_batch([prompt], max_tokens=max_tokens)[0]
+
+    def continue_completion(self, prompt: str, partial: str, max_tokens: int = 500) -> str:
+        """Generate the rest of a completion cut off at max_tokens, from the partial output."""
+        return self.complete(prompt + partial, max_tokens=max_tokens)
+
+    def complete_batch(self, prompts: List[str], max_tokens: int = 500) -> List[str]:
+        """Complete prompts in batches of up to batch_size."""
+        completions = []
+        for i in range(0, len(prompts), self.batch_size):
+            completions.extend(self._generate(prompts[i : i + self.batch_size], max_tokens))
+        return completions
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _prefix_cache(self, prefix: str, prefix_ids: List[int]):
+        """Return a copy of the key/value cache of a shared prefix, encoding it on first use."""
+        with self._lock:
+            if prefix in self._prefix_caches:
+                self._prefix_caches.move_to_end(prefix)
+            else:
+                with self._torch.no_grad():
+                    self._prefix_caches[prefix] = self.language_model(
+                        self._torch.tensor([prefix_ids], device=self.device), use_cache=True
+                    ).past_key_values
+                while len(self._prefix_caches) > self.max_prefix_caches:
+                    self._prefix_caches.popitem(last=False)
+            return copy.deepcopy(self._prefix_caches[prefix])
+
+    def _shared_prefix(self, prompts: List[str]) -> str:
+        """Return the prefix shared by the prompts and the previous prompt, cut at a line end."""
+        with self._lock:
+            previous_prompt, self._previous_prompt = self._previous_prompt, prompts[-1]
+        shared = prompts if previous_prompt is None else prompts + [previous_prompt]
+        if len(shared) < 2:
+            return ""
+        prefix = os.path.commonprefix(shared)
+        # split on a line boundary so the prefix tokenises identically on its own
+        prefix = prefix[: prefix.rfind("\n") + 1]
+        if prefix in prompts:
+            # at least one token of every prompt must be left for generate to process
+            return ""
+        return prefix
+
+    def _generate(self, prompts: List[str], max_tokens: int) -> List[str]:
+        torch = self._torch
+        prefix = self._shared_prefix(prompts)
+        bos = [self.tokenizer.bos_token_id] if self.tokenizer.bos_token_id is not None else []
+        prefix_ids = bos + self._encode(prefix)
+        suffix_ids = [self._encode(prompt[len(prefix) :]) for prompt in prompts]
+        longest_suffix = max(len(ids) for ids in suffix_ids)
+        input_ids, attention_mask = [], []
+        for ids in suffix_ids:
+            padding = longest_suffix - len(ids)
+            input_ids.append(prefix_ids + [self.tokenizer.pad_token_id] * padding + ids)
+            attention_mask.append([1] * len(prefix_ids) + [0] * padding + [1] * len(ids))
+        generate_kwargs = {}
+        if len(prefix_ids) > len(bos):
+            past_key_values = self._prefix_cache(prefix, prefix_ids)
+            if len(prompts) > 1:
+                past_key_values.batch_repeat_interleave(len(prompts))
+            generate_kwargs["past_key_values"] = past_key_values
+        with torch.no_grad():
+            output = self.language_model.generate(
+                input_ids=torch.tensor(input_ids, device=self.device),
+                attention_mask=torch.tensor(attention_mask, device=self.device),
+                max_new_tokens=max_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **generate_kwargs,
+            )
+        return self.tokenizer.batch_decode(output[:, len(input_ids[0]) :], skip_special_tokens=True)
@@ -0,0 +1,342 @@
+"""Map-reduce querying of constrained lists too large for a single prompt."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from phenopackets import Phenopacket
+
+from pheval_ontogpt.post_process.disease_name_resolution import (
+    normalise_disease_identifier,
+    normalise_disease_name,
+)
+from pheval_ontogpt.post_process.ontogpt_result_decoder import (
+    DISEASE_RANKINGS_KEY,
+    GENE_RANKINGS_KEY,
+    is_joint_result,
+)
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.token_count import count_tokens, lookup_model
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_WINDOW = 4096
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+}
+SCORE_FUSION_METHODS = ("max", "reciprocal_rank", "sum")
+RECIPROCAL_RANK_CONSTANT = 60
+# share of the token budget left unused to absorb tokenisation differences between models
+TOKEN_BUDGET_MARGIN = 0.05
+
+
+def context_window(model: str) -> int:
+    """Return the context window of a model in tokens."""
+    return lookup_model(MODEL_CONTEXT_WINDOWS, model, DEFAULT_CONTEXT_WINDOW)
+
+
+def split_constrained_list(constrained_list: List[str]) -> List[str]:
+    """Split the lines of a constrained list file into its comma separated items."""
+    return [item.strip() for line in constrained_list for item in line.split(",") if item.strip()]
+
+
+def chunk_items(items: List[str], item_tokens: List[int], budget: int) -> List[List[str]]:
+    """Greedily pack items, in order, into chunks whose total token count fits the budget."""
+    chunks, chunk, chunk_tokens = [], [], 0
+    for item, tokens in zip(items, item_tokens):
+        if chunk and chunk_tokens + tokens > budget:
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(item)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _entry_key(entry: dict) -> Optional[str]:
+    """Return the identity of a predicted gene or disease used to merge rankings."""
+    if entry.get("gene_symbol"):
+        return str(entry["gene_symbol"]).upper()
+    if entry.get("omim_disease_id"):
+        return normalise_disease_identifier(str(entry["omim_disease_id"]))
+    if entry.get("disease_name"):
+        return normalise_disease_name(str(entry["disease_name"]))
+    return None
+
+
+def _entry_score(entry: dict) -> float:
+    try:
+        return float(entry.get("score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _candidate_label(entry: dict) -> str:
+    """Return the constrained list item describing a merged candidate."""
+    if entry.get("gene_symbol"):
+        return str(entry["gene_symbol"])
+    if entry.get("omim_disease_id") and entry.get("disease_name"):
+        return f"{entry['disease_name']} ({entry['omim_disease_id']})"
+    return str(entry.get("disease_name") or entry.get("omim_disease_id"))
+
+
+def fuse_rankings(rankings: List[List[dict]], method: str = "max") -> List[dict]:
+    """
+    Merge partial rankings of genes or diseases into a single ranking.
+
+    Chunks of a constrained list are disjoint, so most entries appear in a single ranking and
+    reciprocal rank fusion alone would tie the entries at the same rank of every chunk. Entries
+    are therefore ordered by their reciprocal rank and then by their highest score, and given
+    the score 1 / (60 + position) in the merged ranking, which is strictly decreasing.
+
+    Args:
+        rankings (List[List[dict]]): Parsed OntoGPT results, one per chunk.
+        method (str): max keeps the highest score of an entry, sum adds its scores and
+            reciprocal_rank sums 1 / (60 + rank) over the rankings an entry appears in.
+
+    Returns:
+        List[dict]: Merged entries in descending order of their fused score, which replaces the score.
+    """
+    if method not in SCORE_FUSION_METHODS:
+        raise ValueError(f"Unknown score fusion method: {method}")
+    fused_scores: Dict[str, float] = {}
+    model_scores: Dict[str, float] = {}
+    entries: Dict[str, dict] = {}
+    for ranking in rankings:
+        if not isinstance(ranking, list):
+            continue
+        seen = set()
+        rank = 0
+        for entry in sorted(
+            (entry for entry in ranking if isinstance(entry, dict)), key=_entry_score, reverse=True
+        ):
+            key = _entry_key(entry)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            rank += 1
+            value = (
+                1 / (RECIPROCAL_RANK_CONSTANT + rank)
+                if method == "reciprocal_rank"
+                else _entry_score(entry)
+            )
+            if key not in fused_scores:
+                fused_scores[key] = value
+                model_scores[key] = _entry_score(entry)
+                entries[key] = entry
+                continue
+            model_scores[key] = max(model_scores[key], _entry_score(entry))
+            if method == "max":
+                fused_scores[key] = max(fused_scores[key], value)
+            else:
+                fused_scores[key] += value
+    ranked = sorted(
+        fused_scores, key=lambda key: (fused_scores[key], model_scores[key]), reverse=True
+    )
+    if method == "reciprocal_rank":
+        return [
+            {**entries[key], "score": 1 / (RECIPROCAL_RANK_CONSTANT + position)}
+            for position, key in enumerate(ranked, start=1)
+        ]
+    return [{**entries[key], "score": fused_scores[key]} for key in ranked]
+
+
+def fuse_results(results: List[Any], method: str = "max") -> Union[List[dict], Dict]:
+    """
+    Merge the parsed results of the chunks of a constrained list.
+
+    Joint results, holding separate gene_rankings and disease_rankings lists, have each section
+    merged separately with fuse_rankings; other results are merged as rankings.
+    """
+    if not any(is_joint_result(result) for result in results):
+        return fuse_rankings(results, method)
+    return {
+        section: fuse_rankings(
+            [result.get(section) for result in results if is_joint_result(result)], method
+        )
+        for section in (GENE_RANKINGS_KEY, DISEASE_RANKINGS_KEY)
+    }
+
+
+def _top_candidates(fused: Union[List[dict], Dict], top_n: int) -> List[dict]:
+    """Return the top merged candidates, of each section for joint results."""
+    if isinstance(fused, dict):
+        return [entry for section in fused.values() for entry in section[:top_n]]
+    return fused[:top_n]
+
+
+def _has_entries(result: Any) -> bool:
+    if is_joint_result(result):
+        return any(isinstance(entries, list) and entries for entries in result.values())
+    return isinstance(result, list) and bool(result)
+
+
+@dataclass
+class MapReduceQuery:
+    """
+    Query a constrained list too large for one prompt in chunks and merge the partial rankings.
+
+    For each phenopacket the constrained list is split into chunks that fit the context window
+    alongside the rest of the prompt and the completion. The chunks are queried concurrently,
+    their rankings merged with the score fusion method and, if rerank_top_n is set, the merged top
+    candidates are ranked again in a final call. Lists that fit in one prompt are queried as usual.
+
+    Attributes:
+        concurrency (int): Maximum number of chunks queried at once.
+        score_fusion (str): Method used to merge chunk rankings, see fuse_rankings.
+        rerank_top_n (int): Number of merged candidates ranked again in a final call, 0 to disable.
+        context_window (Optional[int]): Context window in tokens, looked up from the model if None.
+    """
+
+    concurrency: int = 4
+    score_fusion: str = "max"
+    rerank_top_n: int = 0
+    context_window: Optional[int] = None
+    _item_tokens: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.score_fusion not in SCORE_FUSION_METHODS:
+            raise ValueError(f"Unknown score fusion method: {self.score_fusion}")
+
+    def _count_item_tokens(self, item: str, model: str) -> int:
+        if item not in self._item_tokens:
+            self._item_tokens[item] = count_tokens(f"{item}, ", model)
+        return self._item_tokens[item]
+
+    def chunk(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopacket: Phenopacket,
+        template_path: Union[str, Path],
+        items: List[str],
+    ) -> List[List[str]]:
+        """Split constrained list items into chunks that fit the prompt of a phenopacket."""
+        window = self.context_window or context_window(pheno_engine.model)
+        prompt_tokens = count_tokens(
+            pheno_engine.render_prompt(phenopacket, template_path, [""]), pheno_engine.model
+        )
+        budget = int(
+            (window - pheno_engine.completion_length - prompt_tokens) * (1 - TOKEN_BUDGET_MARGIN)
+        )
+        if budget <= 0:
+            raise ValueError(
+                f"The prompt for {phenopacket.id} leaves no room for the constrained list "
+                f"in a context window of {window} tokens."
+            )
+        return chunk_items(
+            items, [self._count_item_tokens(item, pheno_engine.model) for item in items], budget
+        )
+
+    def _chunk_prompts(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopacket: Phenopacket,
+        template_path: Union[str, Path],
+        chunks: List[List[str]],
+    ) -> List[str]:
+        return [
+            pheno_engine.render_prompt(phenopacket, template_path, [", ".join(chunk)])
+            for chunk in chunks
+        ]
+
+    def request_prompts(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopacket: Phenopacket,
+        template_path: Union[str, Path],
+        constrained_list: List[str],
+    ) -> List[str]:
+        """
+        Return the prompts of the requests predicting a phenopacket sends, for cost estimates.
+
+        The rerank prompt depends on the merged candidates, so it is approximated by one listing
+        the longest rerank_top_n items of the constrained list.
+        """
+        items = split_constrained_list(constrained_list)
+        try:
+            chunks = self.chunk(pheno_engine, phenopacket, template_path, items)
+        except ValueError:
+            return []
+        if len(chunks) <= 1:
+            return [pheno_engine.render_prompt(phenopacket, template_path, constrained_list)]
+        prompts = self._chunk_prompts(pheno_engine, phenopacket, template_path, chunks)
+        if self.rerank_top_n > 0:
+            candidates = sorted(items, key=len, reverse=True)[: self.rerank_top_n]
+            prompts.append(
+                pheno_engine.render_prompt(phenopacket, template_path, [", ".join(candidates)])
+            )
+        return prompts
+
+    def _complete(self, pheno_engine: PhenoEngine, prompts: List[str]) -> List[str]:
+        """Complete prompts in a single batch if the client supports it, otherwise concurrently."""
+        client = pheno_engine.client
+        if hasattr(client, "complete_batch"):
+            return client.complete_batch(prompts, max_tokens=pheno_engine.completion_length)
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+            return list(
+                executor.map(
+                    lambda prompt: client.complete(
+                        prompt, max_tokens=pheno_engine.completion_length
+                    ),
+                    prompts,
+                )
+            )
+
+    def rerank(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopacket: Phenopacket,
+        template_path: Union[str, Path],
+        fused: Union[List[dict], Dict],
+    ) -> Union[List[dict], Dict]:
+        """Rank the merged top candidates again, keeping the merged ranking if that fails."""
+        candidates = ", ".join(
+            _candidate_label(entry) for entry in _top_candidates(fused, self.rerank_top_n)
+        )
+        prompt = pheno_engine.render_prompt(phenopacket, template_path, [candidates])
+        reranked = pheno_engine.continue_payload(
+            prompt, pheno_engine.client.complete(prompt, max_tokens=pheno_engine.completion_length)
+        )
+        pheno_engine.record_sent_prompts(phenopacket)
+        return reranked if _has_entries(reranked) and type(reranked) is type(fused) else fused
+
+    def predict(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopacket: Phenopacket,
+        template_path: Union[str, Path],
+        constrained_list: List[str],
+    ) -> Union[List[dict], Dict]:
+        """
+        Predict diagnoses for a phenopacket, querying the constrained list in chunks if needed.
+
+        A phenopacket whose prompt leaves no room for the constrained list is not predicted, and
+        an empty result is returned so that the rest of the run continues.
+        """
+        try:
+            chunks = self.chunk(
+                pheno_engine, phenopacket, template_path, split_constrained_list(constrained_list)
+            )
+        except ValueError as e:
+            logger.error(f"Not predicting {phenopacket.id}: {e}")
+            return []
+        if len(chunks) <= 1:
+            return pheno_engine.predict(phenopacket, template_path, constrained_list)
+        prompts = self._chunk_prompts(pheno_engine, phenopacket, template_path, chunks)
+        rankings = [
+            pheno_engine.continue_payload(prompt, payload)
+            for prompt, payload in zip(prompts, self._complete(pheno_engine, prompts))
+        ]
+        pheno_engine.record_sent_prompts(phenopacket, len(prompts))
+        fused = fuse_results(rankings, self.score_fusion)
+        if self.rerank_top_n > 0 and _has_entries(fused):
+            return self.rerank(pheno_engine, phenopacket, template_path, fused)
+        return fused
@@ -0,0 +1,149 @@
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+RAW_RESULTS_STORE_FILE_NAME = "ontogpt_results.sqlite"
+
+
+def ontogpt_result_file_name(case_id: str) -> str:
+    """Return the legacy raw result file name for a case."""
+    return f"{case_id}-ontogpt_result.json"
+
+
+def _zstandard():
+    """Import zstandard, which is only required for compressed stores."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "zstandard is required for compressed raw results, install it with "
+            "`pip install pheval-ontogpt[zstd]` or `pip install zstandard`."
+        ) from e
+    return zstandard
+
+
+class RawResultsStore:
+    """
+    Append-only SQLite store of raw OntoGPT results indexed by case id.
+
+    Every write appends a new row in its own transaction, so interrupted runs never leave
+    partially written results behind. When a case is written more than once, e.g. after
+    retrying failed cases, the latest row wins.
+
+    The store uses SQLite's rollback journal rather than write-ahead logging, which does not
+    work on network filesystems. Concurrent writers are serialised with file locks, which many
+    network filesystems do not implement reliably, so on shared storage each writer should use
+    its own store.
+
+    Attributes:
+        store_path (Path): Path to the SQLite store.
+        compress (bool): Compress newly written payloads with zstd.
+        read_only (bool): Open an existing store for reading only, without modifying it.
+    """
+
+    def __init__(self, store_path: Path, compress: bool = False, read_only: bool = False):
+        """
+        Initialise the RawResultsStore, creating the store if it does not exist.
+
+        Raises:
+            sqlite3.OperationalError: If the store is opened read-only and does not exist.
+        """
+        self.store_path = store_path
+        self.compress = compress
+        self.read_only = read_only
+        if read_only:
+            self.connection = sqlite3.connect(
+                f"{Path(store_path).resolve().as_uri()}?mode=ro", uri=True, timeout=60
+            )
+            return
+        self.connection = sqlite3.connect(store_path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=DELETE")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS ontogpt_results ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "case_id TEXT NOT NULL, "
+            "written_at TEXT NOT NULL, "
+            "encoding TEXT NOT NULL, "
+            "payload BLOB NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS ontogpt_results_case_id ON ontogpt_results (case_id, id)"
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "RawResultsStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def append(self, case_id: str, ontogpt_result: Union[list, dict]) -> None:
+        """Append the OntoGPT output for a case."""
+        payload = json.dumps(ontogpt_result).encode()
+        encoding = "json"
+        if self.compress:
+            payload = _zstandard().ZstdCompressor().compress(payload)
+            encoding = "json+zstd"
+        self.connection.execute(
+            "INSERT INTO ontogpt_results (case_id, written_at, encoding, payload) "
+            "VALUES (?, ?, ?, ?)",
+            (case_id, datetime.now().isoformat(), encoding, payload),
+        )
+
+    @staticmethod
+    def _decode_payload(encoding: str, payload: bytes) -> bytes:
+        if encoding == "json+zstd":
+            return _zstandard().ZstdDecompressor().decompress(payload)
+        return payload
+
+    def case_ids(self) -> Iterator[str]:
+        """Yield the ids of all stored cases."""
+        for (case_id,) in self.connection.execute(
+            "SELECT DISTINCT case_id FROM ontogpt_results ORDER BY case_id"
+        ):
+            yield case_id
+
+    def latest(self, case_id: str) -> Union[bytes, None]:
+        """Return the latest raw JSON payload stored for a case, or None if absent."""
+        row = self.connection.execute(
+            "SELECT encoding, payload FROM ontogpt_results WHERE case_id = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (case_id,),
+        ).fetchone()
+        return self._decode_payload(*row) if row else None
+
+    def written_at(self, case_id: str) -> Optional[datetime]:
+        """Return the local time the latest result of a case was written, or None if absent."""
+        row = self.connection.execute(
+            "SELECT written_at FROM ontogpt_results WHERE case_id = ? ORDER BY id DESC LIMIT 1",
+            (case_id,),
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def iter_latest(self) -> Iterator[Tuple[str, bytes]]:
+        """Stream the latest raw JSON payload of every case in write order."""
+        cursor = self.connection.execute(
+            "SELECT case_id, encoding, payload FROM ontogpt_results WHERE id IN "
+            "(SELECT MAX(id) FROM ontogpt_results GROUP BY case_id) ORDER BY id"
+        )
+        for case_id, encoding, payload in cursor:
+            yield case_id, self._decode_payload(encoding, payload)
+
+    def export_json(self, raw_results_dir: Path) -> int:
+        """
+        Export the latest result of every case to the legacy one-file-per-phenopacket layout.
+
+        Returns:
+            int: The number of results exported.
+        """
+        exported = 0
+        for case_id, payload in self.iter_latest():
+            with open(raw_results_dir.joinpath(ontogpt_result_file_name(case_id)), "w") as outfile:
+                json.dump(json.loads(payload), outfile, indent=4)
+            exported += 1
+        return exported
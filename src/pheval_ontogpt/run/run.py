@@ -1,11 +1,83 @@
 from pathlib import Path
 
+from pheval_ontogpt.prepare.compress_phenotypic_features import PhenotypicFeatureCompressor
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.cascade import ModelCascade
+from pheval_ontogpt.run.map_reduce import MapReduceQuery
+from pheval_ontogpt.run.raw_results_store import RAW_RESULTS_STORE_FILE_NAME, RawResultsStore
 from pheval_ontogpt.run.run_basic_pheno_engine import run_phenopackets
+from pheval_ontogpt.run.run_statistics import RunStatistics
+from pheval_ontogpt.run.scheduler import RequestScheduler
 
 
 def run_basic(
-    testdata_dir: Path, raw_results_dir: Path, model: str, prompt: Path, constrained_list_path: Path
-):
-    """Run basic pheno engine on a directory of phenopackets."""
+    testdata_dir: Path,
+    raw_results_dir: Path,
+    model: str,
+    prompt: Path,
+    constrained_list_path: Path,
+    raw_results_backend: str = "json",
+    compress_raw_results: bool = False,
+    hpo_closure_path: Path = None,
+    model_source: str = "openai",
+    batch_size: int = 1,
+    pheno_engine: PhenoEngine = None,
+    map_reduce_query: MapReduceQuery = None,
+    scheduler: RequestScheduler = None,
+    max_continuations: int = 2,
+    model_cascade: ModelCascade = None,
+) -> RunStatistics:
+    """
+    Run basic pheno engine on a directory of phenopackets.
+
+    If an HPO closure path is provided, redundant and excluded HPO terms are removed from
+    the prompts; the closure is built from HPO and written there if it does not exist.
+    If a map-reduce query is provided, large constrained lists are queried in chunks.
+    If a scheduler is provided, the run is limited to its budget and deadline.
+    Truncated completions are continued with up to max_continuations further requests.
+    If a model cascade is provided, its fast model is tried first for every phenopacket.
+    """
     phenopacket_dir = testdata_dir.joinpath("phenopackets")
-    run_phenopackets(phenopacket_dir, raw_results_dir, model, prompt, constrained_list_path)
+    phenotypic_feature_compressor = (
+        PhenotypicFeatureCompressor.from_closure_file(hpo_closure_path, model)
+        if hpo_closure_path is not None
+        else None
+    )
+    if raw_results_backend == "sqlite":
+        with RawResultsStore(
+            raw_results_dir.joinpath(RAW_RESULTS_STORE_FILE_NAME), compress_raw_results
+        ) as raw_results_store:
+            return run_phenopackets(
+                phenopacket_dir,
+                raw_results_dir,
+                model,
+                prompt,
+                constrained_list_path,
+                raw_results_store,
+                phenotypic_feature_compressor,
+                model_source,
+                batch_size,
+                pheno_engine,
+                map_reduce_query,
+                scheduler,
+                max_continuations,
+                model_cascade,
+            )
+    elif raw_results_backend == "json":
+        return run_phenopackets(
+            phenopacket_dir,
+            raw_results_dir,
+            model,
+            prompt,
+            constrained_list_path,
+            phenotypic_feature_compressor=phenotypic_feature_compressor,
+            model_source=model_source,
+            batch_size=batch_size,
+            pheno_engine=pheno_engine,
+            map_reduce_query=map_reduce_query,
+            scheduler=scheduler,
+            max_continuations=max_continuations,
+            model_cascade=model_cascade,
+        )
+    else:
+        raise ValueError(f"Unknown raw results backend: {raw_results_backend}")
@@ -1,12 +1,36 @@
 import json
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import Callable, List, Optional
 
 from phenopackets import Phenopacket
 from pheval.utils.file_utils import all_files
 from pheval.utils.phenopacket_utils import phenopacket_reader
 
 from pheval_ontogpt.prepare.clean_phenopacket import PhenopacketCleaner
+from pheval_ontogpt.prepare.compress_phenotypic_features import PhenotypicFeatureCompressor
 from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.cascade import ModelCascade
+from pheval_ontogpt.run.continuation import ContinuationStatistics
+from pheval_ontogpt.run.map_reduce import MapReduceQuery
+from pheval_ontogpt.run.raw_results_store import RawResultsStore, ontogpt_result_file_name
+from pheval_ontogpt.run.run_statistics import RunStatistics
+from pheval_ontogpt.run.scheduler import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def read_constrained_list(constrained_list_path: Path = None) -> Optional[List[str]]:
+    """Read the constrained list of genes or diseases, if provided."""
+    if constrained_list_path is None:
+        return None
+    with open(constrained_list_path, "r") as f:
+        constrained_list = f.readlines()
+    f.close()
+    return constrained_list
 
 
 def run_phenopacket(
@@ -16,12 +40,7 @@ def run_phenopacket(
     constrained_list_path: Path = None,
 ):
     """Run pheno engine on a single phenopacket."""
-    if constrained_list_path is not None:
-        with open(constrained_list_path, "r") as f:
-            constrained_list = f.readlines()
-        f.close()
-    else:
-        constrained_list = None
+    constrained_list = read_constrained_list(constrained_list_path)
     return pheno_engine.predict(phenopacket, prompt_template, constrained_list)
     # if gene_analysis and disease_analysis:
     #     return pheno_engine.predict(phenopacket, JOINT_PHENOPACKET_PROMPT)
@@ -35,23 +54,207 @@ def write_json_result(
     ontogpt_result: [dict], raw_results_dir: Path, phenopacket_path: Path
 ) -> None:
     """Write the OntoGPT json output."""
-    output_file = raw_results_dir.joinpath(f"{phenopacket_path.stem}-ontogpt_result.json")
+    output_file = raw_results_dir.joinpath(ontogpt_result_file_name(phenopacket_path.stem))
     with open(output_file, "w") as outfile:
         json.dump(ontogpt_result, outfile, indent=4)
     outfile.close()
 
 
+@dataclass
+class _Predictor:
+    """Predicts phenopackets with a map-reduce query and a model cascade, if provided."""
+
+    pheno_engine: PhenoEngine
+    prompt: Path
+    constrained_list: Optional[List[str]]
+    map_reduce_query: Optional[MapReduceQuery] = None
+    model_cascade: Optional[ModelCascade] = None
+
+    @property
+    def map_reduce(self) -> bool:
+        return self.map_reduce_query is not None and self.constrained_list is not None
+
+    def predict_with(self, engine: PhenoEngine, phenopacket: Phenopacket):
+        if self.map_reduce:
+            return self.map_reduce_query.predict(
+                engine, phenopacket, self.prompt, self.constrained_list
+            )
+        return engine.predict(phenopacket, self.prompt, self.constrained_list)
+
+    def predict(self, phenopacket: Phenopacket):
+        if self.model_cascade is not None:
+            return self.model_cascade.predict(self.pheno_engine, phenopacket, self.predict_with)
+        return self.predict_with(self.pheno_engine, phenopacket)
+
+    def predict_batch_with(self, engine: PhenoEngine, phenopackets: List[Phenopacket]):
+        return engine.predict_batch(phenopackets, self.prompt, self.constrained_list)
+
+    def predict_batch(self, phenopackets: List[Phenopacket]):
+        if self.map_reduce:
+            return [self.predict(phenopacket) for phenopacket in phenopackets]
+        if self.model_cascade is not None:
+            return self.model_cascade.predict_batch(
+                self.pheno_engine, phenopackets, self.predict_batch_with
+            )
+        return self.predict_batch_with(self.pheno_engine, phenopackets)
+
+    def request_prompts(self, engine: PhenoEngine, phenopacket: Phenopacket) -> List[str]:
+        if self.map_reduce:
+            return self.map_reduce_query.request_prompts(
+                engine, phenopacket, self.prompt, self.constrained_list
+            )
+        return [engine.render_prompt(phenopacket, self.prompt, self.constrained_list)]
+
+
+def _clean_phenopacket(phenopacket_path: Path) -> Phenopacket:
+    return PhenopacketCleaner(phenopacket_reader(phenopacket_path)).clean_phenopacket()
+
+
+def _write_result(
+    raw_results_store: Optional[RawResultsStore],
+    raw_results_dir: Path,
+    phenopacket_path: Path,
+    result,
+) -> None:
+    if raw_results_store is not None:
+        raw_results_store.append(phenopacket_path.stem, result)
+    else:
+        write_json_result(result, raw_results_dir, phenopacket_path)
+
+
+def _run_scheduled(
+    scheduler: RequestScheduler,
+    predictor: _Predictor,
+    phenopacket_paths: List[Path],
+    write_result: Callable[[Path, object], None],
+    run_statistics: RunStatistics,
+    model_source: str,
+) -> None:
+    model_cascade = predictor.model_cascade
+    scheduler.run(
+        predictor.pheno_engine,
+        [
+            (phenopacket_path, _clean_phenopacket(phenopacket_path))
+            for phenopacket_path in phenopacket_paths
+        ],
+        predictor.prompt,
+        predictor.constrained_list,
+        predictor.predict,
+        write_result,
+        run_statistics,
+        model_source,
+        model_cascade.fast_tier_cost if model_cascade is not None else None,
+        predictor.request_prompts,
+        model_cascade.fast_tier_engines() if model_cascade is not None else None,
+    )
+
+
+def _run_batches(
+    predictor: _Predictor,
+    phenopacket_paths: List[Path],
+    batch_size: int,
+    write_result: Callable[[Path, object], None],
+    run_statistics: RunStatistics,
+) -> None:
+    for i in range(0, len(phenopacket_paths), batch_size):
+        batch_paths = phenopacket_paths[i : i + batch_size]
+        clean_phenopackets = [
+            _clean_phenopacket(phenopacket_path) for phenopacket_path in batch_paths
+        ]
+        for phenopacket_path, result in zip(
+            batch_paths, predictor.predict_batch(clean_phenopackets)
+        ):
+            write_result(phenopacket_path, result)
+            run_statistics.cases_run += 1
+
+
+def _add_statistics(
+    run_statistics: RunStatistics,
+    pheno_engine: PhenoEngine,
+    model_cascade: Optional[ModelCascade],
+    phenotypic_feature_compressor: Optional[PhenotypicFeatureCompressor],
+) -> None:
+    """Record the cascade, continuation and compression statistics of a run."""
+    if model_cascade is not None:
+        model_cascade.add_statistics(run_statistics)
+    run_statistics.add_continuation_statistics(pheno_engine.continuation_statistics)
+    if run_statistics.truncated_completions:
+        logger.info(
+            f"Continued {run_statistics.truncated_completions} truncated completions with "
+            f"{run_statistics.continuation_requests} requests, "
+            f"salvaging {run_statistics.salvaged_cases} cases"
+        )
+    if phenotypic_feature_compressor is not None:
+        run_statistics.average_prompt_tokens_saved = (
+            phenotypic_feature_compressor.statistics.average_tokens_saved
+        )
+        logger.info(
+            f"HPO term compression saved {run_statistics.average_prompt_tokens_saved:.1f} "
+            f"tokens per prompt on average"
+        )
+
+
 def run_phenopackets(
     phenopacket_dir: Path,
     raw_results_dir: Path,
     model: str,
     prompt: Path,
     constrained_list_path: Path = None,
-) -> None:
-    """Run a directory of phenopackets on the basic PhenoEngine."""
-    pheno_engine = PhenoEngine(model=model, model_source="openai")
-    for phenopacket_path in all_files(phenopacket_dir):
-        phenopacket = phenopacket_reader(phenopacket_path)
-        clean_phenopacket = PhenopacketCleaner(phenopacket).clean_phenopacket()
-        result = run_phenopacket(pheno_engine, clean_phenopacket, prompt, constrained_list_path)
-        write_json_result(result, raw_results_dir, phenopacket_path)
+    raw_results_store: RawResultsStore = None,
+    phenotypic_feature_compressor: PhenotypicFeatureCompressor = None,
+    model_source: str = "openai",
+    batch_size: int = 1,
+    pheno_engine: PhenoEngine = None,
+    map_reduce_query: MapReduceQuery = None,
+    scheduler: RequestScheduler = None,
+    max_continuations: int = 2,
+    model_cascade: ModelCascade = None,
+) -> RunStatistics:
+    """
+    Run a directory of phenopackets on the basic PhenoEngine.
+
+    Phenopackets are predicted in batches of batch_size, which the local model source
+    generates in a single forward pass. Results are appended to the raw results store
+    if provided, otherwise written as one JSON file per phenopacket.
+    An already set up PhenoEngine may be provided to reuse its client between runs.
+    If a map-reduce query is provided, constrained lists too large for the context window
+    are queried in chunks for each phenopacket.
+    If a scheduler is provided, phenopackets are run concurrently, largest prompts first,
+    within its budget and deadline instead of in batches.
+    Completions cut off at the completion length are continued with up to max_continuations
+    further requests before parsing.
+    If a model cascade is provided, every phenopacket is first predicted with its fast model,
+    and only escalated to the configured model if the result is invalid or has a low top score.
+    """
+    if model_cascade is not None:
+        model_cascade.check_map_reduce_query(map_reduce_query)
+    if pheno_engine is None:
+        pheno_engine = PhenoEngine(
+            model=model,
+            model_source=model_source,
+            phenotypic_feature_compressor=phenotypic_feature_compressor,
+            batch_size=batch_size,
+        )
+    else:
+        pheno_engine.phenotypic_feature_compressor = phenotypic_feature_compressor
+    pheno_engine.max_continuations = max_continuations
+    pheno_engine.continuation_statistics = ContinuationStatistics()
+    predictor = _Predictor(
+        pheno_engine,
+        prompt,
+        read_constrained_list(constrained_list_path),
+        map_reduce_query,
+        model_cascade,
+    )
+    write_result = partial(_write_result, raw_results_store, raw_results_dir)
+    run_statistics = RunStatistics()
+    phenopacket_paths = all_files(phenopacket_dir)
+    with model_cascade.attached(pheno_engine) if model_cascade is not None else nullcontext():
+        if scheduler is not None:
+            _run_scheduled(
+                scheduler, predictor, phenopacket_paths, write_result, run_statistics, model_source
+            )
+        else:
+            _run_batches(predictor, phenopacket_paths, batch_size, write_result, run_statistics)
+    _add_statistics(run_statistics, pheno_engine, model_cascade, phenotypic_feature_compressor)
+    return run_statistics
@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pheval_ontogpt.run.continuation import ContinuationStatistics
+
+
+@dataclass
+class CascadeTierStatistics:
+    """
+    Statistics of one model of a model cascade.
+
+    Attributes:
+        model (str): The model of the tier.
+        cases (int): Number of cases run on the model.
+        median_latency (Optional[float]): Median seconds taken per case.
+        mean_latency (Optional[float]): Mean seconds taken per case.
+        cost (Optional[float]): Metered cost of the model's requests in USD, None if its token
+            prices are not known.
+    """
+
+    model: str
+    cases: int = 0
+    median_latency: Optional[float] = None
+    mean_latency: Optional[float] = None
+    cost: Optional[float] = None
+
+
+@dataclass
+class RunStatistics:
+    """
+    Statistics collected while running phenopackets, reported in the run metadata.
+
+    Attributes:
+        cases_run (int): Number of phenopackets run.
+        average_prompt_tokens_saved (Optional[float]): Average tokens removed from each prompt
+            by HPO term compression, None if compression was not used.
+        cost (Optional[float]): Metered cost of the run in USD, None if the run was not
+            scheduled or the token prices of the model are not known.
+        stop_reason (Optional[str]): What stopped the run early, the budget, the deadline or an
+            error, None if every phenopacket was run.
+        skipped_case_ids (List[str]): Phenopackets not run because the run stopped early.
+        truncated_completions (int): Number of cases whose completion was cut off at the
+            completion length.
+        salvaged_cases (int): Number of truncated cases parsed into a result after continuation.
+        continuation_requests (int): Number of continuation requests made.
+        escalation_rate (Optional[float]): Fraction of cases escalated from the fast model of a
+            model cascade, None if no cascade was used.
+        escalation_reasons (Dict[str, int]): Number of cases escalated for each reason.
+        cascade_tiers (List[CascadeTierStatistics]): Statistics of each model of the cascade.
+    """
+
+    cases_run: int = 0
+    average_prompt_tokens_saved: Optional[float] = None
+    cost: Optional[float] = None
+    stop_reason: Optional[str] = None
+    skipped_case_ids: List[str] = field(default_factory=list)
+    truncated_completions: int = 0
+    salvaged_cases: int = 0
+    continuation_requests: int = 0
+    escalation_rate: Optional[float] = None
+    escalation_reasons: Dict[str, int] = field(default_factory=dict)
+    cascade_tiers: List[CascadeTierStatistics] = field(default_factory=list)
+
+    def add_continuation_statistics(self, statistics: ContinuationStatistics) -> None:
+        """Record the truncated completions continued during the run."""
+        self.truncated_completions = statistics.truncated
+        self.salvaged_cases = statistics.salvaged
+        self.continuation_requests = statistics.requests
@@ -0,0 +1,395 @@
+"""Cost and deadline aware scheduling of OntoGPT requests."""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from statistics import mean
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from phenopackets import Phenopacket
+
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.continuation import continuation_prompt
+from pheval_ontogpt.run.run_statistics import RunStatistics
+from pheval_ontogpt.run.token_count import count_tokens, lookup_model
+
+logger = logging.getLogger(__name__)
+
+# USD per 1K prompt and completion tokens
+MODEL_TOKEN_PRICES = {
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.005, 0.015),
+}
+
+
+@dataclass(frozen=True)
+class TokenPrices:
+    """
+    Prices of a model in USD per 1K tokens.
+
+    Attributes:
+        prompt (float): Price of 1K prompt tokens.
+        completion (float): Price of 1K completion tokens.
+    """
+
+    prompt: float
+    completion: float
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """Return the cost in USD of a request."""
+        return (prompt_tokens * self.prompt + completion_tokens * self.completion) / 1000
+
+
+def token_prices(
+    model: str,
+    model_source: str = "openai",
+    prompt_token_price: Optional[float] = None,
+    completion_token_price: Optional[float] = None,
+) -> Optional[TokenPrices]:
+    """
+    Return the token prices of a model, None if they are not known.
+
+    Prices given explicitly take precedence, and models run locally cost nothing.
+    """
+    if prompt_token_price is not None and completion_token_price is not None:
+        return TokenPrices(prompt_token_price, completion_token_price)
+    if model_source == "local":
+        return TokenPrices(0.0, 0.0)
+    prices = lookup_model(MODEL_TOKEN_PRICES, model)
+    return TokenPrices(*prices) if prices is not None else None
+
+
+def worst_case_request_cost(
+    prices: TokenPrices,
+    prompt_tokens: int,
+    completion_length: int,
+    max_continuations: int = 0,
+    continuation_prompt_tokens: int = 0,
+) -> float:
+    """
+    Return the highest cost in USD of a request, including the continuations it may need.
+
+    Every completion is taken to reach the completion length, and the k-th continuation request
+    to carry the prompt, k completions and the continuation instructions.
+    """
+    return sum(
+        prices.cost(
+            prompt_tokens + continuation * (completion_length + continuation_prompt_tokens),
+            completion_length,
+        )
+        for continuation in range(max_continuations + 1)
+    )
+
+
+class MeteredClient:
+    """
+    Completion client wrapper accumulating the token usage and cost of every request.
+
+    Attributes:
+        client: The wrapped completion client.
+        model (str): Model used to count tokens.
+        prices (Optional[TokenPrices]): Token prices of the model, None if not known.
+    """
+
+    def __init__(self, client, model: str, prices: Optional[TokenPrices]):
+        self.client = client
+        self.model = model
+        self.prices = prices
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cost(self) -> Optional[float]:
+        """Cost in USD of the requests made so far, None if the prices are not known."""
+        if self.prices is None:
+            return None
+        return self.prices.cost(self.prompt_tokens, self.completion_tokens)
+
+    def _record(self, prompt: str, completion: str) -> None:
+        prompt_tokens = count_tokens(prompt, self.model)
+        completion_tokens = count_tokens(completion, self.model)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def complete(self, prompt: str, max_tokens: int = 500, **kwargs) -> str:
+        completion = self.client.complete(prompt, max_tokens=max_tokens, **kwargs)
+        self._record(prompt, completion)
+        return completion
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.client, name)
+        if name == "continue_completion":
+
+            def continue_completion(prompt: str, partial: str, max_tokens: int = 500) -> str:
+                completion = attribute(prompt, partial, max_tokens=max_tokens)
+                self._record(prompt + partial, completion)
+                return completion
+
+            return continue_completion
+        if name != "complete_batch":
+            return attribute
+
+        def complete_batch(prompts: List[str], max_tokens: int = 500) -> List[str]:
+            completions = attribute(prompts, max_tokens=max_tokens)
+            for prompt, completion in zip(prompts, completions):
+                self._record(prompt, completion)
+            return completions
+
+        return complete_batch
+
+
+@dataclass
+class ScheduledCase:
+    """
+    A phenopacket waiting to be run, with its estimated request size and cost.
+
+    Attributes:
+        phenopacket_path (Path): Path to the phenopacket.
+        phenopacket (Phenopacket): The cleaned phenopacket.
+        prompt_tokens (int): Number of tokens in the rendered prompts of the case.
+        estimated_cost (float): Highest cost in USD of the requests of the case, with every
+            completion of the maximum length and every continuation made.
+    """
+
+    phenopacket_path: Path
+    phenopacket: Phenopacket
+    prompt_tokens: int
+    estimated_cost: float
+
+
+@dataclass
+class RequestScheduler:
+    """
+    Run phenopackets concurrently, largest prompts first, within a spend budget and a deadline.
+
+    Every case is costed up front from every request it may send, such as the chunks and rerank
+    of a map-reduce query and the fast model of a model cascade, each with completions of the
+    maximum length and every continuation made, and the actual cost of each request is metered
+    as it completes. A case is only dispatched if the cost so far, the estimates of the cases in
+    flight and its own estimate fit in the budget, and if the run is expected to finish it before
+    the deadline, judging by the mean latency of the cases completed so far. Once a limit is
+    reached no further cases are dispatched, cases in flight are completed and written, and the
+    remaining cases are recorded as skipped in the run statistics. If a case fails, the run stops
+    with the error, recording the cases not written as skipped.
+
+    Attributes:
+        budget (Optional[float]): Maximum spend in USD, unlimited if None.
+        deadline (Optional[float]): Wall-clock limit in seconds from the start of the run,
+            unlimited if None.
+        concurrency (int): Maximum number of cases in flight.
+        prompt_token_price (Optional[float]): Price in USD per 1K prompt tokens, overriding
+            the known price of the model.
+        completion_token_price (Optional[float]): Price in USD per 1K completion tokens,
+            overriding the known price of the model.
+    """
+
+    budget: Optional[float] = None
+    deadline: Optional[float] = None
+    concurrency: int = 1
+    prompt_token_price: Optional[float] = None
+    completion_token_price: Optional[float] = None
+
+    def prices(self, pheno_engine: PhenoEngine, model_source: str) -> Optional[TokenPrices]:
+        """Return the token prices of the model, raising an error if a budget cannot be enforced."""
+        prices = token_prices(
+            pheno_engine.model,
+            model_source,
+            self.prompt_token_price,
+            self.completion_token_price,
+        )
+        if prices is None and self.budget is not None:
+            raise ValueError(
+                f"No token prices are known for {pheno_engine.model}, set prompt_token_price "
+                f"and completion_token_price to enforce a budget."
+            )
+        return prices
+
+    @staticmethod
+    def plan(
+        pheno_engine: PhenoEngine,
+        phenopackets: List[Tuple[Path, Phenopacket]],
+        prompt: Path,
+        constrained_list: Optional[List[str]],
+        prices: Optional[TokenPrices],
+        request_prompts: Optional[Callable[[PhenoEngine, Phenopacket], List[str]]] = None,
+        additional_engines: Optional[List[Tuple[PhenoEngine, Optional[TokenPrices]]]] = None,
+    ) -> List[ScheduledCase]:
+        """
+        Estimate the size and highest cost of every case, returning them largest prompt first.
+
+        The cost covers every request a case may send: each of its prompts, on the engine and on
+        any additional engine it may also be run on, with completions of the maximum length and
+        up to the maximum number of continuations.
+        """
+        if request_prompts is None:
+
+            def request_prompts(engine: PhenoEngine, phenopacket: Phenopacket) -> List[str]:
+                return [engine.render_prompt(phenopacket, prompt, constrained_list)]
+
+        engines = [(pheno_engine, prices)] + list(additional_engines or [])
+        continuation_prompt_tokens = {
+            engine.model: count_tokens(continuation_prompt("", ""), engine.model)
+            for engine, _ in engines
+        }
+        cases = []
+        for phenopacket_path, phenopacket in phenopackets:
+            total_prompt_tokens = 0
+            estimated_cost = 0.0
+            for engine, engine_prices in engines:
+                for request_prompt in request_prompts(engine, phenopacket):
+                    prompt_tokens = count_tokens(request_prompt, engine.model)
+                    if engine is pheno_engine:
+                        total_prompt_tokens += prompt_tokens
+                    if engine_prices is not None:
+                        estimated_cost += worst_case_request_cost(
+                            engine_prices,
+                            prompt_tokens,
+                            engine.completion_length,
+                            engine.max_continuations,
+                            continuation_prompt_tokens[engine.model],
+                        )
+            cases.append(
+                ScheduledCase(phenopacket_path, phenopacket, total_prompt_tokens, estimated_cost)
+            )
+        return sorted(cases, key=lambda case: case.prompt_tokens, reverse=True)
+
+    def _stop_reason(
+        self,
+        case: ScheduledCase,
+        cost: Callable[[], float],
+        in_flight: Dict[Future, ScheduledCase],
+        start: float,
+        latencies: List[float],
+    ) -> Optional[str]:
+        """Return why a case cannot be dispatched, None if it can."""
+        if self.deadline is not None:
+            expected_latency = mean(latencies) if latencies else 0.0
+            if time.monotonic() - start + expected_latency >= self.deadline:
+                return "deadline"
+        if self.budget is not None:
+            reserved = sum(in_flight_case.estimated_cost for in_flight_case in in_flight.values())
+            if cost() + reserved + case.estimated_cost > self.budget:
+                return "budget"
+        return None
+
+    @staticmethod
+    def _timed(
+        predict: Callable[[Phenopacket], Any], phenopacket: Phenopacket
+    ) -> Tuple[Any, float]:
+        start = time.monotonic()
+        result = predict(phenopacket)
+        return result, time.monotonic() - start
+
+    def run(
+        self,
+        pheno_engine: PhenoEngine,
+        phenopackets: List[Tuple[Path, Phenopacket]],
+        prompt: Path,
+        constrained_list: Optional[List[str]],
+        predict: Callable[[Phenopacket], Any],
+        write_result: Callable[[Path, Any], None],
+        run_statistics: RunStatistics,
+        model_source: str = "openai",
+        additional_cost: Optional[Callable[[], Optional[float]]] = None,
+        request_prompts: Optional[Callable[[PhenoEngine, Phenopacket], List[str]]] = None,
+        additional_engines: Optional[List[Tuple[PhenoEngine, Optional[TokenPrices]]]] = None,
+    ) -> None:
+        """
+        Run phenopackets within the budget and deadline.
+
+        Args:
+            pheno_engine (PhenoEngine): Engine whose client is metered for the run.
+            phenopackets (List[Tuple[Path, Phenopacket]]): Paths and cleaned phenopackets to run.
+            prompt (Path): The prompt template, used to estimate the size of each case.
+            constrained_list (Optional[List[str]]): The constrained list rendered in the prompt.
+            predict (Callable[[Phenopacket], Any]): Predicts the result of a phenopacket.
+            write_result (Callable[[Path, Any], None]): Writes the result of a phenopacket,
+                called from the scheduling thread only.
+            run_statistics (RunStatistics): Statistics updated with the cases run and skipped.
+            model_source (str): Source of the model, used to look up token prices.
+            additional_cost (Optional[Callable[[], Optional[float]]]): Returns the cost of
+                requests not made through the engine's client, such as those of the fast model
+                of a model cascade, None if it is not known.
+            request_prompts (Optional[Callable[[PhenoEngine, Phenopacket], List[str]]]): Returns
+                the prompts of the requests an engine sends for a case, such as the chunks of a
+                map-reduce query, the rendered prompt if None.
+            additional_engines (Optional[List[Tuple[PhenoEngine, Optional[TokenPrices]]]]):
+                Engines a case may also be run on, with their token prices, such as the fast
+                model of a model cascade.
+        """
+        prices = self.prices(pheno_engine, model_source)
+        if self.budget is not None and (
+            (additional_cost is not None and additional_cost() is None)
+            or any(engine_prices is None for _, engine_prices in additional_engines or [])
+        ):
+            raise ValueError("The cost of every model must be known to enforce a budget.")
+        pending = deque(
+            self.plan(
+                pheno_engine,
+                phenopackets,
+                prompt,
+                constrained_list,
+                prices,
+                request_prompts,
+                additional_engines,
+            )
+        )
+        metered_client = MeteredClient(pheno_engine.client, pheno_engine.model, prices)
+        pheno_engine.client = metered_client
+
+        def cost() -> Optional[float]:
+            if additional_cost is None or metered_client.cost is None:
+                return metered_client.cost
+            return metered_client.cost + (additional_cost() or 0.0)
+
+        in_flight: Dict[Future, ScheduledCase] = {}
+        latencies: List[float] = []
+        stop_reason = None
+        start = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+                while pending or in_flight:
+                    while stop_reason is None and pending and len(in_flight) < self.concurrency:
+                        stop_reason = self._stop_reason(
+                            pending[0], cost, in_flight, start, latencies
+                        )
+                        if stop_reason is None:
+                            case = pending.popleft()
+                            in_flight[executor.submit(self._timed, predict, case.phenopacket)] = (
+                                case
+                            )
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result, latency = future.result()
+                        latencies.append(latency)
+                        write_result(in_flight.pop(future).phenopacket_path, result)
+                        run_statistics.cases_run += 1
+        except Exception:
+            stop_reason = "error"
+            raise
+        finally:
+            pheno_engine.client = metered_client.client
+            run_statistics.cost = cost()
+            run_statistics.stop_reason = stop_reason
+            run_statistics.skipped_case_ids = [
+                case.phenopacket_path.stem for case in list(in_flight.values()) + list(pending)
+            ]
+        if stop_reason is not None:
+            logger.warning(
+                f"Stopped at the {stop_reason} with {len(pending)} of {len(phenopackets)} "
+                f"cases not run"
+            )
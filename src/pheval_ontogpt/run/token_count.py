@@ -0,0 +1,37 @@
+from functools import lru_cache
+from typing import Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_ENCODING_MODEL = "gpt-4"
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """Return the tiktoken encoding for a model, or None if tiktoken is unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.encoding_for_model(DEFAULT_ENCODING_MODEL)
+
+
+def count_tokens(text: str, model: str = DEFAULT_ENCODING_MODEL) -> int:
+    """
+    Count the tokens of a text for a model.
+
+    Falls back to an estimate of four characters per token if tiktoken is not installed.
+    """
+    encoding = _encoding(model or DEFAULT_ENCODING_MODEL)
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def lookup_model(table: Dict[str, T], model: str, default: Optional[T] = None) -> Optional[T]:
+    """Look up a model in a table keyed by model name, matching dated model versions by prefix."""
+    matches = [name for name in table if model == name or model.startswith(f"{name}-")]
+    return table[max(matches, key=len)] if matches else default
@@ -0,0 +1,383 @@
+"""Watch mode running and standardising phenopackets as they arrive."""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from google.protobuf.json_format import ParseError
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, phenopacket_reader
+
+from pheval_ontogpt.post_process.disease_name_resolution import DiseaseNameIndex
+from pheval_ontogpt.post_process.ontogpt_result_decoder import decode_ontogpt_json
+from pheval_ontogpt.post_process.post_process_results_format import standardise_ontogpt_result
+from pheval_ontogpt.prepare.clean_phenopacket import PhenopacketCleaner
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.cascade import ModelCascade
+from pheval_ontogpt.run.map_reduce import MapReduceQuery
+from pheval_ontogpt.run.raw_results_store import RawResultsStore, ontogpt_result_file_name
+from pheval_ontogpt.run.run_basic_pheno_engine import write_json_result
+from pheval_ontogpt.run.run_statistics import RunStatistics
+
+logger = logging.getLogger(__name__)
+
+
+def _is_phenopacket_file(path: Path) -> bool:
+    """Whether a file is a phenopacket, ignoring hidden temporary files written by copy tools."""
+    return path.suffix == ".json" and not path.name.startswith(".")
+
+
+class PollingDirectoryWatcher:
+    """
+    Detect new or modified phenopackets by scanning a directory at a fixed interval.
+
+    A file is reported once its size and modification time are unchanged between two scans,
+    so files that are still being written are not read.
+
+    Attributes:
+        directory (Path): The watched directory.
+        poll_interval (float): Seconds between scans.
+        rescan_needed (bool): Always False, scans cannot miss changes.
+    """
+
+    rescan_needed = False
+
+    def __init__(self, directory: Path, poll_interval: float = 1.0):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._reported = self._scan()
+        self._settling: Dict[Path, Tuple[int, int]] = {}
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                path = Path(entry.path)
+                if entry.is_file() and _is_phenopacket_file(path):
+                    stat = entry.stat()
+                    signatures[path] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def changes(self) -> List[Path]:
+        """Wait for the next scan and return the files that changed and have settled."""
+        time.sleep(self.poll_interval)
+        signatures = self._scan()
+        changed = []
+        for path, signature in signatures.items():
+            if self._reported.get(path) == signature:
+                continue
+            if self._settling.get(path) == signature:
+                del self._settling[path]
+                self._reported[path] = signature
+                changed.append(path)
+            else:
+                self._settling[path] = signature
+        self._reported = {
+            path: self._reported[path] for path in signatures if path in self._reported
+        }
+        self._settling = {
+            path: self._settling[path] for path in signatures if path in self._settling
+        }
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyDirectoryWatcher:
+    """
+    Detect new or modified phenopackets from inotify events.
+
+    Files are reported when closed after writing or moved into the directory. If the kernel
+    event queue overflows, rescan_needed is set so the caller can look for missed files.
+
+    Attributes:
+        directory (Path): The watched directory.
+        poll_interval (float): Maximum seconds to wait for events.
+        rescan_needed (bool): Whether events were lost since the last call to changes.
+    """
+
+    def __init__(self, directory: Path, poll_interval: float = 1.0):
+        from inotify_simple import INotify, flags
+
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.rescan_needed = False
+        self._flags = flags
+        self._inotify = INotify()
+        self._inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def changes(self) -> List[Path]:
+        """Wait for events and return the files that were written or moved in."""
+        self.rescan_needed = False
+        changed = []
+        for event in self._inotify.read(timeout=int(self.poll_interval * 1000)):
+            if event.mask & self._flags.Q_OVERFLOW:
+                logger.warning("inotify event queue overflowed, rescanning phenopackets")
+                self.rescan_needed = True
+                continue
+            path = self.directory.joinpath(event.name)
+            if _is_phenopacket_file(path):
+                changed.append(path)
+        return list(dict.fromkeys(changed))
+
+    def close(self) -> None:
+        self._inotify.close()
+
+
+def directory_watcher(directory: Path, poll_interval: float = 1.0, polling: bool = False):
+    """
+    Return an inotify watcher for a directory, falling back to polling.
+
+    Polling is used if requested, if inotify_simple is not installed or if inotify is not
+    available on the platform.
+    """
+    if not polling:
+        try:
+            return InotifyDirectoryWatcher(directory, poll_interval)
+        except (ImportError, OSError) as e:
+            logger.info(f"inotify is not available ({e}), polling {directory} for phenopackets")
+    return PollingDirectoryWatcher(directory, poll_interval)
+
+
+@dataclass
+class PhenopacketWatcher:
+    """
+    Run and standardise phenopackets as they arrive in a directory.
+
+    A watcher thread puts new or modified phenopackets on a queue holding at most max_pending
+    paths; when it is full the watcher blocks until phenopackets have been run, so a burst of
+    arrivals cannot outpace the model. Phenopackets are taken from the queue in micro-batches of
+    up to batch_size, waiting at most batch_window seconds to fill a batch. The raw result of each
+    phenopacket is written and standardised straight away. Phenopackets already in the directory
+    on start are run if they have no raw result, or a raw result older than the phenopacket.
+    A batch that fails, for example on a rate limit error, is logged and skipped without stopping
+    the watcher.
+
+    Attributes:
+        phenopacket_dir (Path): The watched directory of phenopackets.
+        raw_results_dir (Path): Directory raw results are written to.
+        output_dir (Path): Directory standardised results are written to.
+        pheno_engine (PhenoEngine): Engine used to predict diagnoses.
+        prompt (Path): The prompt template.
+        gene_analysis (bool): Standardise gene results.
+        disease_analysis (bool): Standardise disease results.
+        gene_identifier_updator (GeneIdentifierUpdater): Maps gene symbols to identifiers.
+        constrained_list (Optional[List[str]]): Constrained list rendered in the prompt.
+        raw_results_store (Optional[RawResultsStore]): Store raw results are appended to,
+            otherwise they are written as JSON files.
+        map_reduce_query (Optional[MapReduceQuery]): Queries large constrained lists in chunks.
+        model_cascade (Optional[ModelCascade]): Tries a fast model first for every phenopacket.
+        disease_name_index (Optional[DiseaseNameIndex]): Corrects predicted disease identifiers.
+        batch_size (int): Maximum number of phenopackets predicted together.
+        batch_window (float): Maximum seconds to wait for a batch to fill.
+        max_pending (int): Maximum number of phenopackets waiting to be run.
+        poll_interval (float): Seconds between directory scans, or maximum wait for inotify events.
+        polling (bool): Poll the directory even if inotify is available.
+        sort_order (str): Sort order of standardised results.
+    """
+
+    phenopacket_dir: Path
+    raw_results_dir: Path
+    output_dir: Path
+    pheno_engine: PhenoEngine
+    prompt: Path
+    gene_analysis: bool
+    disease_analysis: bool
+    gene_identifier_updator: GeneIdentifierUpdater
+    constrained_list: Optional[List[str]] = None
+    raw_results_store: Optional[RawResultsStore] = None
+    map_reduce_query: Optional[MapReduceQuery] = None
+    model_cascade: Optional[ModelCascade] = None
+    disease_name_index: Optional[DiseaseNameIndex] = None
+    batch_size: int = 1
+    batch_window: float = 1.0
+    max_pending: int = 256
+    poll_interval: float = 1.0
+    polling: bool = False
+    sort_order: str = "descending"
+
+    def __post_init__(self):
+        if self.model_cascade is not None:
+            self.model_cascade.check_map_reduce_query(self.map_reduce_query)
+
+    def has_result(self, phenopacket_path: Path) -> bool:
+        """Whether a phenopacket has a raw result at least as recent as the phenopacket."""
+        try:
+            phenopacket_mtime_ns = phenopacket_path.stat().st_mtime_ns
+            if self.raw_results_store is not None:
+                written_at = self.raw_results_store.written_at(phenopacket_path.stem)
+                return written_at is not None and written_at >= datetime.fromtimestamp(
+                    phenopacket_mtime_ns / 1e9
+                )
+            raw_result_path = self.raw_results_dir.joinpath(
+                ontogpt_result_file_name(phenopacket_path.stem)
+            )
+            return raw_result_path.stat().st_mtime_ns >= phenopacket_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    def _put(self, pending: queue.Queue, item: Tuple[Path, bool], stop_event: threading.Event):
+        """Put an item on the queue, blocking while it is full unless the watcher is stopped."""
+        while not stop_event.is_set():
+            try:
+                pending.put(item, timeout=self.poll_interval)
+                return
+            except queue.Full:
+                continue
+
+    def _enqueue_existing(self, pending: queue.Queue, stop_event: threading.Event) -> None:
+        for phenopacket_path in sorted(self.phenopacket_dir.iterdir()):
+            if phenopacket_path.is_file() and _is_phenopacket_file(phenopacket_path):
+                self._put(pending, (phenopacket_path, False), stop_event)
+
+    def _watch(self, watcher, pending: queue.Queue, stop_event: threading.Event) -> None:
+        """Put existing phenopackets, then new or modified ones, on the queue until stopped."""
+        try:
+            self._enqueue_existing(pending, stop_event)
+            while not stop_event.is_set():
+                for phenopacket_path in watcher.changes():
+                    self._put(pending, (phenopacket_path, True), stop_event)
+                if watcher.rescan_needed:
+                    self._enqueue_existing(pending, stop_event)
+        finally:
+            watcher.close()
+
+    def _next_batch(self, pending: queue.Queue, stop_event: threading.Event) -> List[Path]:
+        """Take up to batch_size phenopackets to run, waiting at most batch_window to fill it."""
+        try:
+            items = [pending.get(timeout=self.poll_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(items) < self.batch_size and not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # phenopackets already in the directory are only run if they have no recent raw result,
+        # which is checked here as the raw results store can only be used from this thread
+        return list(
+            dict.fromkeys(
+                phenopacket_path
+                for phenopacket_path, changed in items
+                if changed or not self.has_result(phenopacket_path)
+            )
+        )
+
+    def _read_phenopackets(self, phenopacket_paths: List[Path]) -> List[Tuple[Path, object]]:
+        phenopackets = []
+        for phenopacket_path in phenopacket_paths:
+            try:
+                phenopackets.append(
+                    (
+                        phenopacket_path,
+                        PhenopacketCleaner(
+                            phenopacket_reader(phenopacket_path)
+                        ).clean_phenopacket(),
+                    )
+                )
+            except (FileNotFoundError, json.JSONDecodeError, ParseError) as e:
+                logger.warning(f"Skipping unreadable phenopacket {phenopacket_path}: {e}")
+        return phenopackets
+
+    def _predict_batch_with(self, pheno_engine: PhenoEngine, phenopackets: List) -> List:
+        if self.map_reduce_query is not None and self.constrained_list is not None:
+            return [
+                self.map_reduce_query.predict(
+                    pheno_engine, phenopacket, self.prompt, self.constrained_list
+                )
+                for phenopacket in phenopackets
+            ]
+        return pheno_engine.predict_batch(phenopackets, self.prompt, self.constrained_list)
+
+    def _predict_batch(self, phenopackets: List) -> List:
+        if self.model_cascade is not None:
+            return self.model_cascade.predict_batch(
+                self.pheno_engine, phenopackets, self._predict_batch_with
+            )
+        return self._predict_batch_with(self.pheno_engine, phenopackets)
+
+    def process_batch(self, phenopacket_paths: List[Path]) -> int:
+        """
+        Run a batch of phenopackets, writing and standardising the raw result of each.
+
+        Returns:
+            int: The number of phenopackets run.
+        """
+        phenopackets = self._read_phenopackets(phenopacket_paths)
+        if not phenopackets:
+            return 0
+        results = self._predict_batch([phenopacket for _, phenopacket in phenopackets])
+        for (phenopacket_path, _), result in zip(phenopackets, results):
+            if self.raw_results_store is not None:
+                self.raw_results_store.append(phenopacket_path.stem, result)
+            else:
+                write_json_result(result, self.raw_results_dir, phenopacket_path)
+            ontogpt_result_path = self.raw_results_dir.joinpath(
+                ontogpt_result_file_name(phenopacket_path.stem)
+            )
+            standardise_ontogpt_result(
+                decode_ontogpt_json(
+                    json.dumps(result),
+                    ontogpt_result_path,
+                    self.gene_analysis,
+                    self.disease_analysis,
+                ),
+                self.output_dir,
+                self.gene_analysis,
+                self.disease_analysis,
+                self.sort_order,
+                self.gene_identifier_updator,
+                self.disease_name_index,
+            )
+        return len(phenopackets)
+
+    def run(self, stop_event: threading.Event = None) -> RunStatistics:
+        """Watch the phenopacket directory until the stop event is set."""
+        stop_event = stop_event or threading.Event()
+        pending = queue.Queue(maxsize=max(1, self.max_pending))
+        watcher = directory_watcher(self.phenopacket_dir, self.poll_interval, self.polling)
+        watcher_thread = threading.Thread(
+            target=self._watch, args=(watcher, pending, stop_event), daemon=True
+        )
+        watcher_thread.start()
+        run_statistics = RunStatistics()
+        try:
+            with (
+                self.model_cascade.attached(self.pheno_engine)
+                if self.model_cascade is not None
+                else nullcontext()
+            ):
+                while not stop_event.is_set():
+                    batch = self._next_batch(pending, stop_event)
+                    if not batch:
+                        continue
+                    start = time.monotonic()
+                    try:
+                        cases_run = self.process_batch(batch)
+                    except Exception:
+                        # a transient API error must not stop watching, the skipped phenopackets
+                        # are run again when modified or when the watcher is restarted
+                        logger.exception(f"Skipping {len(batch)} phenopackets after an error")
+                        run_statistics.skipped_case_ids.extend(path.stem for path in batch)
+                        continue
+                    run_statistics.cases_run += cases_run
+                    logger.info(f"Ran {cases_run} phenopackets in {time.monotonic() - start:.1f}s")
+        finally:
+            stop_event.set()
+            watcher_thread.join()
+        run_statistics.add_continuation_statistics(self.pheno_engine.continuation_statistics)
+        if self.model_cascade is not None:
+            self.model_cascade.add_statistics(run_statistics)
+        return run_statistics
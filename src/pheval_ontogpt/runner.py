@@ -1,14 +1,30 @@
 """OntoGPT Runner"""
 
+import threading
+from contextlib import ExitStack
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 from pheval.runners.runner import PhEvalRunner
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_hgnc_dict
 
 from pheval_ontogpt.construct_run_metadata.construct_metadata import construct_run_metadata
+from pheval_ontogpt.post_process.disease_name_resolution import DiseaseNameIndex
 from pheval_ontogpt.post_process.post_process import post_process_results_format
+from pheval_ontogpt.prepare.compress_phenotypic_features import PhenotypicFeatureCompressor
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.cascade import ModelCascade
+from pheval_ontogpt.run.continuation import ContinuationStatistics
+from pheval_ontogpt.run.map_reduce import MapReduceQuery
+from pheval_ontogpt.run.raw_results_store import RAW_RESULTS_STORE_FILE_NAME, RawResultsStore
 from pheval_ontogpt.run.run import run_basic
+from pheval_ontogpt.run.run_basic_pheno_engine import read_constrained_list
+from pheval_ontogpt.run.run_statistics import RunStatistics
+from pheval_ontogpt.run.scheduler import RequestScheduler
+from pheval_ontogpt.run.watch import PhenopacketWatcher
 from pheval_ontogpt.tool_specific_configuration_parser import OntoGPTToolSpecificConfigurations
+from pheval_ontogpt.warm_resources import WarmResources
 
 
 @dataclass
@@ -21,6 +37,36 @@ class OntoGPTPhEvalRunner(PhEvalRunner):
     output_dir: Path
     config_file: Path
     version: str
+    run_statistics: Optional[RunStatistics] = None
+    warm_resources: Optional[WarmResources] = None
+
+    @staticmethod
+    def _map_reduce_query(
+        tool_specific_configurations: OntoGPTToolSpecificConfigurations,
+    ) -> Optional[MapReduceQuery]:
+        if not tool_specific_configurations.map_reduce:
+            return None
+        return MapReduceQuery(
+            tool_specific_configurations.map_reduce_concurrency,
+            tool_specific_configurations.score_fusion,
+            tool_specific_configurations.rerank_top_n,
+            tool_specific_configurations.context_window,
+        )
+
+    def _model_cascade(
+        self, tool_specific_configurations: OntoGPTToolSpecificConfigurations
+    ) -> Optional[ModelCascade]:
+        if tool_specific_configurations.cascade_model is None:
+            return None
+        return ModelCascade(
+            tool_specific_configurations.cascade_model,
+            tool_specific_configurations.escalation_score_threshold,
+            self.input_dir_config.gene_analysis,
+            self.input_dir_config.disease_analysis,
+            tool_specific_configurations.model_source,
+            tool_specific_configurations.prompt_token_price,
+            tool_specific_configurations.completion_token_price,
+        )
 
     def prepare(self):
         """prepare"""
@@ -32,7 +78,7 @@ class OntoGPTPhEvalRunner(PhEvalRunner):
         tool_specific_configurations = OntoGPTToolSpecificConfigurations.parse_obj(
             self.input_dir_config.tool_specific_configuration_options
         )
-        run_basic(
+        self.run_statistics = run_basic(
             self.testdata_dir,
             self.raw_results_dir,
             tool_specific_configurations.model,
@@ -42,20 +88,175 @@ class OntoGPTPhEvalRunner(PhEvalRunner):
                 if tool_specific_configurations.constrained_list_path is not None
                 else None
             ),
+            tool_specific_configurations.raw_results_backend,
+            tool_specific_configurations.compress_raw_results,
+            (
+                self.input_dir.joinpath(tool_specific_configurations.hpo_closure_path)
+                if tool_specific_configurations.compress_hpo_terms
+                else None
+            ),
+            tool_specific_configurations.model_source,
+            tool_specific_configurations.batch_size,
+            (
+                self.warm_resources.pheno_engine(
+                    tool_specific_configurations.model,
+                    tool_specific_configurations.model_source,
+                    tool_specific_configurations.batch_size,
+                )
+                if self.warm_resources is not None
+                else None
+            ),
+            self._map_reduce_query(tool_specific_configurations),
+            (
+                RequestScheduler(
+                    tool_specific_configurations.budget_usd,
+                    (
+                        tool_specific_configurations.deadline_minutes * 60
+                        if tool_specific_configurations.deadline_minutes is not None
+                        else None
+                    ),
+                    tool_specific_configurations.concurrency,
+                    tool_specific_configurations.prompt_token_price,
+                    tool_specific_configurations.completion_token_price,
+                )
+                if tool_specific_configurations.budget_usd is not None
+                or tool_specific_configurations.deadline_minutes is not None
+                or tool_specific_configurations.concurrency > 1
+                else None
+            ),
+            tool_specific_configurations.max_continuations,
+            self._model_cascade(tool_specific_configurations),
         )
 
     def post_process(self):
         """post_process"""
         print("post processing")
+        tool_specific_configurations = OntoGPTToolSpecificConfigurations.parse_obj(
+            self.input_dir_config.tool_specific_configuration_options
+        )
+        disease_name_index_path = (
+            self.input_dir.joinpath(tool_specific_configurations.disease_name_index_path)
+            if tool_specific_configurations.disease_name_index_path is not None
+            else None
+        )
         post_process_results_format(
             self.raw_results_dir,
             self.output_dir,
             self.input_dir_config.gene_analysis,
             self.input_dir_config.disease_analysis,
+            disease_name_index_path,
+            (
+                self.warm_resources.disease_name_index(disease_name_index_path)
+                if self.warm_resources is not None and disease_name_index_path is not None
+                else None
+            ),
+            (
+                self.warm_resources.gene_identifier_updator
+                if self.warm_resources is not None
+                else None
+            ),
         )
 
+    def watch(
+        self,
+        batch_window: float = 1.0,
+        max_pending: int = 256,
+        poll_interval: float = 1.0,
+        polling: bool = False,
+        stop_event: threading.Event = None,
+    ) -> RunStatistics:
+        """Run and standardise phenopackets as they arrive in the test data directory until stopped."""
+        print("watching with OntoGPT")
+        tool_specific_configurations = OntoGPTToolSpecificConfigurations.parse_obj(
+            self.input_dir_config.tool_specific_configuration_options
+        )
+        if tool_specific_configurations.raw_results_backend not in ("json", "sqlite"):
+            raise ValueError(
+                f"Unknown raw results backend: {tool_specific_configurations.raw_results_backend}"
+            )
+        pheno_engine = (
+            self.warm_resources.pheno_engine(
+                tool_specific_configurations.model,
+                tool_specific_configurations.model_source,
+                tool_specific_configurations.batch_size,
+            )
+            if self.warm_resources is not None
+            else PhenoEngine(
+                model=tool_specific_configurations.model,
+                model_source=tool_specific_configurations.model_source,
+                batch_size=tool_specific_configurations.batch_size,
+            )
+        )
+        pheno_engine.phenotypic_feature_compressor = (
+            PhenotypicFeatureCompressor.from_closure_file(
+                self.input_dir.joinpath(tool_specific_configurations.hpo_closure_path),
+                tool_specific_configurations.model,
+            )
+            if tool_specific_configurations.compress_hpo_terms
+            else None
+        )
+        pheno_engine.max_continuations = tool_specific_configurations.max_continuations
+        pheno_engine.continuation_statistics = ContinuationStatistics()
+        disease_name_index_path = (
+            self.input_dir.joinpath(tool_specific_configurations.disease_name_index_path)
+            if tool_specific_configurations.disease_name_index_path is not None
+            else None
+        )
+        with ExitStack() as stack:
+            phenopacket_watcher = PhenopacketWatcher(
+                phenopacket_dir=self.testdata_dir.joinpath("phenopackets"),
+                raw_results_dir=self.raw_results_dir,
+                output_dir=self.output_dir,
+                pheno_engine=pheno_engine,
+                prompt=self.input_dir.joinpath(tool_specific_configurations.template),
+                gene_analysis=self.input_dir_config.gene_analysis,
+                disease_analysis=self.input_dir_config.disease_analysis,
+                gene_identifier_updator=(
+                    self.warm_resources.gene_identifier_updator
+                    if self.warm_resources is not None
+                    else GeneIdentifierUpdater(
+                        hgnc_data=create_hgnc_dict(), gene_identifier="ensembl_id"
+                    )
+                ),
+                constrained_list=read_constrained_list(
+                    self.input_dir.joinpath(tool_specific_configurations.constrained_list_path)
+                    if tool_specific_configurations.constrained_list_path is not None
+                    else None
+                ),
+                raw_results_store=(
+                    stack.enter_context(
+                        RawResultsStore(
+                            self.raw_results_dir.joinpath(RAW_RESULTS_STORE_FILE_NAME),
+                            tool_specific_configurations.compress_raw_results,
+                        )
+                    )
+                    if tool_specific_configurations.raw_results_backend == "sqlite"
+                    else None
+                ),
+                map_reduce_query=self._map_reduce_query(tool_specific_configurations),
+                model_cascade=self._model_cascade(tool_specific_configurations),
+                disease_name_index=(
+                    (
+                        self.warm_resources.disease_name_index(disease_name_index_path)
+                        if self.warm_resources is not None
+                        else DiseaseNameIndex.read(disease_name_index_path)
+                    )
+                    if disease_name_index_path is not None
+                    else None
+                ),
+                batch_size=tool_specific_configurations.batch_size,
+                batch_window=batch_window,
+                max_pending=max_pending,
+                poll_interval=poll_interval,
+                polling=polling,
+            )
+            self.run_statistics = phenopacket_watcher.run(stop_event)
+        return self.run_statistics
+
     def construct_meta_data(self):
         tool_specific_configurations = OntoGPTToolSpecificConfigurations.parse_obj(
             self.input_dir_config.tool_specific_configuration_options
         )
-        return construct_run_metadata(self.meta_data, tool_specific_configurations.model)
+        return construct_run_metadata(
+            self.meta_data, tool_specific_configurations.model, self.run_statistics
+        )
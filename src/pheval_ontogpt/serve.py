@@ -0,0 +1,183 @@
+"""Long-lived job server keeping OntoGPT resources warm between runs."""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+import click
+from pheval.utils.file_utils import write_metadata
+
+from pheval_ontogpt.client import socket_option
+from pheval_ontogpt.post_process.post_process_results_format import create_standardised_results
+from pheval_ontogpt.runner import OntoGPTPhEvalRunner
+from pheval_ontogpt.warm_resources import WarmResources
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(
+    warm_resources: WarmResources,
+    input_dir: str,
+    testdata_dir: str,
+    output_dir: str,
+    tmp_dir: str = None,
+    version: str = None,
+) -> None:
+    """Run the OntoGPT PhEval runner as `pheval run` would, reusing warm resources."""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    runner = OntoGPTPhEvalRunner(
+        Path(input_dir),
+        Path(testdata_dir),
+        Path(tmp_dir) if tmp_dir else None,
+        Path(output_dir),
+        None,
+        version,
+        warm_resources=warm_resources,
+    )
+    runner.build_output_directory_structure()
+    runner.prepare()
+    runner.run()
+    runner.post_process()
+    write_metadata(Path(output_dir), runner.construct_meta_data())
+
+
+def standardise_job(
+    warm_resources: WarmResources,
+    raw_results_dir: str,
+    output_dir: str,
+    gene_analysis: bool = False,
+    disease_analysis: bool = False,
+    disease_name_index: str = None,
+    incremental: bool = False,
+) -> None:
+    """Standardise raw results as `pheval-ontogpt standardise` would, reusing warm resources."""
+    output_dir = Path(output_dir)
+    if disease_analysis:
+        output_dir.joinpath("pheval_disease_results").mkdir(parents=True, exist_ok=True)
+    if gene_analysis:
+        output_dir.joinpath("pheval_gene_results").mkdir(parents=True, exist_ok=True)
+    create_standardised_results(
+        Path(raw_results_dir),
+        output_dir,
+        gene_analysis,
+        disease_analysis,
+        disease_name_index=(
+            warm_resources.disease_name_index(Path(disease_name_index))
+            if disease_name_index is not None
+            else None
+        ),
+        incremental=incremental,
+        gene_identifier_updator=warm_resources.gene_identifier_updator,
+    )
+
+
+JOBS = {"run": run_job, "standardise": standardise_job}
+
+
+class OntoGPTJobHandler(socketserver.StreamRequestHandler):
+    """
+    Handle newline-delimited JSON job requests, replying with one JSON response per request.
+
+    Jobs are run one at a time, so a client that stops sending or reading is disconnected
+    after the server's client timeout rather than blocking every other client.
+    """
+
+    def setup(self):
+        self.timeout = self.server.client_timeout
+        super().setup()
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                response = self.server.handle_request_message(line)
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+        except TimeoutError:
+            logger.warning(f"Disconnecting a client idle for {self.timeout}s")
+
+
+class OntoGPTJobServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server running jobs one at a time against a shared set of warm resources.
+
+    Attributes:
+        warm_resources (WarmResources): Resources reused between jobs.
+        client_timeout (float): Seconds a connected client may wait between reads and writes
+            before it is disconnected, jobs themselves are not limited.
+    """
+
+    def __init__(
+        self, socket_path: Path, warm_resources: WarmResources, client_timeout: float = 60.0
+    ):
+        self.warm_resources = warm_resources
+        self.client_timeout = client_timeout
+        super().__init__(str(socket_path), OntoGPTJobHandler)
+
+    def server_bind(self):
+        """Bind the socket, only accessible to the current user from the moment it is created."""
+        previous_umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous_umask)
+
+    def handle_request_message(self, message: bytes) -> Dict:
+        """Run the job described by a request message and return the response."""
+        start = time.perf_counter()
+        try:
+            request = json.loads(message)
+            job = request.pop("job")
+            if job == "ping":
+                return {"status": "ok"}
+            if job == "shutdown":
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                return {"status": "ok"}
+            if job not in JOBS:
+                raise ValueError(f"Unknown job: {job}")
+            JOBS[job](self.warm_resources, **request)
+        except Exception as e:
+            # report any job failure to the client rather than stopping the server
+            logger.exception("Job failed")
+            return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        return {"status": "ok", "elapsed_seconds": time.perf_counter() - start}
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    """Remove a socket file left behind by a server that is no longer running."""
+    if not socket_path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(socket_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            socket_path.unlink(missing_ok=True)
+            return
+        except PermissionError:
+            raise click.ClickException(
+                f"Cannot connect to {socket_path}, it belongs to another user or server; "
+                f"remove it or choose another socket path"
+            ) from None
+    raise click.ClickException(f"A server is already listening on {socket_path}")
+
+
+@click.command("serve")
+@socket_option
+def serve_command(socket_path: Path):
+    """Serve run and standardise jobs over a Unix socket, keeping resources loaded between jobs."""
+    _remove_stale_socket(socket_path)
+    warm_resources = WarmResources()
+    warm_resources.warm_up()
+    with OntoGPTJobServer(socket_path, warm_resources) as server:
+        print(f"serving on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            socket_path.unlink(missing_ok=True)
@@ -7,3 +7,23 @@ class OntoGPTToolSpecificConfigurations(BaseModel):
     model: str = Field(...)
     template: Path = Field(...)
     constrained_list_path: Path = Field(None)
+    disease_name_index_path: Path = Field(None)
+    raw_results_backend: str = Field("json")
+    compress_raw_results: bool = Field(False)
+    compress_hpo_terms: bool = Field(False)
+    hpo_closure_path: Path = Field("hpo_closure.json")
+    model_source: str = Field("openai")
+    batch_size: int = Field(1)
+    map_reduce: bool = Field(False)
+    context_window: int = Field(None)
+    map_reduce_concurrency: int = Field(4)
+    score_fusion: str = Field("max")
+    rerank_top_n: int = Field(0)
+    budget_usd: float = Field(None)
+    deadline_minutes: float = Field(None)
+    concurrency: int = Field(1)
+    prompt_token_price: float = Field(None)
+    completion_token_price: float = Field(None)
+    max_continuations: int = Field(2)
+    cascade_model: str = Field(None)
+    escalation_score_threshold: float = Field(0.5)
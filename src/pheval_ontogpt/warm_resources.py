@@ -0,0 +1,49 @@
+from pathlib import Path
+from typing import Dict, Tuple
+
+from pheval.utils.phenopacket_utils import GeneIdentifierUpdater, create_hgnc_dict
+
+from pheval_ontogpt.post_process.disease_name_resolution import DiseaseNameIndex
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+
+
+class WarmResources:
+    """
+    Class holding the resources that are expensive to load, so they can be reused between runs
+    by a long-lived process: the HGNC gene identifier updater, pheno engines along with their
+    clients, and disease name indexes.
+    """
+
+    def __init__(self):
+        self._gene_identifier_updator = None
+        self._pheno_engines: Dict[Tuple[str, str, int], PhenoEngine] = {}
+        self._disease_name_indexes: Dict[Tuple[Path, int], DiseaseNameIndex] = {}
+
+    @property
+    def gene_identifier_updator(self) -> GeneIdentifierUpdater:
+        """Return the gene identifier updater, loading the HGNC data on first use."""
+        if self._gene_identifier_updator is None:
+            self._gene_identifier_updator = GeneIdentifierUpdater(
+                hgnc_data=create_hgnc_dict(), gene_identifier="ensembl_id"
+            )
+        return self._gene_identifier_updator
+
+    def pheno_engine(self, model: str, model_source: str, batch_size: int = 1) -> PhenoEngine:
+        """Return the pheno engine for a model, setting it up on first use."""
+        key = (model, model_source, batch_size)
+        if key not in self._pheno_engines:
+            self._pheno_engines[key] = PhenoEngine(
+                model=model, model_source=model_source, batch_size=batch_size
+            )
+        return self._pheno_engines[key]
+
+    def disease_name_index(self, index_path: Path) -> DiseaseNameIndex:
+        """Return a disease name index, reading it again only if the file was modified."""
+        key = (index_path.resolve(), index_path.stat().st_mtime_ns)
+        if key not in self._disease_name_indexes:
+            self._disease_name_indexes = {key: DiseaseNameIndex.read(index_path)}
+        return self._disease_name_indexes[key]
+
+    def warm_up(self) -> None:
+        """Load the resources that do not depend on a run configuration."""
+        self.gene_identifier_updator
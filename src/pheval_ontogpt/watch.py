@@ -0,0 +1,89 @@
+"""Command watching the test data directory for new phenopackets."""
+
+import signal
+import threading
+from pathlib import Path
+
+import click
+from pheval.utils.file_utils import write_metadata
+
+from pheval_ontogpt.runner import OntoGPTPhEvalRunner
+
+
+@click.command("watch")
+@click.option(
+    "--input-dir",
+    "-i",
+    required=True,
+    metavar="DIRECTORY",
+    help="Input directory containing the config.yaml.",
+    type=Path,
+)
+@click.option(
+    "--testdata-dir",
+    "-t",
+    required=True,
+    metavar="DIRECTORY",
+    help="Test data directory whose phenopackets subdirectory is watched.",
+    type=Path,
+)
+@click.option(
+    "--output-dir",
+    "-o",
+    required=True,
+    metavar="DIRECTORY",
+    help="Output directory for raw and standardised results.",
+    type=Path,
+)
+@click.option(
+    "--batch-window",
+    default=1.0,
+    required=False,
+    type=float,
+    show_default=True,
+    help="Maximum seconds to wait for more phenopackets to fill a batch.",
+)
+@click.option(
+    "--max-pending",
+    default=256,
+    required=False,
+    type=int,
+    show_default=True,
+    help="Maximum number of phenopackets waiting to be run before watching pauses.",
+)
+@click.option(
+    "--poll-interval",
+    default=1.0,
+    required=False,
+    type=float,
+    show_default=True,
+    help="Seconds between directory scans when polling.",
+)
+@click.option(
+    "--polling/--inotify",
+    default=False,
+    required=False,
+    type=bool,
+    show_default=True,
+    help="Poll the directory instead of using inotify.",
+)
+def watch_command(
+    input_dir: Path,
+    testdata_dir: Path,
+    output_dir: Path,
+    batch_window: float,
+    max_pending: int,
+    poll_interval: float,
+    polling: bool,
+):
+    """Run and standardise phenopackets as they arrive, until interrupted."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    runner = OntoGPTPhEvalRunner(input_dir, testdata_dir, None, output_dir, None, None)
+    runner.build_output_directory_structure()
+    stop_event = threading.Event()
+    # finish the batch in progress on interrupt, so every raw result written is standardised
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    run_statistics = runner.watch(batch_window, max_pending, poll_interval, polling, stop_event)
+    write_metadata(output_dir, runner.construct_meta_data())
+    print(f"ran {run_statistics.cases_run} phenopackets")
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+from typing import Dict, List
+
+from pheval_ontogpt.run.basic_pheno_engine import PhenoEngine
+from pheval_ontogpt.run.continuation import ContinuationStatistics
+
+
+class FakeClient:
+    """Completion client recording its prompts and returning queued completions, then []."""
+
+    def __init__(self, completions: List[str] = None):
+        self.completions = list(completions or [])
+        self.prompts = []
+
+    def complete(self, prompt: str, max_tokens: int = 500) -> str:
+        self.prompts.append(prompt)
+        return self.completions.pop(0) if self.completions else "[]"
+
+
+class FakeBatchClient(FakeClient):
+    """Fake client completing prompts in batches, recording the size of each batch."""
+
+    def __init__(self, completions: List[str] = None):
+        super().__init__(completions)
+        self.batch_sizes = []
+
+    def complete_batch(self, prompts: List[str], max_tokens: int = 500) -> List[str]:
+        self.batch_sizes.append(len(prompts))
+        return [self.complete(prompt, max_tokens) for prompt in prompts]
+
+
+class OfflinePhenoEngine(PhenoEngine):
+    """Pheno engine that does not set up OntoGPT, so that a fake client can be used."""
+
+    def __post_init__(self):
+        pass
+
+
+class FakePhenoEngine:
+    """Pheno engine whose prompt is the phenopacket's prompt and whose results are fixed."""
+
+    completion_length = 100
+    batch_size = 1
+    phenotypic_feature_compressor = None
+    max_continuations = 0
+
+    def __init__(self, model: str = "gpt-4", results: Dict[str, list] = None):
+        self.model = model
+        self.results = results or {}
+        self.client = FakeClient()
+        self.continuation_statistics = ContinuationStatistics()
+
+    @staticmethod
+    def render_prompt(phenopacket, template_path=None, constrained_list=None) -> str:
+        return phenopacket.prompt
+
+    def record_sent_prompts(self, phenopacket, prompts: int = 1) -> None:
+        pass
+
+    def predict(self, phenopacket, template_path=None, constrained_list=None):
+        self.client.complete(self.render_prompt(phenopacket), max_tokens=self.completion_length)
+        return self.results.get(phenopacket.id, [])
+
+
+def fake_phenopacket(case_id: str, prompt: str = None) -> SimpleNamespace:
+    """Return a phenopacket stand-in, prompted with its id unless a prompt is given."""
+    return SimpleNamespace(id=case_id, prompt=case_id if prompt is None else prompt)
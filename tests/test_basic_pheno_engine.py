@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from pheval_ontogpt.prepare.compress_phenotypic_features import PhenotypicFeatureCompressor
+from tests.fakes import FakeBatchClient, FakeClient, OfflinePhenoEngine
+
+
+def phenopacket(*labels: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        phenotypic_features=[
+            SimpleNamespace(type=SimpleNamespace(id=label, label=label), excluded=False)
+            for label in labels
+        ]
+    )
+
+
+class TestPredictBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.template_path = Path(self.temporary_dir.name).joinpath("prompt.jinja2")
+        self.template_path.write_text("Patient: {{ hpo_terms | join(', ') }}")
+        self.phenopackets = [phenopacket("Macrocephaly"), phenopacket("Seizures", "Ataxia")]
+        self.pheno_engine = OfflinePhenoEngine(max_continuations=0)
+        self.completions = ['[{"rank": 1}]', '[{"rank": 2}]']
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_single_batch(self):
+        self.pheno_engine.client = FakeBatchClient(self.completions)
+        results = self.pheno_engine.predict_batch(self.phenopackets, self.template_path)
+        self.assertEqual(results, [[{"rank": 1}], [{"rank": 2}]])
+        self.assertEqual(self.pheno_engine.client.batch_sizes, [2])
+        self.assertEqual(
+            self.pheno_engine.client.prompts,
+            ["Patient: Macrocephaly", "Patient: Seizures, Ataxia"],
+        )
+
+    def test_compression_recorded_per_sent_prompt(self):
+        self.pheno_engine.phenotypic_feature_compressor = PhenotypicFeatureCompressor({})
+        self.pheno_engine.client = FakeBatchClient(self.completions)
+        self.pheno_engine.render_prompt(self.phenopackets[0], self.template_path)
+        self.assertEqual(self.pheno_engine.phenotypic_feature_compressor.statistics.prompts, 0)
+        self.pheno_engine.predict_batch(self.phenopackets, self.template_path)
+        self.assertEqual(self.pheno_engine.phenotypic_feature_compressor.statistics.prompts, 2)
+
+    def test_one_at_a_time(self):
+        self.pheno_engine.client = FakeClient(self.completions)
+        results = self.pheno_engine.predict_batch(self.phenopackets, self.template_path)
+        self.assertEqual(results, [[{"rank": 1}], [{"rank": 2}]])
+        self.assertEqual(len(self.pheno_engine.client.prompts), 2)
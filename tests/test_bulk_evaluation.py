@@ -0,0 +1,113 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from pheval_ontogpt.run.bulk_evaluation import (
+    _map_chunks,
+    _prediction_records,
+    compute_ranks,
+    summarise_ranks,
+)
+
+truth = pd.DataFrame(
+    [
+        ("patient_1", "OMIM:231670"),
+        ("patient_2", "OMIM:209900"),
+        ("patient_2", "OMIM:615981"),
+        ("patient_3", "OMIM:600001"),
+    ],
+    columns=["case_id", "identifier"],
+)
+predictions = pd.DataFrame(
+    [
+        ("patient_1", 1, "OMIM:231670"),
+        ("patient_1", 2, "OMIM:231680"),
+        ("patient_2", 1, "OMIM:100000"),
+        ("patient_2", 2, "OMIM:100001"),
+        ("patient_2", 3, "OMIM:615981"),
+        ("patient_2", 4, "OMIM:209900"),
+        ("patient_3", 1, "OMIM:100000"),
+    ],
+    columns=["case_id", "rank", "identifier"],
+)
+
+
+class TestBulkEvaluation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.ranks = compute_ranks(truth, predictions)
+
+    def test_compute_ranks(self):
+        self.assertEqual(self.ranks["case_id"].tolist(), ["patient_1", "patient_2", "patient_3"])
+        self.assertEqual(self.ranks["rank"].tolist()[:2], [1, 3])
+        self.assertTrue(pd.isna(self.ranks["rank"].tolist()[2]))
+
+    def test_summarise_ranks(self):
+        summary = dict(summarise_ranks(self.ranks, top_k=(1, 3)).values.tolist())
+        self.assertEqual(summary["cases"], 3)
+        self.assertAlmostEqual(summary["top_1"], 1 / 3)
+        self.assertAlmostEqual(summary["top_3"], 2 / 3)
+        self.assertAlmostEqual(summary["mrr"], (1 + 1 / 3) / 3)
+
+
+class TestPredictionRecords(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        raw_results_dir = Path(self.temporary_dir.name)
+        self.ontogpt_result_paths = []
+        for case_id, omim_disease_id in [("patient_1", "OMIM:231670"), ("patient_2", 209900)]:
+            ontogpt_result_path = raw_results_dir.joinpath(f"{case_id}-ontogpt_result.json")
+            ontogpt_result_path.write_text(
+                json.dumps(
+                    [
+                        {
+                            "disease_name": "Disease",
+                            "omim_disease_id": omim_disease_id,
+                            "score": 0.9,
+                        },
+                        {"disease_name": "Other", "omim_disease_id": "OMIM:100000", "score": 0.5},
+                    ]
+                )
+            )
+            self.ontogpt_result_paths.append(ontogpt_result_path)
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_malformed_entry_does_not_abort_evaluation(self):
+        records = _map_chunks(_prediction_records, self.ontogpt_result_paths, False, processes=2)
+        self.assertEqual(
+            sorted(records),
+            [
+                ("patient_1", 1, "OMIM:231670"),
+                ("patient_1", 2, "OMIM:100000"),
+                ("patient_2", 1, "OMIM:100000"),
+            ],
+        )
+
+    def test_ranked_by_score_with_ties(self):
+        ontogpt_result_path = Path(self.temporary_dir.name).joinpath(
+            "patient_3-ontogpt_result.json"
+        )
+        ontogpt_result_path.write_text(
+            json.dumps(
+                [
+                    {"disease_name": "Low", "omim_disease_id": "OMIM:100001", "score": 0.2},
+                    {"disease_name": "Tied", "omim_disease_id": "OMIM:100002", "score": 0.8},
+                    {"disease_name": "Tied", "omim_disease_id": "OMIM:100003", "score": 0.8},
+                    {"disease_name": "High", "omim_disease_id": "OMIM:100004", "score": 0.9},
+                ]
+            )
+        )
+        self.assertEqual(
+            _prediction_records([ontogpt_result_path], False),
+            [
+                ("patient_3", 1, "OMIM:100004"),
+                ("patient_3", 2, "OMIM:100002"),
+                ("patient_3", 2, "OMIM:100003"),
+                ("patient_3", 4, "OMIM:100001"),
+            ],
+        )
@@ -0,0 +1,95 @@
+import unittest
+
+from pheval_ontogpt.run.cascade import ModelCascade
+from pheval_ontogpt.run.map_reduce import MapReduceQuery, fuse_results
+from pheval_ontogpt.run.run_statistics import RunStatistics
+from tests.fakes import FakePhenoEngine, fake_phenopacket
+
+
+def disease_result(score: float):
+    return [{"disease_name": "Glutaric aciduria", "omim_disease_id": "OMIM:231670", "score": score}]
+
+
+class TestModelCascade(unittest.TestCase):
+    def setUp(self) -> None:
+        self.phenopackets = [fake_phenopacket(case_id) for case_id in ["easy", "hard", "bad"]]
+        self.fast_engine = FakePhenoEngine(
+            "gpt-3.5-turbo",
+            {"easy": disease_result(0.9), "hard": disease_result(0.2), "bad": [{"score": 0.9}]},
+        )
+        self.strong_engine = FakePhenoEngine(
+            "gpt-4", {case_id: disease_result(0.8) for case_id in ["easy", "hard", "bad"]}
+        )
+        self.model_cascade = ModelCascade("gpt-3.5-turbo", escalation_score_threshold=0.5)
+        self.model_cascade._fast_engine = self.fast_engine
+
+    def predict(self):
+        with self.model_cascade.attached(self.strong_engine):
+            return [
+                self.model_cascade.predict(
+                    self.strong_engine, phenopacket, lambda engine, case: engine.predict(case)
+                )
+                for phenopacket in self.phenopackets
+            ]
+
+    def test_escalation_reason(self):
+        phenopacket = fake_phenopacket("case")
+        self.assertIsNone(self.model_cascade.escalation_reason(phenopacket, disease_result(0.9)))
+        self.assertEqual(
+            self.model_cascade.escalation_reason(phenopacket, disease_result(0.2)), "low_score"
+        )
+        self.assertEqual(self.model_cascade.escalation_reason(phenopacket, []), "invalid_result")
+
+    def test_map_reduce_result_not_escalated(self):
+        chunk_rankings = [
+            [
+                {
+                    "disease_name": "Glutaric aciduria",
+                    "omim_disease_id": "OMIM:231670",
+                    "score": 0.95,
+                }
+            ],
+            [
+                {
+                    "disease_name": "Bardet-Biedl syndrome",
+                    "omim_disease_id": "OMIM:209900",
+                    "score": 0.9,
+                }
+            ],
+        ]
+        self.assertIsNone(
+            self.model_cascade.escalation_reason(
+                fake_phenopacket("case"),
+                fuse_results(chunk_rankings, MapReduceQuery().score_fusion),
+            )
+        )
+
+    def test_check_map_reduce_query(self):
+        self.model_cascade.check_map_reduce_query(None)
+        self.model_cascade.check_map_reduce_query(MapReduceQuery(score_fusion="max"))
+        self.model_cascade.check_map_reduce_query(
+            MapReduceQuery(score_fusion="reciprocal_rank", rerank_top_n=10)
+        )
+        with self.assertRaises(ValueError):
+            self.model_cascade.check_map_reduce_query(
+                MapReduceQuery(score_fusion="reciprocal_rank")
+            )
+
+    def test_escalated_cases_use_strong_model(self):
+        self.assertEqual(
+            self.predict(), [disease_result(0.9), disease_result(0.8), disease_result(0.8)]
+        )
+        self.assertEqual(self.strong_engine.client.prompts, ["hard", "bad"])
+        self.assertEqual(self.fast_engine.client.prompts, ["easy", "hard", "bad"])
+        self.assertFalse(self.fast_engine.repair_fallback)
+
+    def test_statistics(self):
+        self.predict()
+        run_statistics = RunStatistics()
+        self.model_cascade.add_statistics(run_statistics)
+        self.assertAlmostEqual(run_statistics.escalation_rate, 2 / 3)
+        self.assertEqual(run_statistics.escalation_reasons, {"low_score": 1, "invalid_result": 1})
+        fast_tier, strong_tier = run_statistics.cascade_tiers
+        self.assertEqual((fast_tier.model, fast_tier.cases), ("gpt-3.5-turbo", 3))
+        self.assertEqual((strong_tier.model, strong_tier.cases), ("gpt-4", 2))
+        self.assertGreater(strong_tier.cost, 0)
@@ -0,0 +1,53 @@
+import unittest
+
+from phenopackets import OntologyClass, PhenotypicFeature
+
+from pheval_ontogpt.prepare.compress_phenotypic_features import PhenotypicFeatureCompressor
+
+ancestor_closure = {
+    "HP:0000478": frozenset({"HP:0000118", "HP:0000001"}),
+    "HP:0000505": frozenset({"HP:0000478", "HP:0000118", "HP:0000001"}),
+    "HP:0000256": frozenset({"HP:0000118", "HP:0000001"}),
+}
+phenotypic_features = [
+    PhenotypicFeature(type=OntologyClass(id="HP:0000478", label="Abnormality of the eye")),
+    PhenotypicFeature(type=OntologyClass(id="HP:0000505", label="Visual impairment")),
+    PhenotypicFeature(type=OntologyClass(id="HP:0000256", label="Macrocephaly")),
+    PhenotypicFeature(type=OntologyClass(id="HP:0000256", label="Macrocephaly")),
+    PhenotypicFeature(type=OntologyClass(id="HP:0002059", label="Cerebral atrophy"), excluded=True),
+]
+
+
+class TestPhenotypicFeatureCompressor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.compressor = PhenotypicFeatureCompressor(ancestor_closure)
+
+    def test_compress(self):
+        self.assertEqual(
+            self.compressor.compress(phenotypic_features), ["Visual impairment", "Macrocephaly"]
+        )
+
+    def test_statistics(self):
+        self.compressor.compress(phenotypic_features)
+        self.assertEqual(self.compressor.statistics.prompts, 0)
+        self.compressor.record(phenotypic_features, prompts=3)
+        self.assertEqual(self.compressor.statistics.prompts, 3)
+        self.assertGreater(self.compressor.statistics.average_tokens_saved, 0)
+        self.assertEqual(
+            self.compressor.statistics.tokens_saved,
+            3 * self.compressor.statistics.average_tokens_saved,
+        )
+
+    def test_build_ancestor_closure(self):
+        class HpoAdapter:
+            @staticmethod
+            def relationships(predicates):
+                return [
+                    ("HP:0000505", "rdfs:subClassOf", "HP:0000478"),
+                    ("HP:0000478", "rdfs:subClassOf", "HP:0000118"),
+                    ("HP:0000118", "rdfs:subClassOf", "HP:0000001"),
+                ]
+
+        closure = PhenotypicFeatureCompressor.build_ancestor_closure(HpoAdapter())
+        self.assertEqual(closure["HP:0000505"], {"HP:0000478", "HP:0000118", "HP:0000001"})
+        self.assertEqual(closure["HP:0000001"], frozenset())
@@ -0,0 +1,136 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from pheval_ontogpt.run.continuation import (
+    ContinuationStatistics,
+    continuation_prompt,
+    is_truncated,
+    stitch,
+)
+from tests.fakes import FakeClient, OfflinePhenoEngine
+
+TRUNCATED = '[{"disease_name": "Glutaric aciduria", "score": 0.9}, {"disease_name": "Bardet'
+CONTINUATION = '-Biedl syndrome", "score": 0.5}]'
+
+
+class TestIsTruncated(unittest.TestCase):
+    def test_complete_list(self):
+        self.assertFalse(is_truncated('[{"disease_name": "Glutaric aciduria", "score": 0.9}]'))
+
+    def test_complete_list_with_trailing_text(self):
+        self.assertFalse(is_truncated('Here is the ranking: [{"rank": 1}]\nHope this helps.'))
+
+    def test_cut_off_list(self):
+        self.assertTrue(is_truncated('[{"disease_name": "Glutaric aciduria", "score": 0.9}, {"dis'))
+
+    def test_cut_off_inside_string_with_bracket(self):
+        self.assertTrue(is_truncated('[{"disease_name": "Syndrome ]'))
+
+    def test_escaped_quote(self):
+        self.assertFalse(is_truncated('[{"disease_name": "A \\"quoted\\" name"}]'))
+
+    def test_no_json(self):
+        self.assertFalse(is_truncated("I cannot rank these diseases."))
+
+
+class TestStitch(unittest.TestCase):
+    def test_plain_continuation(self):
+        self.assertEqual(
+            stitch('[{"disease_name": "Glutaric', ' aciduria"}]'),
+            '[{"disease_name": "Glutaric aciduria"}]',
+        )
+
+    def test_overlap_removed(self):
+        self.assertEqual(
+            stitch('[{"disease_name": "Glutaric aciduria", "sco', 'aciduria", "score": 0.9}]'),
+            '[{"disease_name": "Glutaric aciduria", "score": 0.9}]',
+        )
+
+    def test_code_fence_removed(self):
+        self.assertEqual(
+            stitch('[{"rank": 1}, {"ra', '```json\nnk": 2}]\n```'), '[{"rank": 1}, {"rank": 2}]\n'
+        )
+
+    def test_restarted_response_replaces_partial(self):
+        partial = '[{"disease_name": "Glutaric aciduria type 1", "score": 0.9}, {"dis'
+        restarted = '[{"disease_name": "Glutaric aciduria type 1", "score": 0.9}]'
+        self.assertEqual(stitch(partial, restarted), restarted)
+
+
+class TestContinuationStatistics(unittest.TestCase):
+    def test_record(self):
+        statistics = ContinuationStatistics()
+        statistics.record(2, salvaged=True)
+        statistics.record(1, salvaged=False)
+        self.assertEqual(
+            (statistics.truncated, statistics.salvaged, statistics.requests), (2, 1, 3)
+        )
+
+
+class ResumingClient(FakeClient):
+    """Fake client that resumes generation from the partial output."""
+
+    def __init__(self, completions=None):
+        super().__init__(completions)
+        self.continued = []
+
+    def continue_completion(self, prompt: str, partial: str, max_tokens: int = 500) -> str:
+        self.continued.append((prompt, partial))
+        return self.complete(prompt + partial, max_tokens=max_tokens)
+
+
+class TestContinuePayload(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.template_path = Path(self.temporary_dir.name).joinpath("prompt.jinja2")
+        self.template_path.write_text("Patient: {{ hpo_terms | join(', ') }}")
+        self.phenopacket = SimpleNamespace(
+            id="patient_1",
+            phenotypic_features=[SimpleNamespace(type=SimpleNamespace(label="Macrocephaly"))],
+        )
+        self.prompt = "Patient: Macrocephaly"
+        self.pheno_engine = OfflinePhenoEngine(max_continuations=2)
+        self.pheno_engine.model = "gpt-4"
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def predict(self, client: FakeClient):
+        self.pheno_engine.client = client
+        return self.pheno_engine.predict(self.phenopacket, self.template_path)
+
+    def test_resumed_by_client(self):
+        client = ResumingClient([TRUNCATED, CONTINUATION])
+        result = self.predict(client)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[1]["disease_name"], "Bardet-Biedl syndrome")
+        self.assertEqual(client.continued, [(self.prompt, TRUNCATED)])
+        statistics = self.pheno_engine.continuation_statistics
+        self.assertEqual(
+            (statistics.truncated, statistics.salvaged, statistics.requests), (1, 1, 1)
+        )
+
+    def test_continuation_prompt_fallback(self):
+        client = FakeClient([TRUNCATED, CONTINUATION])
+        result = self.predict(client)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(client.prompts, [self.prompt, continuation_prompt(self.prompt, TRUNCATED)])
+
+    def test_stops_at_max_continuations(self):
+        client = FakeClient([TRUNCATED, " and", " Alstrom", CONTINUATION])
+        with self.assertLogs("pheval_ontogpt.run.basic_pheno_engine", level="ERROR"):
+            self.assertEqual(self.predict(client), [])
+        self.assertEqual(len(client.prompts), 3)
+        self.assertEqual(client.completions, [CONTINUATION])
+        statistics = self.pheno_engine.continuation_statistics
+        self.assertEqual(
+            (statistics.truncated, statistics.salvaged, statistics.requests), (1, 0, 2)
+        )
+
+    def test_not_truncated(self):
+        client = FakeClient(['[{"disease_name": "Glutaric aciduria", "score": 0.9}]'])
+        self.assertEqual(len(self.predict(client)), 1)
+        self.assertEqual(len(client.prompts), 1)
+        self.assertEqual(self.pheno_engine.continuation_statistics.truncated, 0)
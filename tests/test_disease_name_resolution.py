@@ -0,0 +1,116 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval.post_processing.post_processing import PhEvalDiseaseResult
+
+from pheval_ontogpt.post_process.disease_name_resolution import (
+    DiseaseNameIndex,
+    normalise_disease_identifier,
+    resolve_disease_identifiers,
+)
+
+disease_names = [
+    ("MONDO:0009281", "glutaric acidemia type 1"),
+    ("OMIM:231670", "glutaric acidemia type 1"),
+    ("OMIM:231670", "glutaric aciduria type I"),
+    ("MONDO:0008763", "Bardet-Biedl syndrome 1"),
+    ("OMIM:209900", "Bardet-Biedl syndrome 1"),
+    ("OMIM:615981", "Bardet-Biedl syndrome 2"),
+]
+
+
+class TestNormaliseDiseaseIdentifier(unittest.TestCase):
+    def test_bare_omim_identifier(self):
+        self.assertEqual(normalise_disease_identifier("231670"), "OMIM:231670")
+
+    def test_prefixed_identifier(self):
+        self.assertEqual(normalise_disease_identifier("omim: 231670"), "OMIM:231670")
+
+
+class TestDiseaseNameIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.disease_name_index = DiseaseNameIndex(disease_names)
+
+    def test_best_match_exact(self):
+        self.assertEqual(
+            self.disease_name_index.best_match("Bardet-Biedl Syndrome 1", "OMIM"),
+            ("OMIM:209900", 1.0),
+        )
+
+    def test_best_match_fuzzy(self):
+        disease_identifier, similarity = self.disease_name_index.best_match(
+            "Glutaric aciduria, type 1", "OMIM"
+        )
+        self.assertEqual(disease_identifier, "OMIM:231670")
+        self.assertGreater(similarity, 0.85)
+
+    def test_identifier_agreement_unknown(self):
+        self.assertEqual(
+            self.disease_name_index.identifier_agreement("Bardet-Biedl syndrome 1", "OMIM:1"), 0.0
+        )
+
+    def test_resolve_disease_identifiers(self):
+        self.assertEqual(
+            resolve_disease_identifiers(
+                [
+                    PhEvalDiseaseResult(
+                        disease_name="Bardet-Biedl syndrome 1",
+                        disease_identifier="OMIM:231670",
+                        score=0.9,
+                    ),
+                    PhEvalDiseaseResult(
+                        disease_name="Glutaric aciduria type I",
+                        disease_identifier="231670",
+                        score=0.8,
+                    ),
+                    PhEvalDiseaseResult(
+                        disease_name="Unknown syndrome", disease_identifier="OMIM:1", score=0.1
+                    ),
+                ],
+                self.disease_name_index,
+            ),
+            [
+                PhEvalDiseaseResult(
+                    disease_name="Bardet-Biedl syndrome 1",
+                    disease_identifier="OMIM:209900",
+                    score=0.9,
+                ),
+                PhEvalDiseaseResult(
+                    disease_name="Glutaric aciduria type I",
+                    disease_identifier="231670",
+                    score=0.8,
+                ),
+                PhEvalDiseaseResult(
+                    disease_name="Unknown syndrome", disease_identifier="OMIM:1", score=0.1
+                ),
+            ],
+        )
+
+    def test_write_read(self):
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            index_path = Path(temporary_dir).joinpath("disease_name_index.json")
+            self.disease_name_index.write(index_path)
+            self.assertIn("postings", json.loads(index_path.read_text()))
+            disease_name_index = DiseaseNameIndex.read(index_path)
+        self.assertEqual(disease_name_index.fingerprint, self.disease_name_index.fingerprint)
+        self.assertEqual(disease_name_index._postings, self.disease_name_index._postings)
+        self.assertEqual(
+            disease_name_index.best_match("Glutaric aciduria, type 1", "OMIM"),
+            self.disease_name_index.best_match("Glutaric aciduria, type 1", "OMIM"),
+        )
+        self.assertGreater(
+            disease_name_index.identifier_agreement("Bardet-Biedl syndrome 1", "OMIM:209900"), 0.99
+        )
+
+    def test_read_disease_names(self):
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            index_path = Path(temporary_dir).joinpath("disease_name_index.json")
+            index_path.write_text(json.dumps(disease_names))
+            disease_name_index = DiseaseNameIndex.read(index_path)
+        self.assertEqual(disease_name_index.fingerprint, self.disease_name_index.fingerprint)
+        self.assertEqual(
+            disease_name_index.best_match("Bardet-Biedl Syndrome 1", "OMIM"), ("OMIM:209900", 1.0)
+        )
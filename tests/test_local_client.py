@@ -0,0 +1,123 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import torch
+
+from pheval_ontogpt.run.local_client import LocalCompletionClient, split_revision
+
+OPENING = "Rank the diseases.\n"
+
+
+def prompt(hpo_terms: str) -> str:
+    return f"{OPENING}{hpo_terms}\nAnswer:"
+
+
+class FakeTokenizer:
+    """Character tokenizer with a beginning of sequence token and a padding token."""
+
+    bos_token_id = 0
+    pad_token_id = 1
+    eos_token = "</s>"  # noqa: S105
+
+    def __call__(self, text: str, add_special_tokens: bool = False) -> dict:
+        return {"input_ids": [ord(character) for character in text]}
+
+    @staticmethod
+    def batch_decode(output, skip_special_tokens: bool = True):
+        return ["".join(chr(token) for token in row) for row in output.tolist()]
+
+
+class FakeCache:
+    def __init__(self, length: int):
+        self.length = length
+        self.batch_size = 1
+
+    def batch_repeat_interleave(self, repeats: int) -> None:
+        self.batch_size *= repeats
+
+
+class FakeLanguageModel:
+    """Causal language model answering every prompt with an empty list."""
+
+    def __init__(self):
+        self.encoded = []
+        self.generate_calls = []
+
+    def to(self, device: str):
+        return self
+
+    def eval(self) -> None:
+        pass
+
+    def __call__(self, input_ids, use_cache: bool = True):
+        self.encoded.append(input_ids.shape[1])
+        return SimpleNamespace(past_key_values=FakeCache(input_ids.shape[1]))
+
+    def generate(self, input_ids, attention_mask, max_new_tokens, **kwargs):
+        self.generate_calls.append(dict(attention_mask=attention_mask.tolist(), **kwargs))
+        answer = torch.tensor([[ord("["), ord("]")]] * input_ids.shape[0])
+        return torch.cat([input_ids, answer], dim=1)
+
+
+class TestSplitRevision(unittest.TestCase):
+    def test_pinned(self):
+        self.assertEqual(split_revision("org/model@0a1b2c3"), ("org/model", "0a1b2c3"))
+
+    def test_unpinned(self):
+        self.assertEqual(split_revision("org/model"), ("org/model", "main"))
+
+
+class TestLocalCompletionClient(unittest.TestCase):
+    def setUp(self) -> None:
+        self.language_model = FakeLanguageModel()
+        with (
+            mock.patch(
+                "transformers.AutoTokenizer.from_pretrained", return_value=FakeTokenizer()
+            ) as tokenizer,
+            mock.patch(
+                "transformers.AutoModelForCausalLM.from_pretrained",
+                return_value=self.language_model,
+            ) as language_model,
+        ):
+            self.client = LocalCompletionClient("org/model@0a1b2c3", batch_size=2)
+        self.loaded = [tokenizer.call_args, language_model.call_args]
+
+    def test_revision_pinned(self):
+        for call in self.loaded:
+            self.assertEqual(call, mock.call("org/model", revision="0a1b2c3"))
+
+    def test_single_prompts_cache_shared_opening_only(self):
+        self.assertEqual(self.client.complete(prompt("Macrocephaly")), "[]")
+        self.assertNotIn("past_key_values", self.language_model.generate_calls[0])
+        self.assertEqual(self.client.complete(prompt("Seizures")), "[]")
+        self.assertEqual(list(self.client._prefix_caches), [OPENING])
+        self.assertEqual(self.language_model.encoded, [1 + len(OPENING)])
+
+    def test_batch_reuses_prefix(self):
+        completions = self.client.complete_batch(
+            [prompt("Macrocephaly"), prompt("Seizures"), prompt("Ataxia")]
+        )
+        self.assertEqual(completions, ["[]", "[]", "[]"])
+        self.assertEqual(self.language_model.encoded, [1 + len(OPENING)])
+        first_batch, second_batch = self.language_model.generate_calls
+        self.assertEqual(first_batch["past_key_values"].batch_size, 2)
+        # the shorter suffix is padded after the prefix and masked out of attention
+        padding = len("Macrocephaly") - len("Seizures")
+        self.assertEqual(
+            first_batch["attention_mask"][1][1 + len(OPENING) : 1 + len(OPENING) + padding],
+            [0] * padding,
+        )
+        self.assertEqual(second_batch["past_key_values"].batch_size, 1)
+
+    def test_prefix_caches_evicted(self):
+        self.client.max_prefix_caches = 2
+        for opening in ["First\n", "Second\n", "Third\n"]:
+            self.client.complete(f"{opening}Macrocephaly")
+            self.client.complete(f"{opening}Seizures")
+        self.assertEqual(list(self.client._prefix_caches), ["Second\n", "Third\n"])
+
+    def test_continuation_reuses_prompt(self):
+        self.client.complete(prompt("Macrocephaly"))
+        self.client.continue_completion(prompt("Macrocephaly"), '[{"rank": 1}, ')
+        self.assertEqual(list(self.client._prefix_caches), [f"{OPENING}Macrocephaly\n"])
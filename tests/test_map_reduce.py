@@ -0,0 +1,158 @@
+import unittest
+from types import SimpleNamespace
+
+from pheval_ontogpt.run.map_reduce import (
+    DEFAULT_CONTEXT_WINDOW,
+    MapReduceQuery,
+    chunk_items,
+    context_window,
+    fuse_rankings,
+    fuse_results,
+    split_constrained_list,
+)
+
+first_chunk_ranking = [
+    {"gene_symbol": "GCDH", "score": 0.9},
+    {"gene_symbol": "ETFA", "score": 0.4},
+]
+second_chunk_ranking = [
+    {"gene_symbol": "BBS1", "score": 0.8},
+    {"gene_symbol": "gcdh", "score": 0.6},
+    "not an entry",
+]
+
+
+class TestContextWindow(unittest.TestCase):
+    def test_context_window(self):
+        self.assertEqual(context_window("gpt-4"), 8192)
+
+    def test_context_window_dated_version(self):
+        self.assertEqual(context_window("gpt-4-32k-0613"), 32768)
+
+    def test_context_window_unknown_model(self):
+        self.assertEqual(context_window("llama"), DEFAULT_CONTEXT_WINDOW)
+
+
+class TestChunking(unittest.TestCase):
+    def test_split_constrained_list(self):
+        self.assertEqual(
+            split_constrained_list(["GCDH, BBS1,\n", "ETFA"]), ["GCDH", "BBS1", "ETFA"]
+        )
+
+    def test_chunk_items(self):
+        self.assertEqual(
+            chunk_items(["A", "B", "C", "D"], [3, 3, 5, 1], 6), [["A", "B"], ["C", "D"]]
+        )
+
+    def test_chunk_items_oversized_item(self):
+        self.assertEqual(chunk_items(["A", "B"], [10, 1], 6), [["A"], ["B"]])
+
+
+disjoint_chunk_rankings = [
+    [
+        {"gene_symbol": f"GENE{chunk}{position}", "score": 0.9 - chunk / 10 - position / 100}
+        for position in range(3)
+    ]
+    for chunk in range(5)
+]
+
+
+class TestFuseRankings(unittest.TestCase):
+    def test_reciprocal_rank(self):
+        fused = fuse_rankings([first_chunk_ranking, second_chunk_ranking], "reciprocal_rank")
+        self.assertEqual([entry["gene_symbol"] for entry in fused], ["GCDH", "BBS1", "ETFA"])
+        self.assertEqual([entry["score"] for entry in fused], [1 / 61, 1 / 62, 1 / 63])
+
+    def test_reciprocal_rank_ties_broken_by_score(self):
+        fused = fuse_rankings(disjoint_chunk_rankings, "reciprocal_rank")
+        self.assertEqual(
+            [entry["gene_symbol"] for entry in fused[:6]],
+            ["GENE00", "GENE10", "GENE20", "GENE30", "GENE40", "GENE01"],
+        )
+
+    def test_fused_scores_unique_across_disjoint_chunks(self):
+        for method in ("max", "reciprocal_rank", "sum"):
+            scores = [entry["score"] for entry in fuse_rankings(disjoint_chunk_rankings, method)]
+            self.assertEqual(len(scores), 15)
+            self.assertEqual(len(set(scores)), len(scores), method)
+            self.assertEqual(scores, sorted(scores, reverse=True), method)
+
+    def test_max(self):
+        fused = fuse_rankings([first_chunk_ranking, second_chunk_ranking])
+        self.assertEqual(
+            [(entry["gene_symbol"], entry["score"]) for entry in fused],
+            [("GCDH", 0.9), ("BBS1", 0.8), ("ETFA", 0.4)],
+        )
+
+    def test_sum(self):
+        fused = fuse_rankings([first_chunk_ranking, second_chunk_ranking], "sum")
+        self.assertAlmostEqual(fused[0]["score"], 1.5)
+
+    def test_unparsable_ranking_is_skipped(self):
+        self.assertEqual(len(fuse_rankings([first_chunk_ranking, {}])), 2)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            fuse_rankings([first_chunk_ranking], "mean")
+
+
+class TestFuseResults(unittest.TestCase):
+    def test_rankings(self):
+        self.assertEqual(
+            fuse_results([first_chunk_ranking, second_chunk_ranking]),
+            fuse_rankings([first_chunk_ranking, second_chunk_ranking]),
+        )
+
+    def test_joint_results_fused_by_section(self):
+        fused = fuse_results(
+            [
+                {"gene_rankings": first_chunk_ranking, "disease_rankings": []},
+                {
+                    "gene_rankings": second_chunk_ranking,
+                    "disease_rankings": [
+                        {
+                            "disease_name": "Bardet-Biedl syndrome",
+                            "omim_disease_id": "OMIM:209900",
+                            "score": 0.7,
+                        }
+                    ],
+                },
+            ]
+        )
+        self.assertEqual(
+            [entry["gene_symbol"] for entry in fused["gene_rankings"]], ["GCDH", "BBS1", "ETFA"]
+        )
+        self.assertEqual(
+            [entry["omim_disease_id"] for entry in fused["disease_rankings"]], ["OMIM:209900"]
+        )
+
+
+class TestMapReduceQuery(unittest.TestCase):
+    def test_prompt_without_room_for_constrained_list(self):
+        pheno_engine = SimpleNamespace(
+            model="gpt-4",
+            completion_length=100,
+            client=None,
+            render_prompt=lambda phenopacket, template_path, constrained_list: "word " * 1000,
+        )
+        with self.assertLogs("pheval_ontogpt.run.map_reduce", level="ERROR"):
+            result = MapReduceQuery(context_window=500).predict(
+                pheno_engine, SimpleNamespace(id="patient_1"), None, ["GCDH, BBS1"]
+            )
+        self.assertEqual(result, [])
+
+    def test_request_prompts(self):
+        pheno_engine = SimpleNamespace(
+            model="gpt-4",
+            completion_length=100,
+            render_prompt=lambda phenopacket, template_path, constrained_list: (
+                f"Rank: {constrained_list[0]}"
+            ),
+        )
+        items = [f"disease_{i}" for i in range(100)]
+        query = MapReduceQuery(context_window=200, rerank_top_n=2)
+        prompts = query.request_prompts(pheno_engine, SimpleNamespace(id="patient_1"), None, items)
+        chunks = query.chunk(pheno_engine, SimpleNamespace(id="patient_1"), None, items)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(len(prompts), len(chunks) + 1)
+        self.assertEqual(prompts[-1].count(","), 1)
@@ -0,0 +1,179 @@
+import json
+import unittest
+from pathlib import Path
+
+from pheval_ontogpt.post_process.ontogpt_result_decoder import (
+    MalformedEntry,
+    OntoGPTResultEntry,
+    decode_ontogpt_json,
+)
+
+ontogpt_result_path = Path("/path/to/patient_1-ontogpt_result.json")
+ontogpt_results = [
+    {
+        "disease_name": "Glutaric Aciduria Type I",
+        "omim_disease_id": "OMIM:231670",
+        "gene_symbol": "GCDH",
+        "score": 0.8,
+        "disease_ids": ["MONDO:0009281"],
+    },
+    {"gene_symbol": "ETFA", "score": "0.6"},
+    {"disease_name": "Glutaryl-CoA dehydrogenase deficiency", "score": 0.5},
+    {"gene_symbol": "ETFB"},
+]
+joint_ontogpt_result = {
+    "gene_rankings": [
+        {"gene_symbol": "GCDH", "score": 0.9},
+        {"gene_symbol": "ETFA", "score": 0.4},
+    ],
+    "disease_rankings": [
+        {
+            "disease_name": "Glutaric Aciduria Type I",
+            "omim_disease_id": "OMIM:231670",
+            "score": 0.8,
+        },
+        {"disease_name": "Glutaryl-CoA dehydrogenase deficiency", "score": 0.5},
+    ],
+}
+
+
+class TestDecodeOntoGPTJson(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.payload = json.dumps(ontogpt_results)
+
+    def test_decode_gene_results(self):
+        decoded = decode_ontogpt_json(self.payload, ontogpt_result_path, gene_analysis=True)
+        self.assertEqual(
+            decoded.gene_results,
+            [
+                OntoGPTResultEntry(
+                    score=0.8,
+                    gene_symbol="GCDH",
+                    disease_name="Glutaric Aciduria Type I",
+                    omim_disease_id="OMIM:231670",
+                    disease_ids=("MONDO:0009281",),
+                ),
+                OntoGPTResultEntry(score=0.6, gene_symbol="ETFA"),
+            ],
+        )
+        self.assertEqual(decoded.disease_results, [])
+        self.assertEqual(
+            decoded.malformed,
+            [
+                MalformedEntry(ontogpt_result_path, 2, "missing or invalid keys: gene_symbol"),
+                MalformedEntry(ontogpt_result_path, 3, "missing or invalid keys: score"),
+            ],
+        )
+
+    def test_decode_disease_results(self):
+        decoded = decode_ontogpt_json(self.payload, ontogpt_result_path, disease_analysis=True)
+        self.assertEqual(
+            [entry.omim_disease_id for entry in decoded.disease_results], ["OMIM:231670"]
+        )
+        self.assertEqual([malformed.index for malformed in decoded.malformed], [1, 2, 3])
+
+    def test_decode_non_string_fields(self):
+        decoded = decode_ontogpt_json(
+            json.dumps(
+                [
+                    {
+                        "disease_name": "Glutaric Aciduria Type I",
+                        "omim_disease_id": 231670,
+                        "score": 0.9,
+                    },
+                    {"gene_symbol": 123, "score": 0.8},
+                ]
+            ),
+            ontogpt_result_path,
+            gene_analysis=True,
+            disease_analysis=True,
+        )
+        self.assertEqual(decoded.gene_results, [])
+        self.assertEqual(decoded.disease_results, [])
+        self.assertEqual(
+            decoded.malformed,
+            [
+                MalformedEntry(
+                    ontogpt_result_path,
+                    0,
+                    "missing or invalid keys: gene_symbol, omim_disease_id",
+                ),
+                MalformedEntry(
+                    ontogpt_result_path,
+                    1,
+                    "missing or invalid keys: gene_symbol, disease_name, omim_disease_id",
+                ),
+            ],
+        )
+
+    def test_decode_dict_format(self):
+        decoded = decode_ontogpt_json(
+            json.dumps({"gene_symbol": "GCDH", "score": 0.9}),
+            ontogpt_result_path,
+            gene_analysis=True,
+        )
+        self.assertEqual(decoded.gene_results, [OntoGPTResultEntry(score=0.9, gene_symbol="GCDH")])
+
+    def test_decode_invalid_json(self):
+        decoded = decode_ontogpt_json("[{", ontogpt_result_path, gene_analysis=True)
+        self.assertEqual(decoded.gene_results, [])
+        self.assertIsNone(decoded.malformed[0].index)
+
+    def test_decode_empty_result(self):
+        decoded = decode_ontogpt_json("[]", ontogpt_result_path, disease_analysis=True)
+        self.assertEqual(
+            decoded.malformed, [MalformedEntry(ontogpt_result_path, None, "no result entries")]
+        )
+
+    def test_decode_joint_result(self):
+        decoded = decode_ontogpt_json(
+            json.dumps(joint_ontogpt_result),
+            ontogpt_result_path,
+            gene_analysis=True,
+            disease_analysis=True,
+        )
+        self.assertEqual(
+            decoded.gene_results,
+            [
+                OntoGPTResultEntry(score=0.9, gene_symbol="GCDH"),
+                OntoGPTResultEntry(score=0.4, gene_symbol="ETFA"),
+            ],
+        )
+        self.assertEqual(
+            decoded.disease_results,
+            [
+                OntoGPTResultEntry(
+                    score=0.8,
+                    disease_name="Glutaric Aciduria Type I",
+                    omim_disease_id="OMIM:231670",
+                )
+            ],
+        )
+        self.assertEqual(
+            decoded.malformed,
+            [
+                MalformedEntry(
+                    ontogpt_result_path,
+                    1,
+                    "disease_rankings: missing or invalid keys: omim_disease_id",
+                )
+            ],
+        )
+
+    def test_decode_joint_result_missing_section(self):
+        decoded = decode_ontogpt_json(
+            json.dumps({"gene_rankings": joint_ontogpt_result["gene_rankings"]}),
+            ontogpt_result_path,
+            gene_analysis=True,
+            disease_analysis=True,
+        )
+        self.assertEqual(len(decoded.gene_results), 2)
+        self.assertEqual(
+            decoded.malformed,
+            [MalformedEntry(ontogpt_result_path, None, "no disease_rankings entries")],
+        )
+
+    def test_entry_item_access(self):
+        entry = OntoGPTResultEntry(score=0.9, gene_symbol="GCDH")
+        self.assertEqual(entry["gene_symbol"], "GCDH")
@@ -1,8 +1,14 @@
+import tempfile
 import unittest
+from pathlib import Path
 
+from click.testing import CliRunner
 from pheval.post_processing.post_processing import PhEvalDiseaseResult
 
-from pheval_ontogpt.post_process.post_process_results_format import PhEvalDiseaseResultFromOntoGPT
+from pheval_ontogpt.post_process.post_process_results_format import (
+    PhEvalDiseaseResultFromOntoGPT,
+    export_raw_results_command,
+)
 
 ontogpt_result = {
     "disease_name": "Glutaric Aciduria Type I",
@@ -74,3 +80,16 @@ class TestPhEvalDiseaseResultFromOntoGPT(unittest.TestCase):
                 ),
             ],
         )
+
+
+class TestExportRawResultsCommand(unittest.TestCase):
+    def test_missing_store(self):
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            raw_results_dir = Path(temporary_dir)
+            result = CliRunner().invoke(
+                export_raw_results_command,
+                ["-R", str(raw_results_dir), "-o", str(raw_results_dir.joinpath("export"))],
+            )
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("No raw results store found", result.output)
+            self.assertEqual(list(raw_results_dir.iterdir()), [])
@@ -0,0 +1,60 @@
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_ontogpt.run.raw_results_store import RawResultsStore
+
+first_result = [{"gene_symbol": "GCDH", "score": 0.9}]
+retried_result = [{"gene_symbol": "ETFA", "score": 0.8}]
+second_result = [{"gene_symbol": "BBS1", "score": 0.7}]
+
+
+class TestRawResultsStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.store = RawResultsStore(Path(self.temporary_dir.name).joinpath("results.sqlite"))
+        self.store.append("patient_1", first_result)
+        self.store.append("patient_2", second_result)
+        self.store.append("patient_1", retried_result)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.temporary_dir.cleanup()
+
+    def test_case_ids(self):
+        self.assertEqual(list(self.store.case_ids()), ["patient_1", "patient_2"])
+
+    def test_latest(self):
+        self.assertEqual(json.loads(self.store.latest("patient_1")), retried_result)
+        self.assertIsNone(self.store.latest("patient_3"))
+
+    def test_iter_latest(self):
+        self.assertEqual(
+            [(case_id, json.loads(payload)) for case_id, payload in self.store.iter_latest()],
+            [("patient_2", second_result), ("patient_1", retried_result)],
+        )
+
+    def test_export_json(self):
+        export_dir = Path(self.temporary_dir.name)
+        self.assertEqual(self.store.export_json(export_dir), 2)
+        with open(export_dir.joinpath("patient_1-ontogpt_result.json")) as exported:
+            self.assertEqual(json.load(exported), retried_result)
+
+    def test_rollback_journal(self):
+        self.assertEqual(
+            self.store.connection.execute("PRAGMA journal_mode").fetchone(), ("delete",)
+        )
+
+    def test_read_only(self):
+        with RawResultsStore(self.store.store_path, read_only=True) as read_only_store:
+            self.assertEqual(json.loads(read_only_store.latest("patient_1")), retried_result)
+            with self.assertRaises(sqlite3.OperationalError):
+                read_only_store.append("patient_3", first_result)
+
+    def test_read_only_missing_store(self):
+        missing_store_path = Path(self.temporary_dir.name).joinpath("missing.sqlite")
+        with self.assertRaises(sqlite3.OperationalError):
+            RawResultsStore(missing_store_path, read_only=True)
+        self.assertFalse(missing_store_path.exists())
@@ -0,0 +1,56 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from google.protobuf.json_format import MessageToJson
+from phenopackets import MetaData, OntologyClass, Phenopacket, PhenotypicFeature
+
+from pheval_ontogpt.run.run_basic_pheno_engine import run_phenopackets
+from tests.fakes import FakeBatchClient, OfflinePhenoEngine
+
+
+class TestRunPhenopackets(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        directory = Path(self.temporary_dir.name)
+        self.phenopacket_dir = directory.joinpath("phenopackets")
+        self.phenopacket_dir.mkdir()
+        self.raw_results_dir = directory.joinpath("raw_results")
+        self.raw_results_dir.mkdir()
+        for case_id, label in [("patient_1", "Macrocephaly"), ("patient_2", "Seizures")]:
+            self.phenopacket_dir.joinpath(f"{case_id}.json").write_text(
+                MessageToJson(
+                    Phenopacket(
+                        id=case_id,
+                        phenotypic_features=[
+                            PhenotypicFeature(type=OntologyClass(id="HP:0000001", label=label))
+                        ],
+                        meta_data=MetaData(created_by="test"),
+                    )
+                )
+            )
+        self.prompt = directory.joinpath("prompt.jinja2")
+        self.prompt.write_text("Patient: {{ hpo_terms | join(', ') }}")
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_batched(self):
+        pheno_engine = OfflinePhenoEngine()
+        pheno_engine.client = FakeBatchClient(['[{"rank": 1}]', '[{"rank": 2}]'])
+        run_statistics = run_phenopackets(
+            self.phenopacket_dir,
+            self.raw_results_dir,
+            "gpt-4",
+            self.prompt,
+            batch_size=2,
+            pheno_engine=pheno_engine,
+        )
+        self.assertEqual(run_statistics.cases_run, 2)
+        self.assertEqual(pheno_engine.client.batch_sizes, [2])
+        results = {
+            path.name: json.loads(path.read_text()) for path in self.raw_results_dir.iterdir()
+        }
+        self.assertEqual(len(results), 2)
+        self.assertEqual(sorted(results.values(), key=str), [[{"rank": 1}], [{"rank": 2}]])
@@ -0,0 +1,162 @@
+import unittest
+from pathlib import Path
+
+from pheval_ontogpt.run.continuation import continuation_prompt
+from pheval_ontogpt.run.run_statistics import RunStatistics
+from pheval_ontogpt.run.scheduler import (
+    RequestScheduler,
+    TokenPrices,
+    token_prices,
+    worst_case_request_cost,
+)
+from pheval_ontogpt.run.token_count import count_tokens
+from tests.fakes import FakePhenoEngine, fake_phenopacket
+
+phenopackets = [
+    (Path("/path/to/small.json"), fake_phenopacket("small", "a " * 100)),
+    (Path("/path/to/large.json"), fake_phenopacket("large", "a " * 1000)),
+    (Path("/path/to/medium.json"), fake_phenopacket("medium", "a " * 500)),
+]
+
+
+class TestTokenPrices(unittest.TestCase):
+    def test_known_model(self):
+        self.assertEqual(token_prices("gpt-4-0613"), TokenPrices(0.03, 0.06))
+
+    def test_unknown_model(self):
+        self.assertIsNone(token_prices("my-model"))
+
+    def test_explicit_prices(self):
+        self.assertEqual(token_prices("my-model", "openai", 0.1, 0.2), TokenPrices(0.1, 0.2))
+
+    def test_local_model(self):
+        self.assertEqual(token_prices("my-model", "local"), TokenPrices(0.0, 0.0))
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pheno_engine = FakePhenoEngine()
+        self.client = self.pheno_engine.client
+        self.written = []
+        self.run_statistics = RunStatistics()
+
+    def run_scheduler(self, scheduler: RequestScheduler) -> None:
+        scheduler.run(
+            self.pheno_engine,
+            phenopackets,
+            None,
+            None,
+            self.pheno_engine.predict,
+            lambda phenopacket_path, result: self.written.append(phenopacket_path.stem),
+            self.run_statistics,
+        )
+
+    def test_largest_prompt_first(self):
+        self.run_scheduler(RequestScheduler())
+        self.assertEqual(self.written, ["large", "medium", "small"])
+        self.assertEqual(self.run_statistics.cases_run, 3)
+        self.assertIsNone(self.run_statistics.stop_reason)
+        self.assertIs(self.pheno_engine.client, self.client)
+
+    def test_budget(self):
+        # enough for the estimate of the largest case only
+        budget = TokenPrices(0.03, 0.06).cost(count_tokens(phenopackets[1][1].prompt), 100)
+        self.run_scheduler(RequestScheduler(budget=budget))
+        self.assertEqual(self.written, ["large"])
+        self.assertEqual(self.run_statistics.stop_reason, "budget")
+        self.assertEqual(self.run_statistics.skipped_case_ids, ["medium", "small"])
+        self.assertLessEqual(self.run_statistics.cost, budget)
+
+    def test_deadline(self):
+        self.run_scheduler(RequestScheduler(deadline=0))
+        self.assertEqual(self.written, [])
+        self.assertEqual(self.run_statistics.stop_reason, "deadline")
+        self.assertEqual(len(self.run_statistics.skipped_case_ids), 3)
+
+    def test_concurrency(self):
+        self.run_scheduler(RequestScheduler(concurrency=3))
+        self.assertEqual(sorted(self.written), ["large", "medium", "small"])
+
+    def test_error_recorded(self):
+        def predict(phenopacket):
+            if phenopacket.id == "medium":
+                raise RuntimeError("rate limited")
+            return []
+
+        with self.assertRaises(RuntimeError):
+            RequestScheduler().run(
+                self.pheno_engine,
+                phenopackets,
+                None,
+                None,
+                predict,
+                lambda phenopacket_path, result: self.written.append(phenopacket_path.stem),
+                self.run_statistics,
+            )
+        self.assertEqual(self.written, ["large"])
+        self.assertEqual(self.run_statistics.stop_reason, "error")
+        self.assertEqual(self.run_statistics.skipped_case_ids, ["medium", "small"])
+        self.assertIs(self.pheno_engine.client, self.client)
+
+    def test_budget_without_prices(self):
+        self.pheno_engine.model = "my-model"
+        with self.assertRaises(ValueError):
+            self.run_scheduler(RequestScheduler(budget=1.0))
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pheno_engine = FakePhenoEngine()
+        self.prices = TokenPrices(0.03, 0.06)
+        self.prompt_tokens = count_tokens(phenopackets[0][1].prompt)
+
+    def plan_small(self, **kwargs):
+        return RequestScheduler.plan(
+            self.pheno_engine, phenopackets[:1], None, None, self.prices, **kwargs
+        )[0]
+
+    def test_single_request(self):
+        case = self.plan_small()
+        self.assertEqual(case.prompt_tokens, self.prompt_tokens)
+        self.assertEqual(case.estimated_cost, self.prices.cost(self.prompt_tokens, 100))
+
+    def test_continuations(self):
+        self.pheno_engine.max_continuations = 2
+        overhead = count_tokens(continuation_prompt("", ""))
+        self.assertEqual(
+            self.plan_small().estimated_cost,
+            self.prices.cost(self.prompt_tokens, 100)
+            + self.prices.cost(self.prompt_tokens + 100 + overhead, 100)
+            + self.prices.cost(self.prompt_tokens + 200 + 2 * overhead, 100),
+        )
+        self.assertEqual(
+            self.plan_small().estimated_cost,
+            worst_case_request_cost(self.prices, self.prompt_tokens, 100, 2, overhead),
+        )
+
+    def test_request_prompts(self):
+        case = self.plan_small(request_prompts=lambda engine, phenopacket: [phenopacket.prompt] * 3)
+        self.assertEqual(case.prompt_tokens, 3 * self.prompt_tokens)
+        self.assertAlmostEqual(case.estimated_cost, 3 * self.prices.cost(self.prompt_tokens, 100))
+
+    def test_additional_engines(self):
+        fast_prices = TokenPrices(0.001, 0.002)
+        case = self.plan_small(additional_engines=[(FakePhenoEngine("gpt-3.5-turbo"), fast_prices)])
+        self.assertEqual(case.prompt_tokens, self.prompt_tokens)
+        self.assertAlmostEqual(
+            case.estimated_cost,
+            self.prices.cost(self.prompt_tokens, 100) + fast_prices.cost(self.prompt_tokens, 100),
+        )
+
+    def test_budget_without_additional_prices(self):
+        with self.assertRaises(ValueError):
+            RequestScheduler(budget=1.0).run(
+                self.pheno_engine,
+                phenopackets,
+                None,
+                None,
+                self.pheno_engine.predict,
+                lambda phenopacket_path, result: None,
+                RunStatistics(),
+                additional_engines=[(FakePhenoEngine("my-model"), None)],
+            )
@@ -0,0 +1,102 @@
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import click
+
+from pheval_ontogpt.client import send_job
+from pheval_ontogpt.serve import OntoGPTJobServer, _remove_stale_socket
+from pheval_ontogpt.warm_resources import WarmResources
+
+
+class TestOntoGPTJobServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.socket_path = Path(self.temporary_dir.name).joinpath("server.sock")
+        self.server = OntoGPTJobServer(self.socket_path, WarmResources(), client_timeout=0.2)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temporary_dir.cleanup()
+
+    def test_socket_only_accessible_to_user(self):
+        self.assertEqual(stat.S_IMODE(self.socket_path.stat().st_mode), 0o600)
+
+    def test_ping(self):
+        self.assertEqual(send_job(self.socket_path, {"job": "ping"}), {"status": "ok"})
+
+    def test_unknown_job(self):
+        self.assertEqual(
+            send_job(self.socket_path, {"job": "predict"}),
+            {"status": "error", "error": "ValueError: Unknown job: predict"},
+        )
+
+    def test_failed_job_is_reported(self):
+        response = send_job(
+            self.socket_path,
+            {
+                "job": "run",
+                "input_dir": str(Path(self.temporary_dir.name).joinpath("missing")),
+                "testdata_dir": self.temporary_dir.name,
+                "output_dir": str(Path(self.temporary_dir.name).joinpath("output")),
+            },
+        )
+        self.assertEqual(response["status"], "error")
+
+    def test_idle_client_disconnected(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle_client:
+            idle_client.connect(str(self.socket_path))
+            with self.assertLogs("pheval_ontogpt.serve", level="WARNING"):
+                self.assertEqual(send_job(self.socket_path, {"job": "ping"}), {"status": "ok"})
+            self.assertEqual(idle_client.recv(1), b"")
+
+
+class TestRemoveStaleSocket(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.socket_path = Path(self.temporary_dir.name).joinpath("server.sock")
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_stale_socket_removed(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(str(self.socket_path))
+        _remove_stale_socket(self.socket_path)
+        self.assertFalse(self.socket_path.exists())
+
+    def test_socket_of_another_user_kept(self):
+        self.socket_path.touch()
+        with mock.patch("socket.socket.connect", side_effect=PermissionError):
+            with self.assertRaises(click.ClickException):
+                _remove_stale_socket(self.socket_path)
+        self.assertTrue(self.socket_path.exists())
+
+
+class TestCommandLine(unittest.TestCase):
+    def test_standardise_does_not_import_runner(self):
+        imported = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from pheval_ontogpt.cli import main; "
+                "main.get_command(None, 'standardise'); "
+                "print('pheval_ontogpt.runner' in sys.modules)",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        ).stdout.strip()
+        self.assertEqual(imported, "False")
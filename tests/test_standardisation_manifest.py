@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pheval_ontogpt.post_process.standardisation_manifest import (
+    StandardisationManifest,
+    content_digest,
+)
+
+settings = {"gene_analysis": False, "disease_analysis": True, "sort_order": "descending"}
+
+
+class TestStandardisationManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.temporary_dir.name)
+        self.output_dir.joinpath("pheval_disease_results").mkdir()
+        self.raw_result = self.output_dir.joinpath("patient_1-ontogpt_result.json")
+        self.raw_result.write_text("[]")
+        self.output = self.output_dir.joinpath(
+            "pheval_disease_results/patient_1-pheval_disease_result.tsv"
+        )
+        self.output.write_text("rank\tscore\tdisease_name\tdisease_identifier\n")
+        manifest = StandardisationManifest.load(self.output_dir, settings)
+        manifest.record(self.raw_result.name, content_digest(b"[]"), [self.output], self.raw_result)
+        manifest.write()
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_unchanged(self):
+        manifest = StandardisationManifest.load(self.output_dir, settings)
+        self.assertTrue(manifest.is_unchanged_file(self.raw_result))
+        self.assertTrue(manifest.is_unchanged_content(self.raw_result.name, content_digest(b"[]")))
+
+    def test_changed_content(self):
+        manifest = StandardisationManifest.load(self.output_dir, settings)
+        self.assertFalse(manifest.is_unchanged_content(self.raw_result.name, content_digest(b"{}")))
+
+    def test_missing_output(self):
+        self.output.unlink()
+        manifest = StandardisationManifest.load(self.output_dir, settings)
+        self.assertFalse(manifest.is_unchanged_file(self.raw_result))
+
+    def test_changed_settings(self):
+        manifest = StandardisationManifest.load(
+            self.output_dir, dict(settings, sort_order="ascending")
+        )
+        self.assertFalse(manifest.is_unchanged_content(self.raw_result.name, content_digest(b"[]")))
+
+    def test_record_removes_outputs_not_written_again(self):
+        manifest = StandardisationManifest.load(self.output_dir, settings)
+        manifest.record(self.raw_result.name, content_digest(b"[{}]"), [], self.raw_result)
+        self.assertFalse(self.output.exists())
+
+    def test_remove_stale(self):
+        manifest = StandardisationManifest.load(self.output_dir, settings)
+        self.assertEqual(manifest.remove_stale([]), [self.raw_result.name])
+        self.assertFalse(self.output.exists())
+        self.assertEqual(manifest.entries, {})
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pheval_ontogpt.run.raw_results_store import RawResultsStore
+from pheval_ontogpt.run.watch import PhenopacketWatcher, PollingDirectoryWatcher, directory_watcher
+from tests.fakes import FakePhenoEngine
+
+
+class TestPollingDirectoryWatcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_dir.name)
+        self.directory.joinpath("existing.json").write_text("{}")
+        self.watcher = PollingDirectoryWatcher(self.directory, poll_interval=0)
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_new_file_reported_once_settled(self):
+        self.directory.joinpath("new.json").write_text("{}")
+        self.assertEqual(self.watcher.changes(), [])
+        self.assertEqual(self.watcher.changes(), [self.directory.joinpath("new.json")])
+        self.assertEqual(self.watcher.changes(), [])
+
+    def test_modified_file_reported(self):
+        existing = self.directory.joinpath("existing.json")
+        existing.write_text('{"id": "case"}')
+        self.watcher.changes()
+        self.assertEqual(self.watcher.changes(), [existing])
+
+    def test_ignored_files(self):
+        self.directory.joinpath(".new.json.partial").write_text("{}")
+        self.directory.joinpath("notes.txt").write_text("")
+        self.watcher.changes()
+        self.assertEqual(self.watcher.changes(), [])
+
+    def test_directory_watcher_polling(self):
+        self.assertIsInstance(
+            directory_watcher(self.directory, polling=True), PollingDirectoryWatcher
+        )
+
+
+class TestPhenopacketWatcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_dir.name)
+        self.phenopacket_path = self.directory.joinpath("patient_1.json")
+        self.phenopacket_path.write_text("{}")
+        self.raw_result_path = self.directory.joinpath("patient_1-ontogpt_result.json")
+        self.phenopacket_watcher = PhenopacketWatcher(
+            phenopacket_dir=self.directory,
+            raw_results_dir=self.directory,
+            output_dir=self.directory,
+            pheno_engine=None,
+            prompt=None,
+            gene_analysis=False,
+            disease_analysis=True,
+            gene_identifier_updator=None,
+        )
+
+    def tearDown(self) -> None:
+        self.temporary_dir.cleanup()
+
+    def test_has_result(self):
+        self.assertFalse(self.phenopacket_watcher.has_result(self.phenopacket_path))
+        self.raw_result_path.write_text("[]")
+        self.assertTrue(self.phenopacket_watcher.has_result(self.phenopacket_path))
+
+    def test_has_outdated_result(self):
+        self.raw_result_path.write_text("[]")
+        phenopacket_mtime_ns = self.phenopacket_path.stat().st_mtime_ns
+        os.utime(
+            self.raw_result_path, ns=(phenopacket_mtime_ns - 10**9, phenopacket_mtime_ns - 10**9)
+        )
+        self.assertFalse(self.phenopacket_watcher.has_result(self.phenopacket_path))
+
+    def test_has_result_in_store(self):
+        self.phenopacket_watcher.raw_results_store = RawResultsStore(
+            self.directory.joinpath("ontogpt_results.sqlite")
+        )
+        self.assertFalse(self.phenopacket_watcher.has_result(self.phenopacket_path))
+        self.phenopacket_watcher.raw_results_store.append("patient_1", [])
+        self.assertTrue(self.phenopacket_watcher.has_result(self.phenopacket_path))
+        phenopacket_mtime_ns = self.phenopacket_path.stat().st_mtime_ns
+        os.utime(
+            self.phenopacket_path, ns=(phenopacket_mtime_ns + 10**10, phenopacket_mtime_ns + 10**10)
+        )
+        self.assertFalse(self.phenopacket_watcher.has_result(self.phenopacket_path))
+
+    def test_failing_batch_skipped(self):
+        stop_event = threading.Event()
+        failures = []
+
+        def process_batch(phenopacket_paths):
+            failures.append(phenopacket_paths)
+            if len(failures) == 2:
+                stop_event.set()
+            raise RuntimeError("rate limited")
+
+        self.phenopacket_watcher.pheno_engine = FakePhenoEngine("model", [])
+        self.phenopacket_watcher.poll_interval = 0.01
+        self.phenopacket_watcher.polling = True
+        self.directory.joinpath("patient_2.json").write_text("{}")
+        with mock.patch.object(self.phenopacket_watcher, "process_batch", process_batch):
+            run_statistics = self.phenopacket_watcher.run(stop_event)
+        self.assertEqual(len(failures), 2)
+        self.assertEqual(run_statistics.skipped_case_ids, ["patient_1", "patient_2"])